@@ -1,14 +1,40 @@
-import boto3
-import csv
 from datetime import datetime
+from functools import cached_property
+
+from IdentityCache import IdentityCache
+from Telemetry import telemetry
+from UserHydrator import UserHydrator
+from UserTable import UserRecord, UserTable
+
+APPLICATION_USER_FIELDS = ['UserId', 'Username', 'Email', 'FirstName', 'LastName', 'DisplayName']
+
+def format_user(user_id, user):
+    """Build the exported record for a user profile, using its primary email"""
+    record = UserRecord.from_profile(user_id, user, primary_email=True)
+    for field in APPLICATION_USER_FIELDS:
+        if record[field] is None:
+            record[field] = ''
+    return record
 
 class IdentityCenterUserExporter:
-    def __init__(self, region_name='us-east-1'):
+    def __init__(self, region_name='us-east-1', cache=None, session=None):
         self.region_name = region_name
-        self.sso_admin_client = boto3.client('sso-admin', region_name=region_name)
+        self.cache = cache
+        self._session = session
         self.identity_store_client = None
         self.identity_store_id = None
+        self.hydrator = None
         
+    @cached_property
+    def session(self):
+        import boto3
+
+        return self._session or boto3.Session(region_name=self.region_name)
+
+    @cached_property
+    def sso_admin_client(self):
+        return telemetry.instrument(self.session.client('sso-admin'))
+
     def initialize(self):
         """Initialize the identity store client and get the identity store ID"""
         try:
@@ -21,7 +47,8 @@ class IdentityCenterUserExporter:
                 
             # Use the first instance by default
             self.identity_store_id = response['Instances'][0]['IdentityStoreId']
-            self.identity_store_client = boto3.client('identitystore', region_name=self.region_name)
+            self.identity_store_client = telemetry.instrument(self.session.client('identitystore'))
+            self.hydrator = UserHydrator(self.identity_store_client, self.identity_store_id, cache=self.cache)
             return True
         except Exception as e:
             print(f"Error initializing Identity Center: {e}")
@@ -31,7 +58,7 @@ class IdentityCenterUserExporter:
         """Get users assigned to a specific application"""
         if not self.identity_store_id:
             if not self.initialize():
-                return []
+                return UserTable()
         
         try:
             print(f"Retrieving application assignments for {application_arn}...")
@@ -39,56 +66,44 @@ class IdentityCenterUserExporter:
             
             # Use list_application_assignment_configurations instead of pagination
             # since list_application_assignments doesn't have a paginator
-            next_token = None
-            while True:
-                if next_token:
-                    response = self.sso_admin_client.list_application_assignments(
-                        ApplicationArn=application_arn,
-                        MaxResults=100,
-                        NextToken=next_token
-                    )
-                else:
-                    response = self.sso_admin_client.list_application_assignments(
-                        ApplicationArn=application_arn,
-                        MaxResults=100
-                    )
+            with telemetry.phase('assignment_listing'):
+                next_token = None
+                while True:
+                    if next_token:
+                        response = self.sso_admin_client.list_application_assignments(
+                            ApplicationArn=application_arn,
+                            MaxResults=100,
+                            NextToken=next_token
+                        )
+                    else:
+                        response = self.sso_admin_client.list_application_assignments(
+                            ApplicationArn=application_arn,
+                            MaxResults=100
+                        )
                 
-                for assignment in response.get('ApplicationAssignments', []):
-                    if assignment.get('PrincipalType') == 'USER':
-                        user_ids.add(assignment.get('PrincipalId'))
+                    for assignment in response.get('ApplicationAssignments', []):
+                        if assignment.get('PrincipalType') == 'USER':
+                            user_ids.add(assignment.get('PrincipalId'))
                 
-                next_token = response.get('NextToken')
-                if not next_token:
-                    break
+                    next_token = response.get('NextToken')
+                    if not next_token:
+                        break
             
             print(f"Found {len(user_ids)} user assignments. Retrieving user details...")
             
             # Get detailed user information for each user ID
-            users_data = []
-            for user_id in user_ids:
-                try:
-                    user = self.identity_store_client.describe_user(
-                        IdentityStoreId=self.identity_store_id,
-                        UserId=user_id
-                    )
-                    
-                    user_data = {
-                        'UserId': user_id,
-                        'Username': user.get('UserName', ''),
-                        'Email': next((item.get('Value', '') for item in user.get('Emails', []) 
-                                    if item.get('Primary', False)), ''),
-                        'FirstName': user.get('Name', {}).get('GivenName', ''),
-                        'LastName': user.get('Name', {}).get('FamilyName', ''),
-                        'DisplayName': user.get('DisplayName', '')
-                    }
-                    users_data.append(user_data)
-                except Exception as e:
-                    print(f"Error getting user details for {user_id}: {e}")
+            users_data = UserTable()
+            users = self.hydrator.hydrate(
+                user_ids,
+                on_error=lambda user_id, e: print(f"Error getting user details for {user_id}: {e}")
+            )
+            for user_id, user in users.items():
+                users_data.add(format_user(user_id, user))
             
             return users_data
         except Exception as e:
             print(f"Error getting application users: {e}")
-            return []
+            return UserTable()
     
     def export_to_csv(self, users_data, filename=None):
         """Export user data to a CSV file"""
@@ -101,13 +116,8 @@ class IdentityCenterUserExporter:
             return
         
         try:
-            with open(filename, 'w', newline='') as csvfile:
-                fieldnames = users_data[0].keys()
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                
-                writer.writeheader()
-                for user in users_data:
-                    writer.writerow(user)
+            with telemetry.phase('csv_write'):
+                users_data.write_csv(filename, APPLICATION_USER_FIELDS)
             
             print(f"User data exported to {filename}")
         except Exception as e:
@@ -120,12 +130,18 @@ def main():
     # Optional: specify your AWS region if different from default
     region_name = "us-east-1"  # Change to your Identity Center region
     
-    exporter = IdentityCenterUserExporter(region_name)
+    # Set to True to ignore cached profiles and re-fetch every user
+    force_refresh = False
+    cache = IdentityCache(force_refresh=force_refresh)
+    
+    exporter = IdentityCenterUserExporter(region_name, cache=cache)
     print(f"Retrieving users for application: {application_arn}")
     users_data = exporter.get_application_users(application_arn)
     
     print(f"Found {len(users_data)} users assigned to the application")
     exporter.export_to_csv(users_data)
+    print(f"Identity cache: {cache.stats()}")
+    telemetry.write('telemetry.json', 'telemetry.prom')
 
 if __name__ == "__main__":
     main()
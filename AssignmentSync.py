@@ -0,0 +1,289 @@
+import csv
+import json
+import os
+import sqlite3
+import time
+from functools import cached_property
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set, Tuple
+
+from AppDevQUserData import format_user
+from BatchExporter import EXPORT_FIELDNAMES, application_id_from_arn
+from IdentityCache import IdentityCache
+from PrincipalGraph import PrincipalGraph, list_assignments
+from Telemetry import telemetry
+from UserHydrator import UserHydrator
+from UserTable import UserTable
+
+if TYPE_CHECKING:
+    import boto3
+
+CHANGE_FIELDNAMES = ['ChangeType', 'PrincipalType', 'PrincipalId', 'Username', 'Email', 'FirstName',
+                     'LastName', 'DisplayName', 'AssignedVia', 'PreviousAssignedVia']
+
+
+def diff_sets(previous: Iterable[str], current: Iterable[str]) -> Tuple[List[str], List[str]]:
+    """Return (added, removed) between two principal sets, each sorted for stable output"""
+    previous = set(previous)
+    current = set(current)
+    return sorted(current - previous), sorted(previous - current)
+
+
+class AssignmentSnapshotStore:
+    """Last synced principal sets and exported profiles per application, kept in SQLite"""
+
+    def __init__(self, path: str = 'assignment_snapshots.db'):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS principals (
+                application_arn TEXT NOT NULL,
+                principal_type TEXT NOT NULL,
+                principal_id TEXT NOT NULL,
+                PRIMARY KEY (application_arn, principal_type, principal_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS members (
+                application_arn TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                assigned_via TEXT NOT NULL,
+                profile TEXT NOT NULL,
+                PRIMARY KEY (application_arn, user_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS syncs (
+                application_arn TEXT PRIMARY KEY,
+                synced_at REAL NOT NULL
+            );
+        ''')
+        self.connection.commit()
+
+    def last_synced_at(self, application_arn: str) -> Optional[float]:
+        row = self.connection.execute(
+            'SELECT synced_at FROM syncs WHERE application_arn = ?', (application_arn,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def principals(self, application_arn: str, principal_type: str) -> Set[str]:
+        return {principal_id for principal_id, in self.connection.execute(
+            'SELECT principal_id FROM principals WHERE application_arn = ? AND principal_type = ?',
+            (application_arn, principal_type)
+        )}
+
+    def members(self, application_arn: str) -> Dict[str, Tuple[str, dict]]:
+        """user_id -> (assigned_via, profile) as of the last sync"""
+        return {user_id: (assigned_via, json.loads(profile)) for user_id, assigned_via, profile in
+                self.connection.execute(
+                    'SELECT user_id, assigned_via, profile FROM members WHERE application_arn = ?',
+                    (application_arn,)
+                )}
+
+    def save(self, application_arn: str, user_ids: Iterable[str], group_ids: Iterable[str],
+             members: Dict[str, Tuple[str, dict]]) -> None:
+        """Replace an application's snapshot in one transaction"""
+        with self.connection:
+            self.connection.execute('DELETE FROM principals WHERE application_arn = ?', (application_arn,))
+            self.connection.execute('DELETE FROM members WHERE application_arn = ?', (application_arn,))
+            self.connection.executemany(
+                'INSERT INTO principals (application_arn, principal_type, principal_id) VALUES (?, ?, ?)',
+                [(application_arn, 'USER', user_id) for user_id in user_ids] +
+                [(application_arn, 'GROUP', group_id) for group_id in group_ids]
+            )
+            self.connection.executemany(
+                'INSERT INTO members (application_arn, user_id, assigned_via, profile) VALUES (?, ?, ?, ?)',
+                [(application_arn, user_id, assigned_via, json.dumps(profile, sort_keys=True))
+                 for user_id, (assigned_via, profile) in members.items()]
+            )
+            self.connection.execute(
+                'INSERT OR REPLACE INTO syncs (application_arn, synced_at) VALUES (?, ?)',
+                (application_arn, time.time())
+            )
+
+    def forget(self, application_arn: str) -> None:
+        """Drop an application's snapshot so its next sync starts from scratch"""
+        with self.connection:
+            for table in ('principals', 'members', 'syncs'):
+                self.connection.execute(f'DELETE FROM {table} WHERE application_arn = ?', (application_arn,))
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+class SyncResult:
+    """Outcome of one application sync: the full export, its change feed and the snapshot to save"""
+
+    def __init__(self, application_arn: str, user_ids: List[str], group_ids: List[str],
+                 members: Dict[str, Tuple[str, dict]], changes: List[dict]):
+        self.application_arn = application_arn
+        self.user_ids = user_ids
+        self.group_ids = group_ids
+        self.members = members
+        self.changes = changes
+
+    def users(self) -> UserTable:
+        users = UserTable()
+        for user_id, (assigned_via, profile) in self.members.items():
+            record = format_user(user_id, profile)
+            record['AssignedVia'] = assigned_via
+            users.add(record)
+        return users
+
+    def change_counts(self) -> Dict[str, int]:
+        counts = {}
+        for change in self.changes:
+            key = f"{change['PrincipalType'].lower()}s_{change['ChangeType'].lower()}"
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+
+
+class AssignmentSync:
+    """Compute per-application assignment deltas against the last snapshot.
+
+    Group memberships are re-listed every run so membership changes are seen, but
+    only users that were not exported last time are hydrated; everyone else reuses
+    the stored profile. Pass refresh_profiles=True to re-read every profile (through
+    the identity cache) and report profile edits as MODIFIED as well. Without an
+    identity_store_id, the one behind the session's Identity Center instance is used.
+    """
+
+    def __init__(self, identity_store_id: Optional[str] = None, region_name: str = 'us-east-1',
+                 store: Optional[AssignmentSnapshotStore] = None, cache: Optional[IdentityCache] = None,
+                 session: Optional['boto3.Session'] = None, max_workers: int = 8):
+        self.region_name = region_name
+        self._session = session
+        self.store = store or AssignmentSnapshotStore()
+        self._identity_store_id = identity_store_id
+        self.cache = cache
+        self.max_workers = max_workers
+
+    @cached_property
+    def session(self) -> 'boto3.Session':
+        import boto3
+
+        return self._session or boto3.Session(region_name=self.region_name)
+
+    @cached_property
+    def sso_admin_client(self):
+        return telemetry.instrument(self.session.client('sso-admin'))
+
+    @cached_property
+    def identity_store_client(self):
+        return telemetry.instrument(self.session.client('identitystore'))
+
+    @cached_property
+    def identity_store_id(self) -> str:
+        if self._identity_store_id:
+            return self._identity_store_id
+        response = self.sso_admin_client.list_instances()
+        return response['Instances'][0]['IdentityStoreId']
+
+    @cached_property
+    def hydrator(self) -> UserHydrator:
+        return UserHydrator(self.identity_store_client, self.identity_store_id, cache=self.cache)
+
+    def sync(self, application_arn: str, refresh_profiles: bool = False) -> SyncResult:
+        """List the current assignments and diff them against the stored snapshot; nothing is saved yet"""
+        direct_user_ids, group_ids = list_assignments(self.sso_admin_client, application_arn)
+        previous_members = self.store.members(application_arn)
+        users_added, users_removed = diff_sets(self.store.principals(application_arn, 'USER'), direct_user_ids)
+        groups_added, groups_removed = diff_sets(self.store.principals(application_arn, 'GROUP'), group_ids)
+
+        graph = PrincipalGraph()
+        graph.expand_groups(self.identity_store_client, self.identity_store_id, group_ids,
+                            max_workers=self.max_workers)
+        assigned_via: Dict[str, List[str]] = {user_id: ['DIRECT'] for user_id in direct_user_ids}
+        for group_id in group_ids:
+            for user_id in graph.members(group_id):
+                assigned_via.setdefault(user_id, []).append(group_id)
+
+        to_hydrate = assigned_via if refresh_profiles else [
+            user_id for user_id in assigned_via if user_id not in previous_members
+        ]
+        profiles = self.hydrator.hydrate(to_hydrate)
+
+        members = {}
+        changes = []
+        for user_id, via in assigned_via.items():
+            # Sorted so the value does not depend on the order the API lists groups in
+            via = ';'.join(sorted(via, key=lambda principal: (principal != 'DIRECT', principal)))
+            previous = previous_members.get(user_id)
+            profile = profiles.get(user_id)
+            if profile is None:
+                if previous is None:
+                    # Hydration failed for a new user; it is retried on the next sync
+                    continue
+                profile = previous[1]
+            members[user_id] = (via, profile)
+            if previous is None:
+                changes.append(self._change('ADDED', 'USER', user_id, profile, via, ''))
+            elif previous[0] != via or previous[1] != profile:
+                changes.append(self._change('MODIFIED', 'USER', user_id, profile, via, previous[0]))
+        for user_id, (via, profile) in previous_members.items():
+            if user_id not in assigned_via:
+                changes.append(self._change('REMOVED', 'USER', user_id, profile, '', via))
+
+        for change_type, group_ids_changed in (('ADDED', groups_added), ('REMOVED', groups_removed)):
+            for group_id in group_ids_changed:
+                changes.append(self._change(change_type, 'GROUP', group_id, {}, '', ''))
+
+        result = SyncResult(application_arn, direct_user_ids, group_ids, members, changes)
+        print(f"Synced {application_arn}: {len(members)} users, {len(to_hydrate)} hydrated, "
+              f"direct users +{len(users_added)}/-{len(users_removed)}, "
+              f"groups +{len(groups_added)}/-{len(groups_removed)}, {result.change_counts()}")
+        return result
+
+    @staticmethod
+    def _change(change_type: str, principal_type: str, principal_id: str, profile: dict,
+                assigned_via: str, previous_assigned_via: str) -> dict:
+        row = format_user(principal_id, profile).to_dict(CHANGE_FIELDNAMES[3:8])
+        row.update({
+            'ChangeType': change_type,
+            'PrincipalType': principal_type,
+            'PrincipalId': principal_id,
+            'AssignedVia': assigned_via,
+            'PreviousAssignedVia': previous_assigned_via
+        })
+        return row
+
+    def commit(self, result: SyncResult) -> None:
+        """Save a sync as the new snapshot; call after its outputs have been written"""
+        self.store.save(result.application_arn, result.user_ids, result.group_ids, result.members)
+
+    @staticmethod
+    def write_outputs(result: SyncResult, output_dir: str) -> Tuple[str, str]:
+        """Write the full export and the change feed side by side"""
+        os.makedirs(output_dir, exist_ok=True)
+        application_id = application_id_from_arn(result.application_arn)
+        export_path = os.path.join(output_dir, f"{application_id}_users.csv")
+        changes_path = os.path.join(output_dir, f"{application_id}_changes.csv")
+        with telemetry.phase('csv_write'):
+            result.users().write_csv(export_path + '.tmp', EXPORT_FIELDNAMES)
+            os.replace(export_path + '.tmp', export_path)
+            with open(changes_path + '.tmp', 'w', newline='') as csvfile:
+                writer = csv.DictWriter(csvfile, fieldnames=CHANGE_FIELDNAMES)
+                writer.writeheader()
+                writer.writerows(result.changes)
+            os.replace(changes_path + '.tmp', changes_path)
+        print(f"Wrote {len(result.members)} users to {export_path} and {len(result.changes)} changes to {changes_path}")
+        return export_path, changes_path
+
+
+def main():
+    # Replace with your application ARNs
+    application_arns = ["arn:aws:sso::1234:application/ssoins-1234/apl-1234"]
+    region_name = "us-east-1"  # Change to your Identity Center region
+    output_dir = "application_exports"
+    # Set to True to re-read every profile and report profile edits as changes
+    refresh_profiles = False
+
+    cache = IdentityCache()
+    store = AssignmentSnapshotStore()
+    sync = AssignmentSync(region_name=region_name, store=store, cache=cache)
+    for application_arn in application_arns:
+        result = sync.sync(application_arn, refresh_profiles=refresh_profiles)
+        sync.write_outputs(result, output_dir)
+        sync.commit(result)
+    store.close()
+    print(f"Identity cache: {cache.stats()}")
+    telemetry.write('telemetry.json', 'telemetry.prom')
+
+if __name__ == "__main__":
+    main()
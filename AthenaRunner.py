@@ -0,0 +1,290 @@
+import codecs
+import csv
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+from functools import cached_property
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from Telemetry import telemetry
+
+if TYPE_CHECKING:
+    import boto3
+    from botocore.config import Config
+
+TERMINAL_STATES = ('SUCCEEDED', 'FAILED', 'CANCELLED')
+
+# Statistics copied from get_query_execution into each run's summary
+STATISTIC_FIELDS = (
+    'EngineExecutionTimeInMillis',
+    'QueryQueueTimeInMillis',
+    'TotalExecutionTimeInMillis',
+    'DataScannedInBytes'
+)
+
+# Converters from Athena result column types to Python values
+COLUMN_CONVERTERS: Dict[str, Callable[[str], Any]] = {
+    'tinyint': int,
+    'smallint': int,
+    'integer': int,
+    'bigint': int,
+    'float': float,
+    'real': float,
+    'double': float,
+    'decimal': Decimal,
+    'boolean': lambda value: value.lower() == 'true',
+    'date': date.fromisoformat,
+    'timestamp': datetime.fromisoformat
+}
+
+
+def parse_s3_uri(s3_uri: str) -> Tuple[str, str]:
+    """Split s3://bucket/key into (bucket, key)"""
+    bucket, _, key = s3_uri.replace('s3://', '', 1).partition('/')
+    return bucket, key
+
+
+def _converter_for(column_type: str) -> Optional[Callable[[str], Any]]:
+    return COLUMN_CONVERTERS.get(column_type.split('(')[0].lower())
+
+
+class AthenaRunner:
+    """Run Athena queries on a shared client with adaptive polling and result reuse"""
+
+    def __init__(self, region_name: str, database: str, output_location: str,
+                 session: Optional['boto3.Session'] = None, workgroup: Optional[str] = None,
+                 max_concurrency: int = 5, reuse_max_age_minutes: int = 60,
+                 cache_path: Optional[str] = 'athena_query_cache.json',
+                 cache_max_age_seconds: float = 3600,
+                 min_poll_interval: float = 0.25, max_poll_interval: float = 5.0):
+        self.region_name = region_name
+        self.database = database
+        self.output_location = output_location
+        self.workgroup = workgroup
+        self.max_concurrency = max_concurrency
+        self.reuse_max_age_minutes = reuse_max_age_minutes
+        self.cache_path = cache_path
+        self.cache_max_age_seconds = cache_max_age_seconds
+        self.min_poll_interval = min_poll_interval
+        self.max_poll_interval = max_poll_interval
+
+        self._session = session
+        self._cache_lock = threading.Lock()
+        self._cache = self._load_cache()
+
+    # Clients are created on first use so offline callers never pay for them
+    @cached_property
+    def session(self) -> 'boto3.Session':
+        import boto3
+
+        return self._session or boto3.Session(region_name=self.region_name)
+
+    @cached_property
+    def _client_config(self) -> 'Config':
+        from botocore.config import Config
+
+        return Config(max_pool_connections=max(10, self.max_concurrency * 2))
+
+    @cached_property
+    def athena_client(self):
+        return telemetry.instrument(self.session.client('athena', config=self._client_config))
+
+    @cached_property
+    def s3_client(self):
+        return telemetry.instrument(self.session.client('s3', config=self._client_config))
+
+    def query_key(self, query: str) -> str:
+        """Hash identifying a query within this runner's database and output location"""
+        normalized = ' '.join(query.split())
+        payload = '\n'.join([self.database, self.workgroup or '', self.output_location, normalized])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def start_query(self, query: str) -> str:
+        request = {
+            'QueryString': query,
+            'QueryExecutionContext': {'Database': self.database},
+            'ResultConfiguration': {'OutputLocation': self.output_location}
+        }
+        if self.workgroup:
+            request['WorkGroup'] = self.workgroup
+        if self.reuse_max_age_minutes:
+            request['ResultReuseConfiguration'] = {
+                'ResultReuseByAgeConfiguration': {
+                    'Enabled': True,
+                    'MaxAgeInMinutes': self.reuse_max_age_minutes
+                }
+            }
+        response = self.athena_client.start_query_execution(**request)
+        return response['QueryExecutionId']
+
+    def wait(self, query_execution_id: str, verbose: bool = True) -> dict:
+        """Poll until the query finishes, backing off as it runs longer; returns its run summary"""
+        interval = self.min_poll_interval
+        started = time.monotonic()
+        polls = 0
+        last_state = None
+        with telemetry.phase('athena_wait'):
+            while True:
+                response = self.athena_client.get_query_execution(QueryExecutionId=query_execution_id)
+                polls += 1
+                execution = response['QueryExecution']
+                state = execution['Status']['State']
+                if state in TERMINAL_STATES:
+                    break
+                if verbose and state != last_state:
+                    print(f"Query {query_execution_id} is in {state} state, waiting...")
+                last_state = state
+
+                # Poll quickly while the query is young, then roughly every tenth of its runtime
+                statistics = execution.get('Statistics', {})
+                elapsed = statistics.get('TotalExecutionTimeInMillis')
+                elapsed = elapsed / 1000.0 if elapsed is not None else time.monotonic() - started
+                interval = min(self.max_poll_interval, max(self.min_poll_interval, interval * 1.5, elapsed * 0.1))
+                time.sleep(interval)
+
+        summary = self._summarize(execution)
+        summary['Polls'] = polls
+        return summary
+
+    def run(self, query: str, use_cache: bool = True, verbose: bool = True) -> dict:
+        """Run a query, reusing a recent successful execution of the same query when possible"""
+        key = self.query_key(query)
+        if use_cache:
+            cached = self._cached_execution(key)
+            if cached:
+                if verbose:
+                    print(f"Reusing cached query execution {cached['QueryExecutionId']}")
+                return cached
+
+        query_execution_id = self.start_query(query)
+        if verbose:
+            print(f"Query execution ID: {query_execution_id}")
+        summary = self.wait(query_execution_id, verbose=verbose)
+        summary['LocalCacheHit'] = False
+        if summary['State'] == 'SUCCEEDED':
+            self._store_execution(key, summary)
+        if verbose:
+            print(self.format_summary(summary))
+        return summary
+
+    def run_many(self, queries: List[str], use_cache: bool = True, verbose: bool = True) -> List[dict]:
+        """Run many queries with at most max_concurrency in flight; summaries keep the input order"""
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            futures = [executor.submit(self.run, query, use_cache, verbose) for query in queries]
+            return [future.result() for future in futures]
+
+    def output_location_of(self, query_execution_id: str) -> str:
+        response = self.athena_client.get_query_execution(QueryExecutionId=query_execution_id)
+        return response['QueryExecution']['ResultConfiguration']['OutputLocation']
+
+    def result_columns(self, query_execution_id: str) -> List[Tuple[str, str]]:
+        """Return (name, type) for each column of a finished query"""
+        response = self.athena_client.get_query_results(QueryExecutionId=query_execution_id, MaxResults=1)
+        return [(column['Name'], column['Type']) for column in response['ResultSet']['ResultSetMetadata']['ColumnInfo']]
+
+    def iter_rows(self, query_execution_id: str, typed: bool = True, source: str = 's3') -> Iterator[Dict[str, Any]]:
+        """Yield result rows as dicts without writing the result set to disk.
+
+        source='s3' streams the result CSV object and parses it incrementally;
+        source='api' pages through get_query_results, which is slower but needs
+        no S3 read permission. With typed=True values are converted from their
+        Athena column type and empty non-string values become None.
+        """
+        columns = self.result_columns(query_execution_id)
+        names = [name for name, _ in columns]
+        converters = [_converter_for(column_type) if typed else None for _, column_type in columns]
+        raw_rows = self._iter_s3_rows(query_execution_id) if source == 's3' else self._iter_api_rows(query_execution_id)
+        for values in raw_rows:
+            row = {}
+            for name, converter, value in zip(names, converters, values):
+                if converter is not None:
+                    value = converter(value) if value not in ('', None) else None
+                row[name] = value
+            yield row
+
+    def _iter_s3_rows(self, query_execution_id: str) -> Iterator[List[str]]:
+        bucket, key = parse_s3_uri(self.output_location_of(query_execution_id))
+        body = self.s3_client.get_object(Bucket=bucket, Key=key)['Body']
+        try:
+            reader = csv.reader(codecs.getreader('utf-8')(body))
+            next(reader, None)  # header
+            for values in reader:
+                yield values
+        finally:
+            body.close()
+
+    def _iter_api_rows(self, query_execution_id: str) -> Iterator[List[Optional[str]]]:
+        paginator = self.athena_client.get_paginator('get_query_results')
+        header_skipped = False
+        for page in paginator.paginate(QueryExecutionId=query_execution_id, PaginationConfig={'PageSize': 1000}):
+            for result_row in page['ResultSet']['Rows']:
+                if not header_skipped:
+                    header_skipped = True
+                    continue
+                yield [datum.get('VarCharValue') for datum in result_row['Data']]
+
+    @staticmethod
+    def format_summary(summary: dict) -> str:
+        if summary['State'] != 'SUCCEEDED':
+            return f"Query {summary['QueryExecutionId']} {summary['State']}: {summary.get('StateChangeReason', 'Unknown error')}"
+        reused = ' (reused previous result)' if summary.get('ReusedPreviousResult') else ''
+        return (f"Query {summary['QueryExecutionId']} succeeded{reused}: "
+                f"queue {summary.get('QueryQueueTimeInMillis', 0)} ms, "
+                f"engine {summary.get('EngineExecutionTimeInMillis', 0)} ms, "
+                f"scanned {summary.get('DataScannedInBytes', 0)} bytes")
+
+    @staticmethod
+    def _summarize(execution: dict) -> dict:
+        status = execution['Status']
+        statistics = execution.get('Statistics', {})
+        summary = {
+            'QueryExecutionId': execution['QueryExecutionId'],
+            'State': status['State'],
+            'OutputLocation': execution.get('ResultConfiguration', {}).get('OutputLocation'),
+            'ReusedPreviousResult': statistics.get('ResultReuseInformation', {}).get('ReusedPreviousResult', False)
+        }
+        if 'StateChangeReason' in status:
+            summary['StateChangeReason'] = status['StateChangeReason']
+        for field in STATISTIC_FIELDS:
+            if field in statistics:
+                summary[field] = statistics[field]
+        return summary
+
+    def _load_cache(self) -> Dict[str, dict]:
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable Athena query cache {self.cache_path}: {e}")
+            return {}
+
+    def _cached_execution(self, key: str) -> Optional[dict]:
+        with self._cache_lock:
+            entry = self._cache.get(key)
+        if not entry or time.time() - entry['CompletedAt'] > self.cache_max_age_seconds:
+            return None
+        summary = dict(entry['Summary'])
+        summary['LocalCacheHit'] = True
+        return summary
+
+    def _store_execution(self, key: str, summary: dict) -> None:
+        if not self.cache_path:
+            return
+        with self._cache_lock:
+            now = time.time()
+            self._cache = {
+                cached_key: entry for cached_key, entry in self._cache.items()
+                if now - entry['CompletedAt'] <= self.cache_max_age_seconds
+            }
+            self._cache[key] = {'CompletedAt': now, 'Summary': summary}
+            temp_path = self.cache_path + '.tmp'
+            with open(temp_path, 'w') as file:
+                json.dump(self._cache, file)
+            os.replace(temp_path, self.cache_path)
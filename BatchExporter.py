@@ -0,0 +1,168 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+from AppDevQUserData import format_user
+from IdentityCache import IdentityCache
+from PrincipalGraph import PrincipalGraph, list_assignments
+from Telemetry import telemetry
+from UserHydrator import UserHydrator
+from UserTable import UserTable
+
+if TYPE_CHECKING:
+    import boto3
+    from botocore.config import Config
+
+EXPORT_FIELDNAMES = ['UserId', 'Username', 'Email', 'FirstName', 'LastName', 'DisplayName', 'AssignedVia']
+
+
+def instance_id_from_application_arn(application_arn: str) -> str:
+    """arn:aws:sso::ACCOUNT:application/ssoins-XXXX/apl-YYYY -> ssoins-XXXX"""
+    return application_arn.split(':application/', 1)[1].split('/', 1)[0]
+
+
+def application_id_from_arn(application_arn: str) -> str:
+    return application_arn.rsplit('/', 1)[-1]
+
+
+class BatchExporter:
+    """Export the users of many applications across Identity Center instances in a single pass.
+
+    Assignments for all applications are listed concurrently, every assigned group is
+    expanded once per identity store, and each unique user is hydrated once no matter
+    how many applications or groups grant it access.
+    """
+
+    def __init__(self, region_name: str = 'us-east-1', cache: Optional[IdentityCache] = None,
+                 session: Optional['boto3.Session'] = None, max_workers: int = 8):
+        self.region_name = region_name
+        self._session = session
+        self.cache = cache
+        self.max_workers = max_workers
+        self._identity_store_ids = None
+
+    @cached_property
+    def session(self) -> 'boto3.Session':
+        import boto3
+
+        return self._session or boto3.Session(region_name=self.region_name)
+
+    @cached_property
+    def _client_config(self) -> 'Config':
+        from botocore.config import Config
+
+        return Config(max_pool_connections=max(10, self.max_workers * 2))
+
+    @cached_property
+    def sso_admin_client(self):
+        return telemetry.instrument(self.session.client('sso-admin', config=self._client_config))
+
+    @cached_property
+    def identity_store_client(self):
+        return telemetry.instrument(self.session.client('identitystore', config=self._client_config))
+
+    def identity_store_ids(self) -> Dict[str, str]:
+        """Map every visible Identity Center instance ID (ssoins-...) to its IdentityStoreId"""
+        if self._identity_store_ids is None:
+            identity_store_ids = {}
+            paginator = self.sso_admin_client.get_paginator('list_instances')
+            for page in paginator.paginate():
+                for instance in page['Instances']:
+                    instance_id = instance['InstanceArn'].rsplit('/', 1)[-1]
+                    identity_store_ids[instance_id] = instance['IdentityStoreId']
+            self._identity_store_ids = identity_store_ids
+        return self._identity_store_ids
+
+    def list_all_assignments(self, application_arns: Iterable[str]) -> Dict[str, Tuple[List[str], List[str]]]:
+        """List (user_ids, group_ids) for every application concurrently"""
+        application_arns = list(application_arns)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(list_assignments, self.sso_admin_client, arn) for arn in application_arns]
+            return {arn: future.result() for arn, future in zip(application_arns, futures)}
+
+    def export(self, application_arns: Iterable[str]) -> Dict[str, UserTable]:
+        """Return the exported user rows for each application ARN"""
+        application_arns = list(application_arns)
+        identity_store_ids = self.identity_store_ids()
+        print(f"Listing assignments for {len(application_arns)} applications...")
+        assignments = self.list_all_assignments(application_arns)
+
+        # Group applications by the identity store behind their instance
+        store_applications: Dict[str, List[str]] = {}
+        for arn in application_arns:
+            instance_id = instance_id_from_application_arn(arn)
+            if instance_id not in identity_store_ids:
+                print(f"Skipping {arn}: Identity Center instance {instance_id} not found")
+                continue
+            store_applications.setdefault(identity_store_ids[instance_id], []).append(arn)
+
+        results = {}
+        for identity_store_id, arns in store_applications.items():
+            group_ids = {}
+            user_ids = {}
+            for arn in arns:
+                direct_users, groups = assignments[arn]
+                user_ids.update(dict.fromkeys(direct_users))
+                group_ids.update(dict.fromkeys(groups))
+
+            graph = PrincipalGraph()
+            graph.expand_groups(
+                self.identity_store_client, identity_store_id, group_ids, max_workers=self.max_workers,
+                on_error=lambda group_id, e: print(f"Error processing group {group_id}: {str(e)}")
+            )
+            user_ids.update(dict.fromkeys(graph.users()))
+            print(f"Identity store {identity_store_id}: {len(arns)} applications, {len(group_ids)} groups, "
+                  f"{len(user_ids)} unique users")
+
+            hydrator = UserHydrator(self.identity_store_client, identity_store_id, cache=self.cache)
+            profiles = hydrator.hydrate(user_ids)
+
+            for arn in arns:
+                direct_users, groups = assignments[arn]
+                assigned_via: Dict[str, List[str]] = {user_id: ['DIRECT'] for user_id in direct_users}
+                for group_id in groups:
+                    for user_id in graph.members(group_id):
+                        assigned_via.setdefault(user_id, []).append(group_id)
+                users = UserTable()
+                for user_id, via in assigned_via.items():
+                    if user_id not in profiles:
+                        continue
+                    record = format_user(user_id, profiles[user_id])
+                    record['AssignedVia'] = ';'.join(via)
+                    users.add(record)
+                results[arn] = users
+        return results
+
+    @staticmethod
+    def write_outputs(results: Dict[str, UserTable], output_dir: str) -> Dict[str, str]:
+        """Write one CSV per application, named after its application ID"""
+        os.makedirs(output_dir, exist_ok=True)
+        paths = {}
+        with telemetry.phase('csv_write'):
+            for arn, users in results.items():
+                path = os.path.join(output_dir, f"{application_id_from_arn(arn)}_users.csv")
+                users.write_csv(path, EXPORT_FIELDNAMES)
+                paths[arn] = path
+                print(f"Exported {len(users)} users for {arn} to {path}")
+        return paths
+
+
+def main():
+    # Replace with your application ARNs; they may belong to different Identity Center instances
+    application_arns = [
+        "arn:aws:sso::1234:application/ssoins-1234/apl-1234",
+        "arn:aws:sso::1234:application/ssoins-1234/apl-5678",
+    ]
+    region_name = "us-east-1"  # Change to your Identity Center region
+    output_dir = "application_exports"
+
+    cache = IdentityCache()
+    exporter = BatchExporter(region_name, cache=cache)
+    results = exporter.export(application_arns)
+    exporter.write_outputs(results, output_dir)
+    print(f"Identity cache: {cache.stats()}")
+    telemetry.write('telemetry.json', 'telemetry.prom')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime
+from typing import Callable, List, Optional
+
+from AppDevQUserData import IdentityCenterUserExporter
+from AthenaRunner import AthenaRunner
+from GetQDevUserData import CodeWhispererUserManager
+from GetQUserSub import AmazonQUserManager
+from InactiveSeatReport import build_report, read_activity_csv, roster_frame
+from S3Transfer import MB, S3Transfer, pooled_s3_client
+from SyntheticAws import APPLICATION_ARN, CallRecorder, SyntheticSession, SyntheticTenant, synthetic_activity_csv
+from Telemetry import telemetry
+from UserHydrator import TokenBucket
+
+
+def _unthrottle(hydrator, requests_per_second: float) -> None:
+    hydrator.bucket = TokenBucket(requests_per_second)
+
+
+def measure(name: str, recorder: CallRecorder, function: Callable[[], int], memory: bool = True) -> dict:
+    """Run one case and collect wall time, API calls and users/sec, then Python peak allocations.
+
+    tracemalloc slows every allocation, so the peak is taken in a second, untimed run
+    of the same case; memory=False skips that run.
+    """
+    recorder.reset()
+    telemetry.reset()
+    start = time.perf_counter()
+    users = function()
+    wall_seconds = time.perf_counter() - start
+    calls = dict(recorder.calls)
+    phases = {phase: stats['total_seconds'] for phase, stats in telemetry.summary()['phases'].items()}
+
+    peak_bytes = None
+    if memory:
+        tracemalloc.start()
+        try:
+            function()
+            _, peak_bytes = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    result = {
+        'case': name,
+        'wall_seconds': round(wall_seconds, 3),
+        'users': users,
+        'users_per_second': round(users / wall_seconds, 1) if wall_seconds else None,
+        'api_calls': sum(calls.values()),
+        'api_calls_by_operation': calls,
+        'peak_python_bytes': peak_bytes,
+        'phases': phases
+    }
+    peak = f", peak {peak_bytes / 1e6:.1f} MB" if peak_bytes is not None else ''
+    print(f"{name}: {users} users in {wall_seconds:.2f}s ({result['users_per_second']} users/sec), "
+          f"{result['api_calls']} API calls{peak}")
+    return result
+
+
+def run_benchmarks(users: int = 10000, groups: int = 1000, groups_per_user: int = 3,
+                   latency_ms: float = 2.0, requests_per_second: float = 5000.0,
+                   athena_runtime_seconds: float = 1.0, cases: Optional[List[str]] = None,
+                   memory: bool = True) -> dict:
+    tenant = SyntheticTenant(users=users, groups=groups, groups_per_user=groups_per_user)
+    recorder = CallRecorder(latency_ms / 1000.0)
+    athena_result = synthetic_activity_csv(tenant)
+    session = SyntheticSession(tenant, recorder, athena_result, athena_runtime_seconds)
+    workdir = tempfile.mkdtemp(prefix='qbench-')
+    activity_csv = os.path.join(workdir, 'activity.csv')
+    with open(activity_csv, 'wb') as file:
+        file.write(athena_result)
+
+    def group_users():
+        manager = AmazonQUserManager(session=session)
+        _unthrottle(manager.hydrator, requests_per_second)
+        manager.hydrator.verbose = False
+        return manager.get_group_users(APPLICATION_ARN)['unique_users']
+
+    def codewhisperer_users():
+        manager = CodeWhispererUserManager(session=session)
+        _unthrottle(manager.hydrator, requests_per_second)
+        manager.hydrator.verbose = False
+        return len(manager.get_codewhisperer_users(APPLICATION_ARN))
+
+    def users_from_csv():
+        manager = CodeWhispererUserManager(session=session)
+        _unthrottle(manager.hydrator, requests_per_second)
+        manager.hydrator.verbose = False
+        # get_users_from_csv prints every record; keep that cost but not the output
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            return len(manager.get_users_from_csv(activity_csv))
+
+    def stream_users_from_csv():
+        manager = CodeWhispererUserManager(session=session)
+        _unthrottle(manager.hydrator, requests_per_second)
+        return manager.stream_users_from_csv(activity_csv, os.path.join(workdir, 'users_from_csv.csv'))
+
+    def application_users():
+        exporter = IdentityCenterUserExporter(session=session)
+        exporter.initialize()
+        _unthrottle(exporter.hydrator, requests_per_second)
+        exporter.hydrator.verbose = False
+        return len(exporter.get_application_users(APPLICATION_ARN))
+
+    def athena_flow():
+        runner = AthenaRunner('us-east-1', 'bench', 's3://bench-results/athena/', session=session, cache_path=None)
+        summary = runner.run('SELECT userid, MAX(act_date) FROM bench GROUP BY userid', verbose=False)
+        manager = CodeWhispererUserManager(session=session)
+        _unthrottle(manager.hydrator, requests_per_second)
+        rows = runner.iter_rows(summary['QueryExecutionId'], typed=False)
+        return manager.stream_users(((row['userid'], row['latest_activity_date']) for row in rows),
+                                    os.path.join(workdir, 'athena_users.csv'))
+
+    def inactive_seats():
+        manager = CodeWhispererUserManager(session=session)
+        _unthrottle(manager.hydrator, requests_per_second)
+        manager.hydrator.verbose = False
+        roster = roster_frame(manager.get_codewhisperer_users(APPLICATION_ARN))
+        with telemetry.phase('seat_join'):
+            report = build_report(roster, read_activity_csv(activity_csv), as_of=date(2025, 6, 30))
+        return len(report)
+
+    all_cases = {
+        'get_group_users': group_users,
+        'get_codewhisperer_users': codewhisperer_users,
+        'get_users_from_csv': users_from_csv,
+        'stream_users_from_csv': stream_users_from_csv,
+        'get_application_users': application_users,
+        'athena_flow': athena_flow,
+        'inactive_seats': inactive_seats
+    }
+    results = [measure(name, recorder, all_cases[name], memory) for name in (cases or all_cases)]
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'parameters': {
+            'users': users, 'groups': groups, 'groups_per_user': groups_per_user,
+            'latency_ms': latency_ms, 'requests_per_second': requests_per_second,
+            'athena_runtime_seconds': athena_runtime_seconds, 'memory': memory
+        },
+        'results': results
+    }
+
+
+def run_transfer_benchmarks(size_mb: int = 256, part_mb: int = 16, max_workers: int = 10) -> List[dict]:
+    """Compare the old download_file path with the tuned transfer layer against a local moto S3 server"""
+    import boto3
+    from moto.server import ThreadedMotoServer
+
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+    server = ThreadedMotoServer(ip_address='127.0.0.1', port=0)
+    server.start()
+    try:
+        host, port = server.get_host_and_port()
+        endpoint_url = f'http://{host}:{port}'
+        session = boto3.Session(region_name='us-east-1')
+        transfer = S3Transfer(pooled_s3_client(session, max_workers, endpoint_url=endpoint_url),
+                              part_size=part_mb * MB, max_workers=max_workers)
+        transfer.s3_client.create_bucket(Bucket='bench-transfer')
+        workdir = tempfile.mkdtemp(prefix='qbench-transfer-')
+        source_path = os.path.join(workdir, 'source.bin')
+        with open(source_path, 'wb') as file:
+            for _ in range(size_mb):
+                file.write(os.urandom(MB))
+        transfer.upload(source_path, 'bench-transfer', 'result.csv')
+
+        def default_download_file():
+            # What download_query_results did before: an untuned client and default transfer settings
+            session.client('s3', endpoint_url=endpoint_url).download_file(
+                'bench-transfer', 'result.csv', os.path.join(workdir, 'default.csv'))
+
+        def tuned_download_file():
+            transfer.download_file('bench-transfer', 'result.csv', os.path.join(workdir, 'tuned.csv'))
+
+        def ranged_mmap_download():
+            transfer.download('bench-transfer', 'result.csv', os.path.join(workdir, 'ranged.csv'))
+
+        results = []
+        for name, function in (('s3_default_download_file', default_download_file),
+                               ('s3_tuned_download_file', tuned_download_file),
+                               ('s3_ranged_mmap_download', ranged_mmap_download)):
+            start = time.perf_counter()
+            function()
+            wall_seconds = time.perf_counter() - start
+            results.append({'case': name, 'wall_seconds': round(wall_seconds, 3), 'megabytes': size_mb,
+                            'megabytes_per_second': round(size_mb / wall_seconds, 1)})
+            print(f"{name}: {size_mb} MB in {wall_seconds:.2f}s ({size_mb / wall_seconds:.1f} MB/s)")
+        return results
+    finally:
+        server.stop()
+
+
+# Cold-start budgets in milliseconds above a bare interpreter start (`python -c pass`)
+COLD_START_TARGETS_MS = {
+    'cli_help': 50,
+    'cli_export_users_help': 50,
+    'cli_report_inactive_help': 50,
+    'import_DebugAthena': 250,
+    'import_GetQDevUserData': 250
+}
+
+
+def run_cold_start_benchmarks(repeats: int = 5) -> List[dict]:
+    """Time fresh interpreter starts of the CLI and scripts against COLD_START_TARGETS_MS"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    cli = os.path.join(here, 'QReport.py')
+    commands = {
+        'python_baseline': ['-c', 'pass'],
+        'cli_help': [cli, '--help'],
+        'cli_export_users_help': [cli, 'export-users', '--help'],
+        'cli_report_inactive_help': [cli, 'report', 'inactive', '--help'],
+        'import_DebugAthena': ['-c', 'import DebugAthena'],
+        'import_GetQDevUserData': ['-c', 'import GetQDevUserData']
+    }
+
+    def best_of(arguments):
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            subprocess.run([sys.executable] + arguments, cwd=here, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            timings.append((time.perf_counter() - start) * 1000)
+        return min(timings)
+
+    baseline_ms = best_of(commands.pop('python_baseline'))
+    results = [{'case': 'python_baseline', 'milliseconds': round(baseline_ms, 1)}]
+    print(f"python_baseline: {baseline_ms:.0f} ms")
+    for name, arguments in commands.items():
+        overhead_ms = best_of(arguments) - baseline_ms
+        target_ms = COLD_START_TARGETS_MS[name]
+        results.append({'case': name, 'overhead_milliseconds': round(overhead_ms, 1),
+                        'target_milliseconds': target_ms, 'within_target': overhead_ms <= target_ms})
+        print(f"{name}: +{overhead_ms:.0f} ms over baseline (target +{target_ms} ms)"
+              f"{'' if overhead_ms <= target_ms else ' OVER TARGET'}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the user export paths against a synthetic tenant')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--groups', type=int, default=1000)
+    parser.add_argument('--groups-per-user', type=int, default=3)
+    parser.add_argument('--latency-ms', type=float, default=2.0, help='simulated latency per API call')
+    parser.add_argument('--requests-per-second', type=float, default=5000.0,
+                        help='describe_user rate limit to use instead of the production default')
+    parser.add_argument('--athena-runtime', type=float, default=1.0, help='simulated Athena query runtime in seconds')
+    parser.add_argument('--case', action='append', dest='cases', help='run only this case (repeatable)')
+    parser.add_argument('--output', default='bench_output.json', help='JSON file to write results to')
+    parser.add_argument('--transfer-mb', type=int, default=0,
+                        help='also benchmark S3 downloads of an object this large against a local moto server')
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help='skip the second, tracemalloc-instrumented run of each case')
+    parser.add_argument('--cold-start', action='store_true',
+                        help='also time CLI and script cold starts against their targets')
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.users, args.groups, args.groups_per_user, args.latency_ms,
+                            args.requests_per_second, args.athena_runtime, args.cases, args.memory)
+    if args.transfer_mb:
+        report['transfer_results'] = run_transfer_benchmarks(args.transfer_mb)
+    if args.cold_start:
+        report['cold_start_results'] = run_cold_start_benchmarks()
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Benchmark results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+CREATE EXTERNAL TABLE `devq_userdata_stats_parquet`(
+  `userid` string, 
+  `act_date` string, 
+  `chat_aicodelines` int, 
+  `chat_messagesinteracted` int, 
+  `chat_messagessent` int, 
+  `codefix_acceptanceeventcount` int, 
+  `codefix_acceptedlines` int, 
+  `codefix_generatedlines` int, 
+  `codefix_generationeventcount` int, 
+  `codereview_failedeventcount` int, 
+  `codereview_findingscount` int, 
+  `codereview_succeededeventcount` int, 
+  `dev_acceptanceeventcount` int, 
+  `dev_acceptedlines` int, 
+  `dev_generatedlines` int, 
+  `dev_generationeventcount` int, 
+  `docgeneration_acceptedfileupdates` int, 
+  `docgeneration_acceptedfilescreations` int, 
+  `docgeneration_acceptedlineadditions` int, 
+  `docgeneration_acceptedlineupdates` int, 
+  `docgeneration_eventcount` int, 
+  `docgeneration_rejectedfilecreations` int, 
+  `docgeneration_rejectedfileupdates` int, 
+  `docgeneration_rejectedlineadditions` int, 
+  `docgeneration_rejectedlineupdates` int, 
+  `inlinechat_acceptedlineadditions` int, 
+  `inlinechat_acceptedlinedeletions` int, 
+  `inlinechat_eventcount` int, 
+  `inlinechat_rejectedlineadditions` int, 
+  `inlinechat_rejectedlinedeletions` int, 
+  `inline_aicodelines` int, 
+  `inline_acceptancecount` int, 
+  `inline_suggestionscount` int, 
+  `testgeneration_acceptedlines` int, 
+  `testgeneration_acceptedtests` int, 
+  `testgeneration_eventcount` int, 
+  `testgeneration_generatedlines` int, 
+  `testgeneration_generatedtests` int, 
+  `transformation_eventcount` int, 
+  `transformation_linesgenerated` int, 
+  `transformation_linesingested` int)
+PARTITIONED BY ( 
+  `year` string, 
+  `month` string, 
+  `day` string)
+STORED AS PARQUET
+LOCATION
+  's3://awss3-awsdevq-promptlog/devqpromptlog/AWSLogs/985539799335/QDeveloperLogs/by_user_analytic_parquet/us-east-1'
+TBLPROPERTIES (
+  'parquet.compression'='SNAPPY', 
+  'projection.enabled'='true', 
+  'projection.year.type'='integer', 
+  'projection.year.range'='2024,2035', 
+  'projection.month.type'='integer', 
+  'projection.month.range'='1,12', 
+  'projection.month.digits'='2', 
+  'projection.day.type'='integer', 
+  'projection.day.range'='1,31', 
+  'projection.day.digits'='2', 
+  'storage.location.template'='s3://awss3-awsdevq-promptlog/devqpromptlog/AWSLogs/985539799335/QDeveloperLogs/by_user_analytic_parquet/us-east-1/year=${year}/month=${month}/day=${day}')
\ No newline at end of file
@@ -1,12 +1,11 @@
-import boto3
-import time
-import pandas as pd
-import smtplib
+import csv
 import os
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.application import MIMEApplication
-from botocore.exceptions import ClientError
+import tempfile
+
+from AthenaRunner import AthenaRunner, parse_s3_uri
+from ReportDelivery import Report, ReportDelivery, SmtpConnectionPool
+from S3Transfer import S3Transfer
+from Telemetry import telemetry
 
 # AWS Configuration
 region = 'us-east-1'  # Replace with your AWS region
@@ -19,97 +18,88 @@ smtp_port = 465  # Standard port for TLS
 sender_email = 'nirav@exampl.com'  # Replace with sender email
 receiver_email = 'niravj@world.com'  # Replace with recipient email
 email_password = '373777'  # Replace with email password or app password
+attachment_compression = 'gzip'  # 'gzip', 'zip' or None
+# Reports larger than this after compression are sent as an S3 presigned link
+link_threshold_bytes = 10 * 1024 * 1024
+link_bucket = None  # Replace with a bucket for large reports, e.g. '1234555'
+
+
+_athena_runner = None
+_report_delivery = None
+
+
+def get_athena_runner():
+    """Return the shared AthenaRunner so every query reuses one pooled client"""
+    global _athena_runner
+    if _athena_runner is None:
+        _athena_runner = AthenaRunner(region, database, athena_output_location)
+    return _athena_runner
 
 
 def run_athena_query(query):
-    athena_client = boto3.client('athena', region_name=region)
+    summary = get_athena_runner().run(query)
     
-    # Start the query execution
-    response = athena_client.start_query_execution(
-        QueryString=query,
-        QueryExecutionContext={
-            'Database': database
-        },
-        ResultConfiguration={
-            'OutputLocation': athena_output_location
-        }
-    )
-    
-    query_execution_id = response['QueryExecutionId']
-    print(f"Query execution ID: {query_execution_id}")
-    
-    # Wait for query to complete
-    while True:
-        response = athena_client.get_query_execution(QueryExecutionId=query_execution_id)
-        state = response['QueryExecution']['Status']['State']
-        
-        if state in ['SUCCEEDED', 'FAILED', 'CANCELLED']:
-            break
-        
-        print(f"Query is in {state} state, waiting...")
-        time.sleep(5)
-    
-    if state == 'SUCCEEDED':
+    if summary['State'] == 'SUCCEEDED':
         print("Query completed successfully!")
-        return query_execution_id
+        return summary['QueryExecutionId']
     else:
-        error_message = response['QueryExecution']['Status'].get('StateChangeReason', 'Unknown error')
+        error_message = summary.get('StateChangeReason', 'Unknown error')
         print(f"Query failed: {error_message}")
         return None
 
 #Function to Download Query Results as CSV
 def download_query_results(query_execution_id, csv_file_path):
-    athena_client = boto3.client('athena', region_name=region)
-    s3_client = boto3.client('s3', region_name=region)
+    runner = get_athena_runner()
     
     # Get S3 path of results
-    response = athena_client.get_query_execution(QueryExecutionId=query_execution_id)
-    s3_path = response['QueryExecution']['ResultConfiguration']['OutputLocation']
+    s3_path = runner.output_location_of(query_execution_id)
     
     # Parse S3 path
-    s3_path = s3_path.replace('s3://', '')
-    bucket_name = s3_path.split('/', 1)[0]
-    key = s3_path.split('/', 1)[1]
+    bucket_name, key = parse_s3_uri(s3_path)
     
-    # Download results from S3
-    s3_client.download_file(bucket_name, key, csv_file_path)
+    # Download results from S3 with parallel ranged GETs, resuming an interrupted download
+    S3Transfer(runner.s3_client).download(bucket_name, key, csv_file_path)
     print(f"Query results saved to {csv_file_path}")
-    
-    # Alternative: Use pandas to process the results
-    # results = pd.read_csv(csv_file_path)
-    # return results
+
+#Function to Stream Query Results without a local copy
+def stream_query_results(query_execution_id, typed=True):
+    """Yield result rows as dicts straight from the result object in S3"""
+    return get_athena_runner().iter_rows(query_execution_id, typed=typed)
+
+#Function to Write Streamed Query Results as CSV
+def write_query_results(query_execution_id, csv_file_path):
+    """Write the raw result rows in Athena's CSV layout (quoted header and values)"""
+    columns = [name for name, _ in get_athena_runner().result_columns(query_execution_id)]
+    with open(csv_file_path, 'w', newline='') as file:
+        writer = csv.writer(file, quoting=csv.QUOTE_ALL, lineterminator='\n')
+        writer.writerow(columns)
+        for row in stream_query_results(query_execution_id, typed=False):
+            writer.writerow(row[column] for column in columns)
+    print(f"Query results written to {csv_file_path}")
+
+def build_report_delivery(s3_client=None):
+    """Create a ReportDelivery from the settings above; s3_client uploads large reports to link_bucket"""
+    pool = SmtpConnectionPool(smtp_server, smtp_port, sender_email, email_password)
+    return ReportDelivery(
+        pool, sender_email, compression=attachment_compression, link_threshold_bytes=link_threshold_bytes,
+        s3_client=s3_client if link_bucket else None, link_bucket=link_bucket
+    )
+
+def get_report_delivery():
+    """Return the shared ReportDelivery so every email reuses pooled SMTP connections"""
+    global _report_delivery
+    if _report_delivery is None:
+        _report_delivery = build_report_delivery(get_athena_runner().s3_client if link_bucket else None)
+    return _report_delivery
 
 #Function to Send Email with CSV Attachment
 def send_email_with_attachment(csv_file_path, subject="Athena Query Results"):
-    # Create message container
-    msg = MIMEMultipart()
-    msg['From'] = sender_email
-    msg['To'] = receiver_email
-    msg['Subject'] = subject
-    
-    # Add message body
-    body = "Please find attached the results of your Athena query."
-    msg.attach(MIMEText(body, 'plain'))
-    
-    # Attach the CSV file
-    with open(csv_file_path, 'rb') as file:
-        attachment = MIMEApplication(file.read(), Name=os.path.basename(csv_file_path))
-    
-    attachment['Content-Disposition'] = f'attachment; filename="{os.path.basename(csv_file_path)}"'
-    msg.attach(attachment)
-    
-    # Connect to SMTP server and send email
-    try:
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()  # Secure the connection
-        server.login(sender_email, email_password)
-        server.send_message(msg)
-        server.quit()
-        print(f"Email sent successfully to {receiver_email}")
-        return True
-    except Exception as e:
-        print(f"Failed to send email: {str(e)}")
-        return False
+    return get_report_delivery().send([Report(csv_file_path, subject, [receiver_email])])[0]
+
+#Function to Queue an Email without blocking the pipeline
+def queue_email_with_attachment(csv_file_path, subject="Athena Query Results"):
+    """Return a future that resolves to True once the background sender has delivered the email"""
+    return get_report_delivery().submit(Report(csv_file_path, subject, [receiver_email]))
 
 #Main Function 
 def main():
@@ -120,21 +110,19 @@ def main():
     # LIMIT 100;
     # """  # Replace with your actual query
     query = """SELECT DISTINCT REPLACE(userid, '"', '') as UserID,MAX(parse_datetime(data, 'MM-dd-YYYY')) as latest_activity_date FROM devq_userdata_logs GROUP BY userid ORDER BY latest_activity_date DESC""" 
-    # Local path to save the CSV file
-    csv_file_path = "/Users/niravj/Desktop/athena_results.csv"
     
     # Run the query
     query_execution_id = run_athena_query(query)
     
     if query_execution_id:
-        # Download results as CSV
-        download_query_results(query_execution_id, csv_file_path)
-        
-        # Send email with CSV attachment
-        send_email_with_attachment(csv_file_path, "Your Athena Query Results")
-        
-        # Clean up the local file if needed
-        # os.remove(csv_file_path)
+        # Stream the results into a temporary attachment that is removed once the email is sent
+        with tempfile.TemporaryDirectory(prefix='athena-results-') as work_dir:
+            csv_file_path = os.path.join(work_dir, 'athena_results.csv')
+            write_query_results(query_execution_id, csv_file_path)
+            send_email_with_attachment(csv_file_path, "Your Athena Query Results")
+        get_report_delivery().close()
+    
+    telemetry.write('telemetry.json', 'telemetry.prom')
 
 if __name__ == "__main__":
     main()
@@ -1,41 +1,77 @@
-import boto3
 import traceback
 import csv
-from typing import Set, List
+import json
+import os
+import sys
+import time
+from functools import cached_property
+from itertools import islice
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional, Tuple
+
+from IdentityCache import IdentityCache
+from PrincipalGraph import PrincipalGraph, list_assignments
+from Telemetry import telemetry
+from UserHydrator import HydrationError, UserHydrator, error_code
+from UserTable import UserRecord, UserTable
+
+if TYPE_CHECKING:
+    import boto3
+
+OUTPUT_FIELDNAMES = ['UserId', 'Username', 'Email', 'DisplayName','LastActivityDate']
 
 class CodeWhispererUserManager:
-    def __init__(self, identity_store_region: str = 'us-east-1'):
-        # Initialize sessions and clients
-        self.identity_store_session = boto3.Session(region_name=identity_store_region)
-        self.sso_admin_client = self.identity_store_session.client('sso-admin')
-        self.identity_store_client = self.identity_store_session.client('identitystore')
-        self.identity_store_id = self._get_identity_store_id()
+    def __init__(self, identity_store_region: str = 'us-east-1', cache: Optional[IdentityCache] = None,
+                 session: Optional['boto3.Session'] = None):
+        # Sessions and clients are created on first use
+        self.identity_store_region = identity_store_region
+        self.cache = cache
+        self._session = session
+
+    @cached_property
+    def identity_store_session(self) -> 'boto3.Session':
+        import boto3
+
+        return self._session or boto3.Session(region_name=self.identity_store_region)
+
+    @cached_property
+    def sso_admin_client(self):
+        return telemetry.instrument(self.identity_store_session.client('sso-admin'))
+
+    @cached_property
+    def identity_store_client(self):
+        return telemetry.instrument(self.identity_store_session.client('identitystore'))
+
+    @cached_property
+    def identity_store_id(self) -> str:
+        return self._get_identity_store_id()
+
+    @cached_property
+    def hydrator(self) -> UserHydrator:
+        return UserHydrator(self.identity_store_client, self.identity_store_id, cache=self.cache)
 
     def _get_identity_store_id(self) -> str:
         """Retrieve the Identity Store ID from SSO instance"""
         response = self.sso_admin_client.list_instances()
         return response['Instances'][0]['IdentityStoreId']
 
-    def get_user_details(self, user_id: str,last_act_date: str) -> dict:
+    @staticmethod
+    def _format_user(user_id: str, response: dict, last_act_date: Optional[str]) -> UserRecord:
+        return UserRecord.from_profile(user_id, response, last_act_date)
+
+    def get_user_details(self, user_id: str, last_act_date: Optional[str] = None) -> UserRecord:
         """Get user details from Identity Store"""
         try:
-            response = self.identity_store_client.describe_user(
-                IdentityStoreId=self.identity_store_id,
-                UserId=user_id
-            )
-            return {
-                'UserId': user_id,
-                'Username': response.get('UserName'),
-                'Email': response.get('Emails', [{}])[0].get('Value'),
-                'DisplayName': response.get('DisplayName'),
-                "LastActivityDate":last_act_date
-            }
+            response = self.hydrator.get_user(user_id)
+            return self._format_user(user_id, response, last_act_date)
         except Exception as e:
             print(f"Error getting details for user {user_id}: {str(e)}")
-            return {'UserId': user_id}
+            return UserRecord(user_id)
+
+    def get_users_from_csv(self, csv_file_path: str) -> List[UserRecord]:
+        """Get user details for all UserIDs provided in CSV file, one record per input row.
 
-    def get_users_from_csv(self, csv_file_path: str) -> List[dict]:
-        """Get user details for all UserIDs provided in CSV file"""
+        A repeated UserId is hydrated once but keeps a record for each of its rows.
+        """
         user_details_list = []
         
         try:
@@ -44,13 +80,21 @@ class CodeWhispererUserManager:
                 # Skip header if exists
                 next(csv_reader, None)
                 
+                rows = []
                 for row in csv_reader:
                     if row:  # Check if row is not empty
                         user_id = row[0].strip()  # Assuming UserID is in first column
                         latest_activity_date = row[1] #second date column
-                        user_details = self.get_user_details(user_id,latest_activity_date)
-                        print(user_details)
-                        user_details_list.append(user_details)
+                        rows.append((user_id, latest_activity_date))
+                
+                responses = self.hydrator.hydrate(user_id for user_id, _ in rows)
+                for user_id, latest_activity_date in rows:
+                    if user_id in responses:
+                        user_details = self._format_user(user_id, responses[user_id], latest_activity_date)
+                    else:
+                        user_details = UserRecord(user_id)
+                    print(user_details)
+                    user_details_list.append(user_details)
         except FileNotFoundError:
             print(f"Error: CSV file not found at {csv_file_path}")
         except Exception as e:
@@ -59,84 +103,185 @@ class CodeWhispererUserManager:
         # print (user_details_list)    
         return user_details_list
 
-    def get_codewhisperer_users(self, application_arn: str) -> Set[dict]:
+    @staticmethod
+    def read_user_rows(csv_file_path: str) -> Iterator[Tuple[str, str]]:
+        """Yield (UserId, LastActivityDate) pairs from a CSV file, skipping the header and blank rows"""
+        with open(csv_file_path, 'r', newline='') as file:
+            csv_reader = csv.reader(file)
+            next(csv_reader, None)
+            for row in csv_reader:
+                if row:
+                    yield row[0].strip(), row[1]
+
+    @staticmethod
+    def input_identity(csv_file_path: str) -> dict:
+        """Path, size and mtime of an input file, recorded in checkpoints to detect a changed input"""
+        stat = os.stat(csv_file_path)
+        return {'path': os.path.abspath(csv_file_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def stream_users(self, rows: Iterable[Tuple[str, str]], output_file_path: str,
+                     batch_size: int = 500, checkpoint_path: Optional[str] = None,
+                     input_identity: Optional[dict] = None, require_all: bool = False) -> int:
+        """Hydrate (UserId, LastActivityDate) rows batch by batch and append each batch to the output CSV.
+
+        At most batch_size rows are held in flight. Only the first row for each
+        UserId is written. When checkpoint_path is given, progress is recorded
+        after every batch and a rerun resumes after the last written row.
+        input_identity describes the input (see input_identity()); a checkpoint
+        recorded for a different input is discarded and the output starts fresh.
+        Users whose profile cannot be loaded are written with only their UserId;
+        with require_all, such a batch instead raises HydrationError before it is
+        written, so a rerun retries it. Users that no longer exist are never retried.
+        Returns the number of rows written by this call.
+        """
+        checkpoint = self._load_checkpoint(checkpoint_path)
+        if not os.path.exists(output_file_path):
+            checkpoint = {}
+        if checkpoint and checkpoint.get('input') != input_identity:
+            print(f"Ignoring checkpoint {checkpoint_path}: it was recorded for a different input")
+            checkpoint = {}
+        rows_consumed = checkpoint.get('rows_consumed', 0)
+        seen = set()
+
+        if checkpoint:
+            # Drop anything written after the last checkpoint, then rebuild the dedupe set
+            with open(output_file_path, 'r+', newline='') as output_file:
+                output_file.truncate(checkpoint['output_offset'])
+            for row in self.read_user_rows(output_file_path):
+                seen.add(row[0])
+            output_file = open(output_file_path, 'a', newline='')
+            writer = csv.writer(output_file)
+            print(f"Resuming after {rows_consumed} input rows ({len(seen)} users already written)")
+        else:
+            output_file = open(output_file_path, 'w', newline='')
+            writer = csv.writer(output_file)
+            writer.writerow(OUTPUT_FIELDNAMES)
+
+        rows = iter(rows)
+        if rows_consumed:
+            next(islice(rows, rows_consumed, rows_consumed), None)
+
+        written = 0
+        start = time.monotonic()
+        try:
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                rows_consumed += len(batch)
+
+                pending = []
+                for user_id, latest_activity_date in batch:
+                    if user_id not in seen:
+                        seen.add(user_id)
+                        pending.append((user_id, latest_activity_date))
+
+                failed = {}
+                responses = self.hydrator.hydrate((user_id for user_id, _ in pending),
+                                                  on_error=failed.__setitem__, verbose=False)
+                retryable = {user_id: error for user_id, error in failed.items()
+                             if error_code(error) != 'ResourceNotFoundException'}
+                if require_all and retryable:
+                    raise HydrationError(retryable)
+                for user_id, error in failed.items():
+                    print(f"Error getting details for user {user_id}: {str(error)}")
+                with telemetry.phase('csv_write'):
+                    for user_id, latest_activity_date in pending:
+                        if user_id in responses:
+                            record = self._format_user(user_id, responses[user_id], latest_activity_date)
+                        else:
+                            record = UserRecord(user_id)
+                        writer.writerow(record.values_for(OUTPUT_FIELDNAMES))
+                    written += len(pending)
+                    output_file.flush()
+
+                if checkpoint_path:
+                    self._save_checkpoint(checkpoint_path, {
+                        'input': input_identity,
+                        'rows_consumed': rows_consumed,
+                        'output_offset': output_file.tell()
+                    })
+                elapsed = max(time.monotonic() - start, 1e-9)
+                print(f"Processed {rows_consumed} rows, wrote {written} users ({written / elapsed:.1f} users/sec)")
+        finally:
+            output_file.close()
+
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        return written
+
+    def stream_users_from_csv(self, csv_file_path: str, output_file_path: str,
+                              batch_size: int = 500, checkpoint_path: Optional[str] = None) -> int:
+        """Stream the UserIDs in csv_file_path through hydration straight into output_file_path"""
+        return self.stream_users(self.read_user_rows(csv_file_path), output_file_path,
+                                 batch_size=batch_size, checkpoint_path=checkpoint_path,
+                                 input_identity=self.input_identity(csv_file_path))
+
+    @staticmethod
+    def _load_checkpoint(checkpoint_path: Optional[str]) -> dict:
+        if not checkpoint_path or not os.path.exists(checkpoint_path):
+            return {}
+        with open(checkpoint_path, 'r') as file:
+            return json.load(file)
+
+    @staticmethod
+    def _save_checkpoint(checkpoint_path: str, checkpoint: dict) -> None:
+        temp_path = checkpoint_path + '.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(checkpoint, file)
+        os.replace(temp_path, checkpoint_path)
+
+    def get_codewhisperer_users(self, application_arn: str) -> UserTable:
         """Get all users with CodeWhisperer access"""
-        users = set()
-        group_ids = set()
+        users = {}
 
         try:
             # Get direct assignments
-            paginator = self.sso_admin_client.get_paginator('list_application_assignments')
-            assignments_iterator = paginator.paginate(ApplicationArn=application_arn)
-
-            # Collect users and groups
-            for page in assignments_iterator:
-                for assignment in page['ApplicationAssignments']:
-                    if assignment['PrincipalType'] == 'USER':
-                        users.add(assignment['PrincipalId'])
-                    elif assignment['PrincipalType'] == 'GROUP':
-                        group_ids.add(assignment['PrincipalId'])
+            direct_user_ids, group_ids = list_assignments(self.sso_admin_client, application_arn)
+            users.update(dict.fromkeys(direct_user_ids))
 
             # Get users from groups
-            for group_id in group_ids:
-                try:
-                    paginator = self.identity_store_client.get_paginator('list_group_memberships')
-                    memberships_iterator = paginator.paginate(
-                        IdentityStoreId=self.identity_store_id,
-                        GroupId=group_id
-                    )
-                    
-                    for page in memberships_iterator:
-                        for membership in page['GroupMemberships']:
-                            users.add(membership['MemberId']['UserId'])
-                except Exception as e:
-                    print(f"Error processing group {group_id}: {str(e)}")
+            graph = PrincipalGraph()
+            graph.expand_groups(
+                self.identity_store_client, self.identity_store_id, group_ids,
+                on_error=lambda group_id, e: print(f"Error processing group {group_id}: {str(e)}")
+            )
+            users.update(dict.fromkeys(graph.users()))
 
             # Get detailed information for all users
-            user_details = set()
-            for user_id in users:
-                user_details.add(frozenset(self.get_user_details(user_id).items()))
+            user_details = UserTable()
+            for user_id, response in self.hydrator.hydrate(users).items():
+                user_details.add(self._format_user(user_id, response, None))
 
             return user_details
 
         except Exception as e:
             print(f"Error getting CodeWhisperer users: {str(e)}")
             traceback.print_exc()
-            return set()
+            return UserTable()
 
 def main():
-    # Initialize the manager
-    manager = CodeWhispererUserManager()
+    # Set to True to ignore cached profiles and re-fetch every user
+    force_refresh = False
+    cache = IdentityCache(force_refresh=force_refresh)
     
-    # Get CSV file path as input
-    csv_file_path = input("Enter the path to your CSV file containing UserIDs: ")
-    
-    # Get and display users
-    users = manager.get_users_from_csv(csv_file_path)
+    # Initialize the manager
+    manager = CodeWhispererUserManager(cache=cache)
     
-    # print("\nUser Details:")
-    # print("-------------------")
+    # CSV file containing UserIDs, from the command line or the UsageRollupStore output
+    csv_file_path = sys.argv[1] if len(sys.argv) > 1 else "latest_activity.csv"
     
-    # Create output CSV file
+    # Stream user details into the output CSV, resuming from the checkpoint if a previous run died
     output_file_path = "user_details_output.csv"
+    checkpoint_path = output_file_path + ".checkpoint"
     try:
-        with open(output_file_path, 'w', newline='') as output_file:
-            fieldnames = ['UserId', 'Username', 'Email', 'DisplayName','LastActivityDate']
-            writer = csv.DictWriter(output_file, fieldnames=fieldnames)
-            
-            # Write header
-            writer.writeheader()
-            
-            # Write user details and print to console
-            for user in users:
-                writer.writerow(user)
-                # print(f"User ID: {user.get('UserId')}")
-                # print(f"Username: {user.get('Username')}")
-                # print(f"Email: {user.get('Email')}")
-                # print(f"Display Name: {user.get('DisplayName')}")
-                # print("-------------------")
-                
+        if not os.path.exists(csv_file_path):
+            print(f"Error: CSV file not found at {csv_file_path}")
+            return
+        manager.stream_users_from_csv(csv_file_path, output_file_path, checkpoint_path=checkpoint_path)
         print(f"\nResults have been saved to {output_file_path}")
+        print(f"Identity cache: {cache.stats()}")
+        telemetry.write('telemetry.json', 'telemetry.prom')
         
     except Exception as e:
         print(f"Error writing to output file: {str(e)}")
@@ -1,80 +1,90 @@
-import boto3
-from typing import Set, Dict, List
+from functools import cached_property
+from typing import TYPE_CHECKING, Dict, Optional
+
+from IdentityCache import IdentityCache
+from PrincipalGraph import PrincipalGraph, list_assignments
+from Telemetry import telemetry
+from UserHydrator import UserHydrator
+from UserTable import UserRecord, UserTable
+
+if TYPE_CHECKING:
+    import boto3
 
 class AmazonQUserManager:
-    def __init__(self, identity_store_region: str = 'us-east-1'):
-        self.identity_store_session = boto3.Session(region_name=identity_store_region)
-        self.sso_admin_client = self.identity_store_session.client('sso-admin')
-        self.identity_store_client = self.identity_store_session.client('identitystore')
-        self.identity_store_id = self._get_identity_store_id()
+    def __init__(self, identity_store_region: str = 'us-east-1', cache: Optional[IdentityCache] = None,
+                 session: Optional['boto3.Session'] = None):
+        self.identity_store_region = identity_store_region
+        self.cache = cache
+        self._session = session
+
+    @cached_property
+    def identity_store_session(self) -> 'boto3.Session':
+        import boto3
+
+        return self._session or boto3.Session(region_name=self.identity_store_region)
+
+    @cached_property
+    def sso_admin_client(self):
+        return telemetry.instrument(self.identity_store_session.client('sso-admin'))
+
+    @cached_property
+    def identity_store_client(self):
+        return telemetry.instrument(self.identity_store_session.client('identitystore'))
+
+    @cached_property
+    def identity_store_id(self) -> str:
+        return self._get_identity_store_id()
+
+    @cached_property
+    def hydrator(self) -> UserHydrator:
+        return UserHydrator(self.identity_store_client, self.identity_store_id, cache=self.cache)
 
     def _get_identity_store_id(self) -> str:
         response = self.sso_admin_client.list_instances()
         return response['Instances'][0]['IdentityStoreId']
 
-    def get_group_users(self, application_arn: str) -> Dict[str, List[Dict]]:
-        result = {'groups': [], 'total_users': 0}
+    def get_group_users(self, application_arn: str) -> Dict:
+        result = {'groups': [], 'total_users': 0, 'unique_users': 0, 'users': UserTable()}
         
         try:
             # Get groups with Q Developer access
-            paginator = self.sso_admin_client.get_paginator('list_application_assignments')
-            assignments_iterator = paginator.paginate(ApplicationArn=application_arn)
-
-            for page in assignments_iterator:
-                for assignment in page['ApplicationAssignments']:
-                    if assignment['PrincipalType'] == 'GROUP':
-                        group_id = assignment['PrincipalId']
-                        
-                        # Get group details
-                        group_info = self.identity_store_client.describe_group(
-                            IdentityStoreId=self.identity_store_id,
-                            GroupId=group_id
-                        )
-                        
-                        group_users = []
-                        # Get users in the group
-                        paginator = self.identity_store_client.get_paginator('list_group_memberships')
-                        memberships_iterator = paginator.paginate(
-                            IdentityStoreId=self.identity_store_id,
-                            GroupId=group_id
-                        )
-                        
-                        for membership_page in memberships_iterator:
-                            for membership in membership_page['GroupMemberships']:
-                                user_id = membership['MemberId']['UserId']
-                                try:
-                                    user = self.identity_store_client.describe_user(
-                                        IdentityStoreId=self.identity_store_id,
-                                        UserId=user_id
-                                    )
-                                    user_info = {
-                                        'UserId': user_id,
-                                        'Username': user.get('UserName'),
-                                        'Email': user.get('Emails', [{}])[0].get('Value'),
-                                        'DisplayName': user.get('DisplayName')
-                                    }
-                                    group_users.append(user_info)
-                                except Exception as e:
-                                    print(f"Error getting details for user {user_id}: {str(e)}")
-                        
-                        group_data = {
-                            'GroupId': group_id,
-                            'GroupName': group_info['Group']['DisplayName'],
-                            'UserCount': len(group_users),
-                            'Users': group_users
-                        }
-                        result['groups'].append(group_data)
-                        result['total_users'] += len(group_users)
+            _, group_ids = list_assignments(self.sso_admin_client, application_arn)
+            
+            # Expand every group once, then fetch each unique user once
+            graph = PrincipalGraph()
+            graph.expand_groups(self.identity_store_client, self.identity_store_id, group_ids, describe=True)
+            
+            users = UserTable(
+                UserRecord.from_profile(user_id, user)
+                for user_id, user in self.hydrator.hydrate(graph.users()).items()
+            )
+            
+            for group_id in graph.groups():
+                group_users = [users[user_id] for user_id in graph.members(group_id) if user_id in users]
+                group_data = {
+                    'GroupId': group_id,
+                    'GroupName': graph.group_names[group_id],
+                    'UserCount': len(group_users),
+                    'Users': group_users
+                }
+                result['groups'].append(group_data)
+                result['total_users'] += len(group_users)
+            result['unique_users'] = len(users)
+            result['users'] = users
 
             return result
 
         except Exception as e:
             print(f"Error getting Q Developer users: {str(e)}")
-            return {'groups': [], 'total_users': 0}
+            return {'groups': [], 'total_users': 0, 'unique_users': 0, 'users': UserTable()}
 
 def main():
+    # Set to True to ignore cached profiles and re-fetch every user
+    force_refresh = False
+    cache = IdentityCache(force_refresh=force_refresh)
+    
     # Initialize the manager
-    manager = AmazonQUserManager()
+    manager = AmazonQUserManager(cache=cache)
     
     # Replace with your actual Amazon Q Developer application ARN
     #application_arn = "arn:aws:sso::ACCOUNT_ID:application/ssoins-XXXXX/apl-XXXXX"
@@ -86,6 +96,7 @@ def main():
     print("\nAmazon Q Developer Group Access Summary:")
     print("---------------------------------------")
     print(f"Total Users Across All Groups: {result['total_users']}")
+    print(f"Unique Users: {result['unique_users']}")
     print("\nGroup Details:")
     
     for group in result['groups']:
@@ -96,6 +107,9 @@ def main():
         for user in group['Users']:
             print(f"- {user['DisplayName']} ({user['Email']})")
         print("---------------------------------------")
+    
+    print(f"Identity cache: {cache.stats()}")
+    telemetry.write('telemetry.json', 'telemetry.prom')
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,153 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+# Fields kept from describe_user responses; everything the exporters read
+PROFILE_FIELDS = ('UserName', 'DisplayName', 'Name', 'Emails')
+
+# SQLite limits the number of bound parameters per statement
+_CHUNK_SIZE = 500
+
+
+def profile_from_response(response: dict) -> dict:
+    """Reduce a describe_user response to the normalized profile we cache"""
+    profile = {}
+    for field in PROFILE_FIELDS:
+        if field not in response:
+            continue
+        if field == 'Name':
+            name = response['Name'] or {}
+            profile['Name'] = {key: name[key] for key in ('GivenName', 'FamilyName') if key in name}
+        elif field == 'Emails':
+            profile['Emails'] = [
+                {key: email[key] for key in ('Value', 'Primary') if key in email}
+                for email in response['Emails'] or []
+            ]
+        else:
+            profile[field] = response[field]
+    return profile
+
+
+class IdentityCache:
+    """On-disk cache of Identity Store user profiles keyed by IdentityStoreId and UserId.
+
+    Several processes may share one cache file (e.g. ShardedExport workers); a writer
+    that finds the database locked waits up to busy_timeout seconds before failing.
+    """
+
+    def __init__(self, path: str = 'identity_cache.db', ttl_seconds: float = 7 * 24 * 3600,
+                 max_entries: int = 500000, force_refresh: bool = False, busy_timeout: float = 30.0):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.force_refresh = force_refresh
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS users ('
+            ' identity_store_id TEXT NOT NULL,'
+            ' user_id TEXT NOT NULL,'
+            ' profile TEXT NOT NULL,'
+            ' expires_at REAL NOT NULL,'
+            ' last_access REAL NOT NULL,'
+            ' PRIMARY KEY (identity_store_id, user_id))'
+        )
+        self.connection.execute('CREATE INDEX IF NOT EXISTS users_last_access ON users (last_access)')
+        self.connection.commit()
+
+    def get_many(self, identity_store_id: str, user_ids: Iterable[str]) -> Dict[str, dict]:
+        """Return unexpired cached profiles for the given users; missing or stale users are misses"""
+        user_ids = list(user_ids)
+        found = {}
+        if self.force_refresh:
+            with self.lock:
+                self.misses += len(user_ids)
+            return found
+
+        now = time.time()
+        with self.lock:
+            for start in range(0, len(user_ids), _CHUNK_SIZE):
+                chunk = user_ids[start:start + _CHUNK_SIZE]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self.connection.execute(
+                    f'SELECT user_id, profile FROM users WHERE identity_store_id = ? '
+                    f'AND expires_at > ? AND user_id IN ({placeholders})',
+                    [identity_store_id, now, *chunk]
+                )
+                for user_id, profile in rows:
+                    found[user_id] = json.loads(profile)
+            if found:
+                self.connection.executemany(
+                    'UPDATE users SET last_access = ? WHERE identity_store_id = ? AND user_id = ?',
+                    [(now, identity_store_id, user_id) for user_id in found]
+                )
+                self.connection.commit()
+            self.hits += len(found)
+            self.misses += len(user_ids) - len(found)
+        return found
+
+    def get(self, identity_store_id: str, user_id: str) -> Optional[dict]:
+        return self.get_many(identity_store_id, [user_id]).get(user_id)
+
+    def put_many(self, identity_store_id: str, profiles: Dict[str, dict],
+                 ttl_seconds: Optional[float] = None) -> None:
+        """Store profiles with a per-entry expiry, then evict least recently used entries over the bound"""
+        if not profiles:
+            return
+        now = time.time()
+        expires_at = now + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self.lock:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO users (identity_store_id, user_id, profile, expires_at, last_access) '
+                'VALUES (?, ?, ?, ?, ?)',
+                [(identity_store_id, user_id, json.dumps(profile_from_response(profile)), expires_at, now)
+                 for user_id, profile in profiles.items()]
+            )
+            self._evict()
+            self.connection.commit()
+
+    def put(self, identity_store_id: str, user_id: str, profile: dict,
+            ttl_seconds: Optional[float] = None) -> None:
+        self.put_many(identity_store_id, {user_id: profile}, ttl_seconds)
+
+    def invalidate(self, identity_store_id: str, user_id: Optional[str] = None) -> None:
+        """Drop one user, or every user of an identity store, from the cache"""
+        with self.lock:
+            if user_id is None:
+                self.connection.execute('DELETE FROM users WHERE identity_store_id = ?', (identity_store_id,))
+            else:
+                self.connection.execute(
+                    'DELETE FROM users WHERE identity_store_id = ? AND user_id = ?',
+                    (identity_store_id, user_id)
+                )
+            self.connection.commit()
+
+    def _evict(self) -> None:
+        count = self.connection.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+        if count > self.max_entries:
+            self.connection.execute(
+                'DELETE FROM users WHERE rowid IN '
+                '(SELECT rowid FROM users ORDER BY last_access LIMIT ?)',
+                (count - self.max_entries,)
+            )
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        with self.lock:
+            entries = self.connection.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': entries
+        }
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,116 @@
+from datetime import date
+from typing import Iterable, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from UserTable import UserRecord, UserTable
+
+ROSTER_FIELDS = ['UserId', 'Username', 'Email', 'DisplayName']
+REPORT_FIELDNAMES = ROSTER_FIELDS + ['LastActivityDate', 'DaysInactive', 'Status']
+
+# Seat statuses, in the order the report lists them
+STATUS_ORDER = ['ORPHANED_ACTIVITY', 'NEVER_ACTIVE', 'INACTIVE', 'ACTIVE']
+
+
+def roster_frame(users: UserTable) -> pd.DataFrame:
+    """Columnar copy of the assignment roster, one row per licensed user"""
+    # Explicit dtypes keep an empty roster joinable to activity on UserId
+    return pd.DataFrame(users.columns(ROSTER_FIELDS), columns=ROSTER_FIELDS, dtype=str)
+
+
+def read_roster_csv(path: str) -> pd.DataFrame:
+    """Read a roster exported by the managers (any CSV with the ROSTER_FIELDS columns)"""
+    return pd.read_csv(path, usecols=ROSTER_FIELDS, dtype=str)[ROSTER_FIELDS]
+
+
+def activity_frame(rows: Iterable[Tuple[str, str]]) -> pd.DataFrame:
+    """(UserId, last activity) pairs, e.g. from AthenaRunner.iter_rows or UsageRollupStore.latest_activity"""
+    return _normalize_activity(pd.DataFrame.from_records(rows, columns=['UserId', 'LastActivityDate']).astype(str))
+
+
+def read_activity_csv(path: str) -> pd.DataFrame:
+    """Read a UserID,latest_activity_date CSV (Athena output or UsageRollupStore.write_latest_activity)"""
+    frame = pd.read_csv(path, usecols=[0, 1], dtype=str, keep_default_na=False)
+    frame.columns = ['UserId', 'LastActivityDate']
+    return _normalize_activity(frame)
+
+
+def _normalize_activity(frame: pd.DataFrame) -> pd.DataFrame:
+    # Athena timestamps and rollup days both start with YYYY-MM-DD; only the day matters here
+    frame = frame.assign(
+        UserId=frame['UserId'].astype(str).str.strip(),
+        LastActivityDate=pd.to_datetime(frame['LastActivityDate'].astype(str).str.slice(0, 10),
+                                        format='%Y-%m-%d', errors='coerce')
+    )
+    frame = frame[frame['UserId'] != '']
+    # Keep the latest day per user; a user whose dates are all unparseable keeps NaT
+    return frame.groupby('UserId', sort=False, as_index=False)['LastActivityDate'].max()
+
+
+def build_report(roster: pd.DataFrame, activity: pd.DataFrame, threshold_days: int = 30,
+                 as_of: Optional[date] = None) -> pd.DataFrame:
+    """Join the roster to activity and classify every seat.
+
+    ACTIVE and INACTIVE seats have activity within / older than threshold_days before
+    as_of, NEVER_ACTIVE seats have no parseable activity, and ORPHANED_ACTIVITY rows are
+    activity for users that hold no seat.
+    """
+    as_of = pd.Timestamp(as_of or date.today())
+    report = roster.merge(activity, on='UserId', how='outer', indicator=True, sort=False)
+    days_inactive = (as_of - report['LastActivityDate']).dt.days
+
+    status = pd.Series('ACTIVE', index=report.index)
+    status[days_inactive > threshold_days] = 'INACTIVE'
+    status[report['LastActivityDate'].isna()] = 'NEVER_ACTIVE'
+    status[report['_merge'] == 'right_only'] = 'ORPHANED_ACTIVITY'
+
+    report = report.drop(columns='_merge').assign(
+        LastActivityDate=report['LastActivityDate'].dt.strftime('%Y-%m-%d'),
+        DaysInactive=days_inactive.astype('Int64'),
+        Status=pd.Categorical(status, categories=STATUS_ORDER, ordered=True)
+    )
+    report = report.sort_values(['Status', 'DaysInactive', 'UserId'], ascending=[True, False, True],
+                                na_position='first', kind='stable')
+    return report[REPORT_FIELDNAMES].reset_index(drop=True)
+
+
+def summarize(report: pd.DataFrame) -> dict:
+    counts = report['Status'].value_counts()
+    return {status: int(counts.get(status, 0)) for status in STATUS_ORDER}
+
+
+def seats_table(report: pd.DataFrame, statuses: Sequence[str] = ('INACTIVE', 'NEVER_ACTIVE')) -> UserTable:
+    """UserTable of the seats with the given statuses, ready for the manager CSV/Parquet writers"""
+    selected = report[report['Status'].isin(statuses)]
+    selected = selected.astype(object).where(selected.notna(), None)
+    return UserTable(
+        UserRecord(user_id, username, email, display_name=display_name, last_activity_date=last_activity_date)
+        for user_id, username, email, display_name, last_activity_date in
+        selected[ROSTER_FIELDS + ['LastActivityDate']].itertuples(index=False, name=None)
+    )
+
+
+def write_report(report: pd.DataFrame, path: str) -> None:
+    report.to_csv(path, index=False)
+    print(f"Wrote {len(report)} seats to {path}: {summarize(report)}")
+
+
+def main():
+    # Replace with your Amazon Q Developer application ARN
+    application_arn = "arn:aws:sso::1234:application/ssoins-1234/apl-1234"
+    # UserID,latest_activity_date CSV from Athena or UsageRollupStore
+    activity_path = "latest_activity.csv"
+    # Seats with no activity in this many days are reported as inactive
+    threshold_days = 30
+
+    # Imported here so offline use of this module does not load boto3
+    from GetQDevUserData import CodeWhispererUserManager
+    from IdentityCache import IdentityCache
+
+    manager = CodeWhispererUserManager(cache=IdentityCache())
+    roster = roster_frame(manager.get_codewhisperer_users(application_arn))
+    report = build_report(roster, read_activity_csv(activity_path), threshold_days)
+    write_report(report, "inactive_seats.csv")
+
+if __name__ == "__main__":
+    main()
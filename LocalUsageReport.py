@@ -0,0 +1,191 @@
+from datetime import date
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from UsageStats import ACT_DATE_FORMAT, COUNT_COLUMNS, RAW_COLUMNS
+
+# SUM(...) outputs of AthenaQ.sql in select order; each sums the listed raw columns added together
+REPORT_SUMS: List[Tuple[str, Tuple[str, ...]]] = [
+    ('total_chat_aicodelines', ('chat_aicodelines',)),
+    ('total_chat_messagesinteracted', ('chat_messagesinteracted',)),
+    ('total_chat_messagessent', ('chat_messagessent',)),
+    ('total_codefix_acceptanceeventcount', ('codefix_acceptanceeventcount',)),
+    ('total_codefix_acceptedlines', ('codefix_acceptedlines',)),
+    ('total_codefix_generatedlines', ('codefix_generatedlines',)),
+    ('total_codefix_generationeventcount', ('codefix_generationeventcount',)),
+    ('total_codereview_failedeventcount', ('codereview_failedeventcount',)),
+    ('total_codereview_findingscount', ('codereview_findingscount',)),
+    ('total_codereview_succeededeventcount', ('codereview_succeededeventcount',)),
+    ('total_dev_acceptanceeventcount', ('dev_acceptanceeventcount',)),
+    ('total_dev_acceptedlines', ('dev_acceptedlines',)),
+    ('total_dev_generatedlines', ('dev_generatedlines',)),
+    ('total_dev_generationeventcount', ('dev_generationeventcount',)),
+    ('total_docgeneration_eventcount', ('docgeneration_eventcount',)),
+    ('total_docgeneration_acceptedfiles', ('docgeneration_acceptedfileupdates', 'docgeneration_acceptedfilescreations')),
+    ('total_docgeneration_acceptedlines', ('docgeneration_acceptedlineadditions', 'docgeneration_acceptedlineupdates')),
+    ('total_docgeneration_rejectedfiles', ('docgeneration_rejectedfilecreations', 'docgeneration_rejectedfileupdates')),
+    ('total_docgeneration_rejectedlines', ('docgeneration_rejectedlineadditions', 'docgeneration_rejectedlineupdates')),
+    ('total_inlinechat_eventcount', ('inlinechat_eventcount',)),
+    ('total_inlinechat_acceptedlines', ('inlinechat_acceptedlineadditions', 'inlinechat_acceptedlinedeletions')),
+    ('total_inlinechat_rejectedlines', ('inlinechat_rejectedlineadditions', 'inlinechat_rejectedlinedeletions')),
+    ('total_inline_aicodelines', ('inline_aicodelines',)),
+    ('total_inline_acceptancecount', ('inline_acceptancecount',)),
+    ('total_inline_suggestionscount', ('inline_suggestionscount',)),
+    ('total_testgeneration_eventcount', ('testgeneration_eventcount',)),
+    ('total_testgeneration_acceptedlines', ('testgeneration_acceptedlines',)),
+    ('total_testgeneration_acceptedtests', ('testgeneration_acceptedtests',)),
+    ('total_testgeneration_generatedlines', ('testgeneration_generatedlines',)),
+    ('total_testgeneration_generatedtests', ('testgeneration_generatedtests',)),
+    ('total_transformation_eventcount', ('transformation_eventcount',)),
+    ('total_transformation_linesgenerated', ('transformation_linesgenerated',)),
+    ('total_transformation_linesingested', ('transformation_linesingested',))
+]
+
+# Derived ratios of AthenaQ.sql as (output, numerator sum, denominator sum)
+REPORT_RATIOS: List[Tuple[str, str, str]] = [
+    ('codefix_acceptance_ratio', 'total_codefix_acceptedlines', 'total_codefix_generatedlines'),
+    ('dev_acceptance_ratio', 'total_dev_acceptedlines', 'total_dev_generatedlines'),
+    ('test_acceptance_ratio', 'total_testgeneration_acceptedtests', 'total_testgeneration_generatedtests')
+]
+
+REPORT_COLUMNS = ['userid', 'active_days'] + [name for name, _ in REPORT_SUMS] + [name for name, _, _ in REPORT_RATIOS]
+
+
+def read_csv_chunks(csv_paths: Iterable[str], chunksize: int = 250000) -> Iterator[pd.DataFrame]:
+    """Read raw devq_userdata_stats CSV files in fixed-size chunks with every column as text"""
+    for csv_path in csv_paths:
+        for chunk in pd.read_csv(csv_path, names=RAW_COLUMNS, header=0, dtype=str,
+                                 keep_default_na=False, chunksize=chunksize):
+            yield chunk
+
+
+def read_parquet_chunks(root: str, start: Optional[date] = None, end: Optional[date] = None,
+                        batch_size: int = 250000) -> Iterator[pd.DataFrame]:
+    """Read a compacted Parquet tree in batches, pruning partitions outside [start, end]"""
+    from ParquetCompactor import date_range_filter, stats_dataset
+
+    dataset = stats_dataset(root)
+    partition_filter = date_range_filter(start or date.min, end or date.max) if start or end else None
+    for batch in dataset.to_batches(columns=RAW_COLUMNS, filter=partition_filter, batch_size=batch_size):
+        yield batch.to_pandas()
+
+
+def aggregate_chunk(frame: pd.DataFrame, user_ids: Optional[set] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Reduce raw rows to per-user partial sums and the distinct (userid, act_date) pairs"""
+    if user_ids is not None:
+        frame = frame[frame['userid'].isin(user_ids)]
+    counts = frame[COUNT_COLUMNS].apply(pd.to_numeric, errors='coerce').astype('Int64')
+
+    # a + b is NULL when either side is NULL, and SUM skips NULLs, as in Athena
+    terms = pd.DataFrame(index=frame.index)
+    for name, columns in REPORT_SUMS:
+        term = counts[columns[0]]
+        for column in columns[1:]:
+            term = term + counts[column]
+        terms[name] = term
+    terms['userid'] = frame['userid']
+    sums = terms.groupby('userid', sort=False).sum(min_count=1)
+    days = frame[['userid', 'act_date']].dropna().drop_duplicates()
+    return sums, days
+
+
+def _combine_sums(partials: List[pd.DataFrame]) -> pd.DataFrame:
+    return pd.concat(partials).groupby(level=0, sort=False).sum(min_count=1)
+
+
+def _truncating_divide(numerator: pd.Series, denominator: pd.Series) -> pd.Series:
+    """bigint / bigint as Athena evaluates it: truncated toward zero, NULL for a zero denominator"""
+    denominator = denominator.mask(denominator == 0)
+    quotient = numerator.abs() // denominator.abs()
+    return quotient.where((numerator >= 0) == (denominator > 0), -quotient)
+
+
+def build_report(chunks: Iterable[pd.DataFrame], user_ids: Optional[Iterable[str]] = None,
+                 start: Optional[date] = None, end: Optional[date] = None,
+                 date_format: str = ACT_DATE_FORMAT, max_partials: int = 16) -> pd.DataFrame:
+    """Compute the AthenaQ.sql per-user rollup over a stream of raw data chunks.
+
+    Partial aggregates are merged every max_partials chunks, so memory grows with
+    the number of users and active (user, day) pairs rather than with input rows.
+    user_ids, start and end restrict the input for what-if slices.
+    """
+    user_ids = set(user_ids) if user_ids is not None else None
+    partials = []
+    day_frames = []
+    for chunk in chunks:
+        if start or end:
+            activity = pd.to_datetime(chunk['act_date'], format=date_format, errors='coerce').dt.date
+            keep = activity.notna()
+            if start:
+                keep &= activity >= start
+            if end:
+                keep &= activity <= end
+            chunk = chunk[keep.fillna(False).astype(bool)]
+        sums, days = aggregate_chunk(chunk, user_ids)
+        partials.append(sums)
+        day_frames.append(days)
+        if len(partials) >= max_partials:
+            partials = [_combine_sums(partials)]
+            day_frames = [pd.concat(day_frames).drop_duplicates()]
+
+    if not partials:
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+
+    report = _combine_sums(partials)
+    days = pd.concat(day_frames).drop_duplicates()
+    report.insert(0, 'active_days', days.groupby('userid', sort=False).size().reindex(report.index, fill_value=0))
+    for name, numerator, denominator in REPORT_RATIOS:
+        report[name] = _truncating_divide(report[numerator], report[denominator])
+
+    report.index.name = 'userid'
+    report = report.reset_index()
+    report['active_days'] = report['active_days'].astype('int64')
+    # Athena leaves ties in ORDER BY unordered; break them by userid so reruns are stable
+    report = report.sort_values(['active_days', 'userid'], ascending=[False, True], kind='mergesort')
+    return report[REPORT_COLUMNS].reset_index(drop=True)
+
+
+def _athena_csv_value(value) -> str:
+    if value is None or value is pd.NA or (isinstance(value, float) and value != value):
+        return ''
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def write_athena_rows(columns: Sequence[str], rows: Iterable[Sequence], output_path: str) -> None:
+    """Write rows in Athena's result CSV format: every value quoted, NULL as an empty field"""
+    with open(output_path, 'w', newline='') as output_file:
+        output_file.write(','.join(_athena_csv_value(column) for column in columns) + '\n')
+        for row in rows:
+            output_file.write(','.join(_athena_csv_value(value) for value in row) + '\n')
+
+
+def write_athena_csv(report: pd.DataFrame, output_path: str) -> None:
+    write_athena_rows(report.columns, report.itertuples(index=False, name=None), output_path)
+
+
+def run_local_report(sources: Sequence[str], output_path: str, parquet: bool = False,
+                     start: Optional[date] = None, end: Optional[date] = None,
+                     user_ids: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """Build the usage report from raw CSV files, or a Parquet root when parquet=True, and write it"""
+    if parquet:
+        chunks = (chunk for root in sources for chunk in read_parquet_chunks(root, start, end))
+    else:
+        from ParquetCompactor import list_csv_files
+        chunks = read_csv_chunks(list_csv_files(sources))
+    report = build_report(chunks, user_ids=user_ids, start=start, end=end)
+    write_athena_csv(report, output_path)
+    print(f"Wrote usage report for {len(report)} users to {output_path}")
+    return report
+
+
+def main():
+    # Raw by_user_analytic CSV files/directories, or Parquet roots written by ParquetCompactor
+    sources = ['by_user_analytic']
+    parquet = False
+    output_path = 'usage_report.csv'
+
+    run_local_report(sources, output_path, parquet=parquet)
+
+if __name__ == "__main__":
+    main()
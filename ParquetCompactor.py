@@ -0,0 +1,165 @@
+import calendar
+import os
+import uuid
+from datetime import date, timedelta
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
+
+from UsageStats import ACT_DATE_FORMAT, COUNT_COLUMNS
+
+# Columns of devq_userdata_stats in DDL.sql order with their Athena types
+STATS_COLUMNS = [('userid', pa.string()), ('act_date', pa.string())] + [(name, pa.int32()) for name in COUNT_COLUMNS]
+STATS_SCHEMA = pa.schema(STATS_COLUMNS)
+
+PARTITION_COLUMNS = [('year', pa.string()), ('month', pa.string()), ('day', pa.string())]
+PARTITION_SCHEMA = pa.schema(PARTITION_COLUMNS)
+PARTITIONED_SCHEMA = pa.schema(STATS_COLUMNS + PARTITION_COLUMNS)
+
+
+def list_csv_files(paths: Iterable[str]) -> List[str]:
+    """Expand directories into the .csv files below them"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in sorted(names) if name.endswith('.csv'))
+        else:
+            files.append(path)
+    return files
+
+
+def read_stats_batches(csv_path: str, block_size: int = 16 << 20) -> Iterator[pa.RecordBatch]:
+    """Stream a raw devq_userdata_stats CSV file as record batches using the table schema"""
+    read_options = pa_csv.ReadOptions(column_names=[name for name, _ in STATS_COLUMNS],
+                                      skip_rows=1, block_size=block_size)
+    convert_options = pa_csv.ConvertOptions(column_types=STATS_SCHEMA, strings_can_be_null=False)
+    reader = pa_csv.open_csv(csv_path, read_options=read_options, convert_options=convert_options)
+    for batch in reader:
+        yield batch
+
+
+def with_partition_columns(batch: pa.RecordBatch, date_format: str = ACT_DATE_FORMAT) -> pa.RecordBatch:
+    """Append zero-padded year/month/day columns derived from act_date"""
+    activity = pc.strptime(batch.column('act_date'), format=date_format, unit='s')
+    arrays = list(batch.columns)
+    for function, width in ((pc.year, 4), (pc.month, 2), (pc.day, 2)):
+        arrays.append(pc.utf8_lpad(pc.cast(function(activity), pa.string()), width=width, padding='0'))
+    return pa.RecordBatch.from_arrays(arrays, schema=PARTITIONED_SCHEMA)
+
+
+def compact(input_paths: Iterable[str], output_root: str, date_format: str = ACT_DATE_FORMAT,
+            compression: str = 'snappy', run_id: Optional[str] = None) -> int:
+    """Convert raw per-user CSV logs into Parquet files partitioned by year/month/day.
+
+    output_root may be a local directory or an s3:// URI. Files written by one run
+    share run_id in their names, so rerunning with a new run_id never clobbers
+    earlier output. Returns the number of rows written.
+    """
+    files = list_csv_files(input_paths)
+    run_id = run_id or uuid.uuid4().hex[:12]
+    rows_written = 0
+
+    def batches():
+        nonlocal rows_written
+        for csv_path in files:
+            print(f"Compacting {csv_path}")
+            for batch in read_stats_batches(csv_path):
+                rows_written += batch.num_rows
+                yield with_partition_columns(batch, date_format)
+
+    ds.write_dataset(
+        batches(),
+        output_root,
+        schema=PARTITIONED_SCHEMA,
+        format='parquet',
+        partitioning=ds.partitioning(PARTITION_SCHEMA, flavor='hive'),
+        basename_template=f'part-{run_id}-{{i}}.parquet',
+        existing_data_behavior='overwrite_or_ignore',
+        file_options=ds.ParquetFileFormat().make_write_options(compression=compression)
+    )
+    print(f"Wrote {rows_written} rows from {len(files)} files to {output_root}")
+    return rows_written
+
+
+def stats_dataset(root: str) -> ds.Dataset:
+    """Open a compacted devq_userdata_stats tree with its string year/month/day partitions"""
+    return ds.dataset(root, format='parquet', partitioning=ds.partitioning(PARTITION_SCHEMA, flavor='hive'))
+
+
+def date_range_filter(start: date, end: date) -> ds.Expression:
+    """Dataset filter equivalent to date_range_predicate, for pruning partitions locally"""
+    day_key = pc.binary_join_element_wise(ds.field('year'), ds.field('month'), ds.field('day'), '')
+    return (day_key >= start.strftime('%Y%m%d')) & (day_key <= end.strftime('%Y%m%d'))
+
+
+def partition_groups(start: date, end: date) -> List[Tuple[str, Optional[str], Optional[List[str]]]]:
+    """Split [start, end] into whole years, whole months and lists of days as partition values.
+
+    Each group is (year, None, None), (year, month, None) or (year, month, days),
+    zero-padded the way compact() writes the year=/month=/day= directories.
+    """
+    groups = []
+    day = start
+    while day <= end:
+        month_end = date(day.year, day.month, calendar.monthrange(day.year, day.month)[1])
+        if day.month == 1 and day.day == 1 and date(day.year, 12, 31) <= end:
+            groups.append((f'{day.year:04d}', None, None))
+            last = date(day.year, 12, 31)
+        elif day.day == 1 and month_end <= end:
+            groups.append((f'{day.year:04d}', f'{day.month:02d}', None))
+            last = month_end
+        else:
+            last = min(month_end, end)
+            groups.append((f'{day.year:04d}', f'{day.month:02d}',
+                           [f'{number:02d}' for number in range(day.day, last.day + 1)]))
+        if last >= end:
+            break
+        day = last + timedelta(days=1)
+    return groups
+
+
+def date_range_predicate(start: date, end: date) -> str:
+    """SQL predicate over [start, end] that Athena can prune with partition projection.
+
+    It only compares the raw year/month/day columns for equality, with whole years
+    and months collapsed, e.g. (year = '2025' AND month = '06' AND day IN ('29', '30')).
+    """
+    def values(items):
+        return ', '.join(f"'{item}'" for item in items)
+
+    terms = []
+    whole_months = {}
+    for year, month, days in partition_groups(start, end):
+        if month is None:
+            terms.append(f"(year = '{year}')")
+        elif days is None:
+            whole_months.setdefault(year, []).append(month)
+        else:
+            terms.append(f"(year = '{year}' AND month = '{month}' AND day IN ({values(days)}))")
+    terms.extend(f"(year = '{year}' AND month IN ({values(months)}))" for year, months in whole_months.items())
+    if not terms:
+        return 'FALSE'
+    return '(' + '\n   OR '.join(terms) + ')'
+
+
+def render_query(template_path: str, start: date, end: date) -> str:
+    """Fill the {partition_predicate} placeholder of a date-range query template"""
+    with open(template_path, 'r') as file:
+        template = file.read()
+    return template.format(partition_predicate=date_range_predicate(start, end))
+
+
+def main():
+    # Local directory (or list of files) holding the raw by_user_analytic CSV logs
+    input_paths = ['by_user_analytic']
+    # Local directory or s3:// prefix matching the LOCATION in DDL_Parquet.sql
+    output_root = 'by_user_analytic_parquet'
+
+    compact(input_paths, output_root)
+
+if __name__ == "__main__":
+    main()
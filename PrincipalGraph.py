@@ -0,0 +1,124 @@
+import sys
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from Telemetry import telemetry
+
+
+def list_assignments(sso_admin_client, application_arn: str) -> Tuple[List[str], List[str]]:
+    """Return the (user_ids, group_ids) directly assigned to an application, in listing order"""
+    user_ids = {}
+    group_ids = {}
+    with telemetry.phase('assignment_listing'):
+        paginator = sso_admin_client.get_paginator('list_application_assignments')
+        for page in paginator.paginate(ApplicationArn=application_arn):
+            for assignment in page['ApplicationAssignments']:
+                if assignment['PrincipalType'] == 'USER':
+                    user_ids.setdefault(assignment['PrincipalId'])
+                elif assignment['PrincipalType'] == 'GROUP':
+                    group_ids.setdefault(assignment['PrincipalId'])
+    return list(user_ids), list(group_ids)
+
+
+class PrincipalGraph:
+    """Compact user<->group membership index built from Identity Store group expansions.
+
+    Principal IDs are interned once and referenced by integer position, so a user
+    that belongs to many groups costs one string plus a few array slots.
+    """
+
+    def __init__(self):
+        self._ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._group_members: Dict[int, array] = {}
+        self._user_groups: Dict[int, array] = {}
+        self.group_names: Dict[str, str] = {}
+
+    def _intern(self, principal_id: str) -> int:
+        position = self._positions.get(principal_id)
+        if position is None:
+            position = len(self._ids)
+            self._ids.append(sys.intern(principal_id))
+            self._positions[principal_id] = position
+        return position
+
+    def add_group(self, group_id: str, user_ids: Iterable[str], group_name: Optional[str] = None) -> None:
+        group = self._intern(group_id)
+        members = self._group_members.setdefault(group, array('I'))
+        for user_id in user_ids:
+            user = self._intern(user_id)
+            members.append(user)
+            self._user_groups.setdefault(user, array('I')).append(group)
+        if group_name is not None:
+            self.group_names[group_id] = group_name
+
+    def add_user(self, user_id: str) -> None:
+        """Record a directly assigned user that may not belong to any group"""
+        self._user_groups.setdefault(self._intern(user_id), array('I'))
+
+    def expand_groups(self, identity_store_client, identity_store_id: str, group_ids: Iterable[str],
+                      describe: bool = False, max_workers: int = 8,
+                      on_error: Optional[Callable[[str, Exception], None]] = None) -> None:
+        """List the memberships of every group concurrently and add them to the index.
+
+        Groups are added in the order given. Without on_error the first failure is raised.
+        """
+        def expand(group_id):
+            group_name = None
+            if describe:
+                group_info = identity_store_client.describe_group(
+                    IdentityStoreId=identity_store_id,
+                    GroupId=group_id
+                )
+                group_name = group_info['Group']['DisplayName']
+            member_ids = []
+            paginator = identity_store_client.get_paginator('list_group_memberships')
+            memberships_iterator = paginator.paginate(
+                IdentityStoreId=identity_store_id,
+                GroupId=group_id
+            )
+            for page in memberships_iterator:
+                for membership in page['GroupMemberships']:
+                    member_ids.append(membership['MemberId']['UserId'])
+            return group_name, member_ids
+
+        group_ids = list(group_ids)
+        with telemetry.phase('membership_expansion'), ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(expand, group_id) for group_id in group_ids]
+            for group_id, future in zip(group_ids, futures):
+                try:
+                    group_name, member_ids = future.result()
+                except Exception as e:
+                    if on_error is None:
+                        raise
+                    on_error(group_id, e)
+                    continue
+                self.add_group(group_id, member_ids, group_name)
+
+    def groups(self) -> List[str]:
+        return [self._ids[group] for group in self._group_members]
+
+    def users(self) -> List[str]:
+        """Unique user IDs in the order they were first seen"""
+        return [self._ids[user] for user in self._user_groups]
+
+    def members(self, group_id: str) -> List[str]:
+        group = self._positions.get(group_id)
+        if group is None or group not in self._group_members:
+            return []
+        return [self._ids[user] for user in self._group_members[group]]
+
+    def groups_of(self, user_id: str) -> List[str]:
+        user = self._positions.get(user_id)
+        if user is None or user not in self._user_groups:
+            return []
+        return [self._ids[group] for group in self._user_groups[user]]
+
+    @property
+    def membership_count(self) -> int:
+        return sum(len(members) for members in self._group_members.values())
+
+    @property
+    def user_count(self) -> int:
+        return len(self._user_groups)
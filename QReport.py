@@ -0,0 +1,196 @@
+"""Command line entry point for the Amazon Q Developer reporting tools.
+
+Subcommands import their modules (and with them boto3, pandas or pyarrow) only when
+they run, so `QReport.py --help` and offline reports start without loading AWS SDKs.
+
+    python QReport.py export-users --application-arn ARN -o users.csv
+    python QReport.py export-users --from-csv latest_activity.csv -o user_details_output.csv
+    python QReport.py expand-groups --application-arn ARN -o groups.json
+    python QReport.py export-sharded --application-arn ARN --job-dir sharded_export --workers 8
+    python QReport.py athena-run --query-file AthenaQ.sql --database DB --output-location s3://... -o out.csv
+    python QReport.py report usage by_user_analytic -o usage_report.csv
+    python QReport.py report inactive --roster users.csv --activity latest_activity.csv
+"""
+import argparse
+import json
+import sys
+from datetime import date
+
+
+def export_users(args) -> None:
+    from GetQDevUserData import OUTPUT_FIELDNAMES, CodeWhispererUserManager
+    from IdentityCache import IdentityCache
+
+    cache = IdentityCache(force_refresh=args.force_refresh)
+    manager = CodeWhispererUserManager(args.region, cache=cache)
+    if args.from_csv:
+        output = args.output or 'user_details_output.csv'
+        manager.stream_users_from_csv(args.from_csv, output, checkpoint_path=output + '.checkpoint')
+    else:
+        output = args.output or 'users.csv'
+        users = manager.get_codewhisperer_users(args.application_arn)
+        if args.parquet:
+            users.write_parquet(output, OUTPUT_FIELDNAMES)
+        else:
+            users.write_csv(output, OUTPUT_FIELDNAMES)
+        print(f"Exported {len(users)} users to {output}")
+    print(f"Identity cache: {cache.stats()}")
+
+
+def _shard_list(value: str):
+    shards = []
+    for part in value.split(','):
+        start, _, end = part.partition('-')
+        shards.extend(range(int(start), int(end or start) + 1))
+    return shards
+
+
+def export_sharded(args) -> None:
+    from GetQDevUserData import CodeWhispererUserManager
+    from ShardedExport import ShardedExport
+
+    export = ShardedExport(args.job_dir, args.shards)
+    export.plan(args.application_arn, CodeWhispererUserManager(args.region))
+    failures = export.run(args.workers, shards=args.only_shards, region_name=args.region,
+                          cache_path=args.cache_path, requests_per_second=args.requests_per_second)
+    if failures:
+        print(f"{len(failures)} shards failed; rerun the same command to retry them")
+        sys.exit(1)
+    if args.output and not export.pending_shards():
+        export.merge(args.output)
+
+
+def expand_groups(args) -> None:
+    from GetQUserSub import AmazonQUserManager
+    from IdentityCache import IdentityCache
+
+    manager = AmazonQUserManager(args.region, cache=IdentityCache(force_refresh=args.force_refresh))
+    result = manager.get_group_users(args.application_arn)
+    groups = [{
+        'GroupId': group['GroupId'],
+        'GroupName': group['GroupName'],
+        'UserIds': [user['UserId'] for user in group['Users']]
+    } for group in result['groups']]
+    with open(args.output, 'w') as file:
+        json.dump({'groups': groups, 'total_users': result['total_users'],
+                   'unique_users': result['unique_users']}, file, indent=2)
+    print(f"Wrote {len(groups)} groups ({result['unique_users']} unique users) to {args.output}")
+
+
+def athena_run(args) -> None:
+    from AthenaRunner import AthenaRunner, parse_s3_uri
+    from S3Transfer import S3Transfer
+
+    query = args.query
+    if args.query_file:
+        with open(args.query_file, 'r') as file:
+            query = file.read()
+    runner = AthenaRunner(args.region, args.database, args.output_location, workgroup=args.workgroup)
+    summary = runner.run(query, use_cache=not args.no_cache)
+    print(runner.format_summary(summary))
+    if summary['State'] != 'SUCCEEDED':
+        sys.exit(1)
+    if args.output:
+        bucket, key = parse_s3_uri(runner.output_location_of(summary['QueryExecutionId']))
+        S3Transfer(runner.s3_client).download(bucket, key, args.output)
+        print(f"Query results saved to {args.output}")
+
+
+def report_usage(args) -> None:
+    from LocalUsageReport import run_local_report
+
+    run_local_report(args.sources, args.output, parquet=args.parquet, start=args.start, end=args.end)
+
+
+def report_inactive(args) -> None:
+    from InactiveSeatReport import build_report, read_activity_csv, read_roster_csv, write_report
+
+    report = build_report(read_roster_csv(args.roster), read_activity_csv(args.activity),
+                          args.threshold_days, args.as_of)
+    write_report(report, args.output)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='QReport.py', description='Amazon Q Developer user and usage reports')
+    parser.add_argument('--telemetry', metavar='JSON_PATH',
+                        help='write API/phase telemetry to this file (and a .prom file next to it)')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+
+    def aws_options(subparser):
+        subparser.add_argument('--region', default='us-east-1', help='Identity Center / Athena region')
+        subparser.add_argument('--force-refresh', action='store_true', help='ignore cached user profiles')
+
+    export = subcommands.add_parser('export-users', help='export the users assigned to an application')
+    source = export.add_mutually_exclusive_group(required=True)
+    source.add_argument('--application-arn', help='export every user assigned directly or through groups')
+    source.add_argument('--from-csv', metavar='PATH', help='hydrate the UserIDs in a UserID,latest_activity_date CSV')
+    export.add_argument('-o', '--output', help='output file (default users.csv or user_details_output.csv)')
+    export.add_argument('--parquet', action='store_true', help='write Parquet instead of CSV (--application-arn only)')
+    aws_options(export)
+    export.set_defaults(handler=export_users)
+
+    sharded = subcommands.add_parser('export-sharded',
+                                     help='crash-resumable export split into shards run by a process pool')
+    sharded.add_argument('--application-arn', required=True)
+    sharded.add_argument('--job-dir', default='sharded_export',
+                         help='shared directory holding the plan, shard journals and part files')
+    sharded.add_argument('--shards', type=int, default=16, help='shard count for a new job')
+    sharded.add_argument('--workers', type=int, default=4, help='worker processes on this node')
+    sharded.add_argument('--only-shards', type=_shard_list, metavar='LIST',
+                         help='run only these shards, e.g. 0-7 or 1,3,5, to split a job across nodes')
+    sharded.add_argument('--requests-per-second', type=float, default=20.0,
+                         help='describe_user budget shared by this node\'s workers')
+    sharded.add_argument('--cache-path', default='identity_cache.db')
+    sharded.add_argument('-o', '--output', default='sharded_users.csv',
+                         help='merged output, written once every shard is done')
+    sharded.add_argument('--region', default='us-east-1')
+    sharded.set_defaults(handler=export_sharded)
+
+    groups = subcommands.add_parser('expand-groups', help='list the members of every group assigned to an application')
+    groups.add_argument('--application-arn', required=True)
+    groups.add_argument('-o', '--output', default='groups.json')
+    aws_options(groups)
+    groups.set_defaults(handler=expand_groups)
+
+    athena = subcommands.add_parser('athena-run', help='run an Athena query and optionally download its CSV')
+    query = athena.add_mutually_exclusive_group(required=True)
+    query.add_argument('--query')
+    query.add_argument('--query-file', metavar='PATH')
+    athena.add_argument('--database', required=True)
+    athena.add_argument('--output-location', required=True, help='s3:// prefix for query results')
+    athena.add_argument('--workgroup')
+    athena.add_argument('--no-cache', action='store_true', help='do not reuse a recent execution of the same query')
+    athena.add_argument('-o', '--output', help='download the result CSV to this path')
+    athena.add_argument('--region', default='us-east-1')
+    athena.set_defaults(handler=athena_run)
+
+    report = subcommands.add_parser('report', help='build reports locally, without AWS calls')
+    reports = report.add_subparsers(dest='report', required=True)
+    usage = reports.add_parser('usage', help='AthenaQ.sql usage rollup from raw CSV or compacted Parquet')
+    usage.add_argument('sources', nargs='+', help='CSV files/directories, or Parquet roots with --parquet')
+    usage.add_argument('--parquet', action='store_true')
+    usage.add_argument('--start', type=date.fromisoformat, help='first act_date to include (YYYY-MM-DD)')
+    usage.add_argument('--end', type=date.fromisoformat, help='last act_date to include (YYYY-MM-DD)')
+    usage.add_argument('-o', '--output', default='usage_report.csv')
+    usage.set_defaults(handler=report_usage)
+    inactive = reports.add_parser('inactive', help='inactive, never-active and orphaned seats')
+    inactive.add_argument('--roster', required=True, help='users CSV from export-users')
+    inactive.add_argument('--activity', required=True, help='UserID,latest_activity_date CSV')
+    inactive.add_argument('--threshold-days', type=int, default=30)
+    inactive.add_argument('--as-of', type=date.fromisoformat, help='reference day (default today)')
+    inactive.add_argument('-o', '--output', default='inactive_seats.csv')
+    inactive.set_defaults(handler=report_inactive)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.handler(args)
+    if args.telemetry:
+        from Telemetry import telemetry
+
+        prometheus_path = args.telemetry.rsplit('.', 1)[0] + '.prom'
+        telemetry.write(args.telemetry, prometheus_path)
+
+if __name__ == "__main__":
+    main()
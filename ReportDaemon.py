@@ -0,0 +1,357 @@
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import DebugAthena
+from AthenaRunner import AthenaRunner
+from GetQDevUserData import OUTPUT_FIELDNAMES, CodeWhispererUserManager
+from IdentityCache import IdentityCache
+from InactiveSeatReport import activity_frame, build_report, roster_frame
+from ReportDelivery import Report, ReportDelivery
+from Telemetry import telemetry
+from UserTable import UserRecord
+
+LATEST_ACTIVITY_QUERY = ("SELECT DISTINCT REPLACE(userid, '\"', '') as UserID,"
+                         "MAX(parse_datetime(data, 'MM-dd-YYYY')) as latest_activity_date "
+                         "FROM devq_userdata_logs GROUP BY userid ORDER BY latest_activity_date DESC")
+
+
+class CronSchedule:
+    """Five-field cron expression (minute hour day-of-month month day-of-week).
+
+    Fields accept *, */step, a-b, a-b/step and comma lists. Day-of-week runs 0-6 from
+    Sunday; unlike classic cron, day-of-month and day-of-week must both match.
+    """
+
+    _RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            self._parse(field, low, high) for field, (low, high) in zip(fields, self._RANGES)
+        )
+
+    @staticmethod
+    def _parse(field: str, low: int, high: int) -> frozenset:
+        values = set()
+        for part in field.split(','):
+            spec, _, step = part.partition('/')
+            if spec == '*':
+                start, end = low, high
+            elif '-' in spec:
+                start, end = (int(value) for value in spec.split('-', 1))
+            else:
+                start = end = int(spec)
+            if start < low or end > high or start > end:
+                raise ValueError(f"Cron field {field!r} is outside {low}-{high}")
+            values.update(range(start, end + 1, int(step) if step else 1))
+        return frozenset(values)
+
+    def matches(self, moment: datetime) -> bool:
+        return (moment.minute in self.minutes and moment.hour in self.hours and moment.day in self.days
+                and moment.month in self.months and (moment.weekday() + 1) % 7 in self.weekdays)
+
+    def next_after(self, moment: datetime) -> datetime:
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366)
+        while candidate < limit:
+            if candidate.month not in self.months or candidate.day not in self.days or \
+                    (candidate.weekday() + 1) % 7 not in self.weekdays:
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Cron expression never fires: {self.expression!r}")
+
+
+class JobResults:
+    """In-memory job results with single-flight computation.
+
+    get() returns a result younger than max_age, otherwise computes it. Callers that
+    ask for the same job while it is running wait on the same computation instead of
+    starting another one.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.results: Dict[str, Tuple[Any, float]] = {}
+        self.inflight: Dict[str, Future] = {}
+        self.status: Dict[str, dict] = {}
+
+    def get(self, name: str, compute: Callable[[], Any], max_age: Optional[float] = None) -> Any:
+        with self.lock:
+            cached = self.results.get(name)
+            if cached is not None and max_age is not None and time.time() - cached[1] <= max_age:
+                return cached[0]
+            future = self.inflight.get(name)
+            owner = future is None
+            if owner:
+                future = Future()
+                self.inflight[name] = future
+        if not owner:
+            telemetry.count('jobs_coalesced')
+            return future.result()
+
+        started = time.time()
+        try:
+            with telemetry.phase(f'job_{name}'):
+                value = compute()
+        except Exception as e:
+            with self.lock:
+                del self.inflight[name]
+                self.status[name] = {'last_error': str(e), 'last_attempt': started}
+            future.set_exception(e)
+            raise
+        finished = time.time()
+        with self.lock:
+            del self.inflight[name]
+            self.results[name] = (value, finished)
+            self.status[name] = {'last_success': finished, 'duration_seconds': round(finished - started, 3)}
+        future.set_result(value)
+        return value
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self.lock:
+            return {name: dict(status, running=name in self.inflight) for name, status in self.status.items()}
+
+
+class ReportDaemon:
+    """Long-running process that keeps AWS clients, the identity cache and job results warm.
+
+    Jobs:
+      activity        latest activity per user from Athena
+      roster          users assigned to the application, as a UserTable
+      user_report     activity joined to the roster, as the user_details CSV
+      inactive_seats  InactiveSeatReport over the roster and activity
+      email           user_report mailed through ReportDelivery
+    A job reuses its dependencies when they are younger than reuse_seconds, so jobs
+    scheduled close together share one Athena run and one roster export.
+    """
+
+    def __init__(self, application_arn: str, athena_runner: AthenaRunner,
+                 manager: CodeWhispererUserManager, delivery: Optional[ReportDelivery] = None,
+                 recipients: Optional[List[str]] = None, reuse_seconds: float = 900,
+                 threshold_days: int = 30, max_workers: int = 4):
+        self.application_arn = application_arn
+        self.athena_runner = athena_runner
+        self.manager = manager
+        self.delivery = delivery
+        self.recipients = recipients or []
+        self.reuse_seconds = reuse_seconds
+        self.threshold_days = threshold_days
+        self.results = JobResults()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='report-job')
+        self.schedules: List[Tuple[str, CronSchedule]] = []
+        self.stopping = threading.Event()
+        self.jobs = {
+            'activity': self._activity,
+            'roster': self._roster,
+            'user_report': self._user_report,
+            'inactive_seats': self._inactive_seats,
+            'email': self._email
+        }
+
+    def warm(self) -> None:
+        """Create the lazily built clients and look up the identity store before serving"""
+        self.athena_runner.athena_client
+        self.athena_runner.s3_client
+        self.manager.hydrator
+
+    def get(self, name: str, max_age: Optional[float] = None) -> Any:
+        """Return a job's result, computing it if it is missing or older than max_age"""
+        return self.results.get(name, self.jobs[name], max_age)
+
+    def _dependency(self, name: str) -> Any:
+        return self.get(name, self.reuse_seconds)
+
+    def _activity(self) -> List[Tuple[str, str]]:
+        summary = self.athena_runner.run(LATEST_ACTIVITY_QUERY, verbose=False)
+        if summary['State'] != 'SUCCEEDED':
+            raise RuntimeError(f"Activity query failed: {summary.get('StateChangeReason', 'Unknown error')}")
+        return [(row['userid'], row['latest_activity_date'])
+                for row in self.athena_runner.iter_rows(summary['QueryExecutionId'], typed=False)]
+
+    def _roster(self):
+        return self.manager.get_codewhisperer_users(self.application_arn)
+
+    def _user_report(self) -> str:
+        activity = self._dependency('activity')
+        roster = self._dependency('roster')
+        # Active users outside the roster are still hydrated, as the one-shot script does
+        missing = [user_id for user_id, _ in activity if user_id not in roster]
+        profiles = self.manager.hydrator.hydrate(missing, verbose=False) if missing else {}
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(OUTPUT_FIELDNAMES)
+        seen = set()
+        for user_id, last_activity_date in activity:
+            if user_id in seen:
+                continue
+            seen.add(user_id)
+            record = roster.get(user_id)
+            if record is not None:
+                record = UserRecord(user_id, record.username, record.email, display_name=record.display_name)
+            elif user_id in profiles:
+                record = self.manager._format_user(user_id, profiles[user_id], None)
+            else:
+                record = UserRecord(user_id)
+            record.last_activity_date = last_activity_date
+            writer.writerow(record.values_for(OUTPUT_FIELDNAMES))
+        return output.getvalue()
+
+    def _inactive_seats(self) -> str:
+        report = build_report(roster_frame(self._dependency('roster')),
+                              activity_frame(self._dependency('activity')), self.threshold_days)
+        return report.to_csv(index=False)
+
+    def _email(self) -> bool:
+        if self.delivery is None or not self.recipients:
+            raise RuntimeError("No report delivery configured")
+        report_csv = self._dependency('user_report')
+        # The attachment only lives for the send, so a long-running daemon leaves nothing behind
+        with tempfile.TemporaryDirectory(prefix='report-daemon-') as work_dir:
+            path = os.path.join(work_dir, f"user_details_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+            with open(path, 'w', newline='') as file:
+                file.write(report_csv)
+            return self.delivery.send([Report(path, "Your Athena Query Results", self.recipients)])[0]
+
+    def schedule(self, name: str, expression: str) -> None:
+        if name not in self.jobs:
+            raise ValueError(f"Unknown job {name!r}; expected one of {sorted(self.jobs)}")
+        self.schedules.append((name, CronSchedule(expression)))
+
+    def _run_scheduled(self, name: str) -> None:
+        try:
+            # Scheduled runs refresh the job itself but reuse recent dependencies
+            self.get(name, max_age=0)
+            print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] Job {name} finished")
+        except Exception as e:
+            print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] Job {name} failed: {str(e)}")
+            traceback.print_exc()
+
+    def run_scheduler(self) -> None:
+        """Fire scheduled jobs until stop() is called"""
+        upcoming = [(schedule.next_after(datetime.now()), name, schedule) for name, schedule in self.schedules]
+        while not self.stopping.is_set():
+            if not upcoming:
+                self.stopping.wait(60)
+                continue
+            upcoming.sort(key=lambda entry: entry[0])
+            due, name, schedule = upcoming[0]
+            wait = (due - datetime.now()).total_seconds()
+            if wait > 0:
+                self.stopping.wait(min(wait, 60))
+                continue
+            self.executor.submit(self._run_scheduled, name)
+            upcoming[0] = (schedule.next_after(due), name, schedule)
+
+    def serve(self, host: str = '127.0.0.1', port: int = 8787) -> ThreadingHTTPServer:
+        """Start the local HTTP endpoint in a background thread and return the server"""
+        server = ThreadingHTTPServer((host, port), _handler_for(self))
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='report-http', daemon=True).start()
+        print(f"Serving reports on http://{host}:{server.server_address[1]}/")
+        return server
+
+    def stop(self) -> None:
+        self.stopping.set()
+        self.executor.shutdown(wait=True)
+
+
+def _handler_for(daemon: ReportDaemon):
+    class ReportRequestHandler(BaseHTTPRequestHandler):
+        """GET /reports/<job>.csv, /status and /metrics; add ?refresh=1 to recompute a report"""
+
+        def _send(self, status: int, content_type: str, body: str) -> None:
+            payload = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            path, _, query = self.path.partition('?')
+            if path == '/status':
+                status = {'jobs': daemon.results.snapshot(),
+                          'schedules': {name: schedule.expression for name, schedule in daemon.schedules}}
+                return self._send(200, 'application/json', json.dumps(status, indent=2))
+            if path == '/metrics':
+                return self._send(200, 'text/plain; version=0.0.4', telemetry.to_prometheus())
+            if path.startswith('/reports/') and path.endswith('.csv'):
+                name = path[len('/reports/'):-len('.csv')]
+                if name not in ('user_report', 'inactive_seats'):
+                    return self._send(404, 'text/plain', f"Unknown report {name}\n")
+                max_age = 0 if 'refresh=1' in query else daemon.reuse_seconds
+                try:
+                    return self._send(200, 'text/csv', daemon.get(name, max_age))
+                except Exception as e:
+                    return self._send(500, 'text/plain', f"{name} failed: {str(e)}\n")
+            self._send(404, 'text/plain', "Not found\n")
+
+        def log_message(self, format, *args):
+            pass
+
+    return ReportRequestHandler
+
+
+def main():
+    # Replace with your Amazon Q Developer application ARN and Athena settings
+    application_arn = "arn:aws:sso::1234:application/ssoins-1234/apl-1234"
+    region = 'us-east-1'
+    athena_output_location = 's3://1234555/QDeveloperLogs/by_user/'
+    database = 'amazon_q_metrics'
+    # Cron expressions (minute hour day month weekday) in local time
+    schedules = {
+        'activity': '0 5 * * *',
+        'roster': '0 5 * * *',
+        'email': '30 5 * * 1'
+    }
+    # Results younger than this are reused; it must cover the 30 minutes between the
+    # 05:00 activity/roster runs and the 05:30 email so the email does not redo them
+    reuse_seconds = 3600
+    http_port = 8787
+
+    import boto3
+
+    session = boto3.Session(region_name=region)
+    athena_runner = AthenaRunner(region, database, athena_output_location, session=session)
+    # SMTP settings come from DebugAthena; large-report links go through the daemon's own S3 client
+    daemon = ReportDaemon(
+        application_arn,
+        athena_runner,
+        CodeWhispererUserManager(region, cache=IdentityCache(), session=session),
+        delivery=DebugAthena.build_report_delivery(athena_runner.s3_client),
+        recipients=[DebugAthena.receiver_email],
+        reuse_seconds=reuse_seconds
+    )
+    daemon.warm()
+    for name, expression in schedules.items():
+        daemon.schedule(name, expression)
+    server = daemon.serve(port=http_port)
+    try:
+        daemon.run_scheduler()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        daemon.stop()
+        telemetry.write('telemetry.json', 'telemetry.prom')
+
+if __name__ == "__main__":
+    main()
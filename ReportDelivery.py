@@ -0,0 +1,288 @@
+import gzip
+import os
+import queue
+import shutil
+import smtplib
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import Future
+from contextlib import contextmanager
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import List, Optional, Sequence
+
+from Telemetry import telemetry
+
+# Attachments larger than this (after compression) are sent as an S3 presigned link instead
+DEFAULT_LINK_THRESHOLD_BYTES = 10 * 1024 * 1024
+# Largest attachment read into a message when no link bucket is configured; most relays reject bigger mail
+DEFAULT_MAX_ATTACHMENT_BYTES = 25 * 1024 * 1024
+
+
+class SmtpConnectionPool:
+    """Reusable authenticated SMTP connections.
+
+    Idle connections are checked with NOOP before reuse and dropped after
+    idle_timeout seconds. A connection that fails mid-send is closed, not returned.
+    """
+
+    def __init__(self, host: str, port: int = 587, username: Optional[str] = None,
+                 password: Optional[str] = None, use_ssl: Optional[bool] = None, starttls: bool = True,
+                 max_connections: int = 2, idle_timeout: float = 60.0, timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        # Port 465 is implicit TLS; anything else upgrades with STARTTLS when enabled
+        self.use_ssl = (port == 465) if use_ssl is None else use_ssl
+        self.starttls = starttls and not self.use_ssl
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(max_connections)
+        self.lock = threading.Lock()
+        self.idle = []
+
+    def _connect(self) -> smtplib.SMTP:
+        if self.use_ssl:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                server.starttls()
+        if self.username:
+            server.login(self.username, self.password)
+        telemetry.count('smtp_connections_opened')
+        return server
+
+    @staticmethod
+    def _close(server: smtplib.SMTP) -> None:
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _checkout(self) -> smtplib.SMTP:
+        while True:
+            with self.lock:
+                if not self.idle:
+                    break
+                server, released_at = self.idle.pop()
+            if time.monotonic() - released_at < self.idle_timeout:
+                try:
+                    if server.noop()[0] == 250:
+                        telemetry.count('smtp_connections_reused')
+                        return server
+                except (smtplib.SMTPException, OSError):
+                    pass
+            self._close(server)
+        return self._connect()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for a batch of sends"""
+        self.slots.acquire()
+        server = None
+        try:
+            server = self._checkout()
+            yield server
+        except Exception:
+            if server is not None:
+                self._close(server)
+                server = None
+            raise
+        finally:
+            if server is not None:
+                with self.lock:
+                    self.idle.append((server, time.monotonic()))
+            self.slots.release()
+
+    def close(self) -> None:
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for server, _ in idle:
+            self._close(server)
+
+
+def compress_file(path: str, compression: Optional[str], output_dir: Optional[str] = None) -> str:
+    """Stream a file into a .gz or .zip next to it (or in output_dir) and return the new path.
+
+    compression=None returns the path unchanged.
+    """
+    if not compression:
+        return path
+    name = os.path.basename(path)
+    output_dir = output_dir or os.path.dirname(os.path.abspath(path))
+    with telemetry.phase('report_compression'):
+        if compression == 'gzip':
+            output_path = os.path.join(output_dir, name + '.gz')
+            with open(path, 'rb') as source, gzip.open(output_path, 'wb') as target:
+                shutil.copyfileobj(source, target, 1024 * 1024)
+        elif compression == 'zip':
+            output_path = os.path.join(output_dir, os.path.splitext(name)[0] + '.zip')
+            with open(path, 'rb') as source, \
+                    zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as archive, \
+                    archive.open(name, 'w', force_zip64=True) as target:
+                shutil.copyfileobj(source, target, 1024 * 1024)
+        else:
+            raise ValueError(f"Unsupported compression: {compression}")
+    return output_path
+
+
+class Report:
+    """One report to deliver: a file, a subject and the recipients that should get it"""
+
+    def __init__(self, path: str, subject: str, recipients: Sequence[str],
+                 body: str = "Please find attached the results of your Athena query."):
+        self.path = path
+        self.subject = subject
+        self.recipients = list(recipients)
+        self.body = body
+
+
+class ReportDelivery:
+    """Compress reports and mail them over pooled SMTP connections, optionally in the background.
+
+    Each report is compressed once and sent as a single message to all of its
+    recipients. Attachments above link_threshold_bytes are uploaded to S3 and sent
+    as a presigned link. Without a link bucket, attachments above
+    max_attachment_bytes are refused rather than read into memory. Queued reports
+    are sent by one worker thread in batches of up to batch_size per borrowed connection.
+    """
+
+    def __init__(self, pool: SmtpConnectionPool, sender: str, compression: Optional[str] = 'gzip',
+                 link_threshold_bytes: int = DEFAULT_LINK_THRESHOLD_BYTES, s3_client=None,
+                 link_bucket: Optional[str] = None, link_prefix: str = 'reports/',
+                 link_expires_seconds: int = 7 * 24 * 3600, batch_size: int = 20,
+                 max_attachment_bytes: int = DEFAULT_MAX_ATTACHMENT_BYTES):
+        self.pool = pool
+        self.sender = sender
+        self.compression = compression
+        self.link_threshold_bytes = link_threshold_bytes
+        self.s3_client = s3_client
+        self.link_bucket = link_bucket
+        self.link_prefix = link_prefix
+        self.link_expires_seconds = link_expires_seconds
+        self.batch_size = batch_size
+        self.max_attachment_bytes = max_attachment_bytes
+        self.queue = queue.Queue()
+        self.worker = None
+        self.lock = threading.Lock()
+
+    def _presigned_link(self, path: str) -> str:
+        key = f"{self.link_prefix}{time.strftime('%Y/%m/%d')}/{os.path.basename(path)}"
+        with telemetry.phase('report_upload'):
+            self.s3_client.upload_file(path, self.link_bucket, key)
+        telemetry.add_bytes('report_upload', os.path.getsize(path))
+        return self.s3_client.generate_presigned_url(
+            'get_object', Params={'Bucket': self.link_bucket, 'Key': key}, ExpiresIn=self.link_expires_seconds
+        )
+
+    def build_message(self, report: Report, work_dir: str) -> MIMEMultipart:
+        msg = MIMEMultipart()
+        msg['From'] = self.sender
+        msg['To'] = ', '.join(report.recipients)
+        msg['Subject'] = report.subject
+
+        attachment_path = compress_file(report.path, self.compression, work_dir)
+        size = os.path.getsize(attachment_path)
+        if size > self.link_threshold_bytes and self.s3_client is not None and self.link_bucket:
+            link = self._presigned_link(attachment_path)
+            days = self.link_expires_seconds // 86400
+            msg.attach(MIMEText(f"{report.body}\n\nThe report is {size / 1e6:.1f} MB, download it here "
+                                f"(link expires in {days} days):\n{link}\n", 'plain'))
+            return msg
+        if size > self.max_attachment_bytes:
+            raise ValueError(f"{attachment_path} is {size / 1e6:.1f} MB, over the "
+                             f"{self.max_attachment_bytes / 1e6:.1f} MB attachment limit; configure a link bucket")
+
+        msg.attach(MIMEText(report.body, 'plain'))
+        name = os.path.basename(attachment_path)
+        with open(attachment_path, 'rb') as file:
+            attachment = MIMEApplication(file.read(), Name=name)
+        attachment['Content-Disposition'] = f'attachment; filename="{name}"'
+        msg.attach(attachment)
+        telemetry.add_bytes('smtp_attachment', size)
+        return msg
+
+    def send(self, reports: Sequence[Report]) -> List[bool]:
+        """Send reports now over one borrowed connection; returns per-report success.
+
+        Each message is built right before it is sent and dropped afterwards, so at
+        most one compressed attachment is on disk or in memory at a time.
+        """
+        results = []
+        with telemetry.phase('report_delivery'):
+            try:
+                with self.pool.connection() as server:
+                    for report in reports:
+                        results.append(self._send_one(server, report))
+            except Exception as e:
+                print(f"Failed to send email: {str(e)}")
+                results.extend([False] * (len(reports) - len(results)))
+        return results
+
+    def _send_one(self, server: smtplib.SMTP, report: Report) -> bool:
+        with tempfile.TemporaryDirectory(prefix='report-delivery-') as work_dir:
+            try:
+                msg = self.build_message(report, work_dir)
+            except Exception as e:
+                print(f"Failed to prepare {report.path}: {str(e)}")
+                return False
+            try:
+                server.send_message(msg, self.sender, report.recipients)
+            except smtplib.SMTPRecipientsRefused as e:
+                print(f"Failed to send {report.path}: {str(e)}")
+                return False
+        print(f"Email sent successfully to {', '.join(report.recipients)}")
+        return True
+
+    def submit(self, report: Report) -> Future:
+        """Queue a report for the background sender; the future resolves to True once it is sent"""
+        future = Future()
+        with self.lock:
+            if self.worker is None:
+                self.worker = threading.Thread(target=self._run, name='report-delivery', daemon=True)
+                self.worker.start()
+        self.queue.put((report, future))
+        return future
+
+    def _run(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            try:
+                results = self.send([report for report, _ in batch])
+                for (_, future), sent in zip(batch, results):
+                    future.set_result(sent)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            if stop:
+                return
+
+    def close(self, wait: bool = True) -> None:
+        """Stop the background sender after it drains the queue, then close pooled connections"""
+        with self.lock:
+            worker, self.worker = self.worker, None
+        if worker is not None:
+            self.queue.put(None)
+            if not wait:
+                return
+            worker.join()
+        self.pool.close()
@@ -0,0 +1,202 @@
+import hashlib
+import json
+import mmap
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from Telemetry import telemetry
+
+if TYPE_CHECKING:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+
+MB = 1024 * 1024
+
+
+def default_transfer_config() -> 'TransferConfig':
+    """Multipart settings for upload_file/download_file; parts large enough to amortize request overhead"""
+    from boto3.s3.transfer import TransferConfig
+
+    return TransferConfig(
+        multipart_threshold=16 * MB,
+        multipart_chunksize=16 * MB,
+        max_concurrency=10,
+        use_threads=True
+    )
+
+
+def pooled_s3_client(session: Optional['boto3.Session'] = None, max_workers: int = 10, region_name: str = None,
+                     endpoint_url: Optional[str] = None):
+    """S3 client whose connection pool is large enough for max_workers concurrent part transfers"""
+    import boto3
+    from botocore.config import Config
+
+    session = session or boto3.Session(region_name=region_name)
+    config = Config(max_pool_connections=max(10, max_workers), retries={'mode': 'standard'})
+    return telemetry.instrument(session.client('s3', config=config, endpoint_url=endpoint_url))
+
+
+def etag_md5(path_or_buffer, etag: str, part_size: Optional[int] = None) -> Optional[bool]:
+    """Check content against an S3 ETag.
+
+    Plain ETags are the MD5 of the object, multipart ETags are the MD5 of the part
+    MD5s followed by -<parts>. Returns None when the ETag cannot be checked that way
+    (e.g. SSE-KMS objects, or a multipart ETag without a known part size).
+    """
+    etag = etag.strip('"')
+    digest, _, parts = etag.partition('-')
+    if len(digest) != 32:
+        return None
+    if isinstance(path_or_buffer, str):
+        with open(path_or_buffer, 'rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            if size == 0:
+                return hashlib.md5(b'').hexdigest() == digest and not parts
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                return etag_md5(buffer, etag, part_size)
+    buffer = path_or_buffer
+    if not parts:
+        return hashlib.md5(buffer).hexdigest() == digest
+    if not part_size:
+        return None
+    part_digests = b''.join(
+        hashlib.md5(buffer[start:start + part_size]).digest() for start in range(0, len(buffer), part_size)
+    )
+    return hashlib.md5(part_digests).hexdigest() == digest and str(-(-len(buffer) // part_size)) == parts
+
+
+class S3Transfer:
+    """Parallel S3 transfers over one pooled client.
+
+    download() splits an object into byte ranges fetched concurrently straight into a
+    memory-mapped file. Finished ranges are journalled next to the download so an
+    interrupted transfer resumes where it stopped, and the result is checked against
+    the object's ETag before it is moved into place.
+    """
+
+    def __init__(self, s3_client=None, part_size: int = 16 * MB, max_workers: int = 10,
+                 transfer_config: Optional['TransferConfig'] = None):
+        self.s3_client = s3_client or pooled_s3_client(max_workers=max_workers)
+        self.part_size = part_size
+        self.max_workers = max_workers
+        self.transfer_config = transfer_config or default_transfer_config()
+
+    def upload(self, path: str, bucket: str, key: str, extra_args: Optional[dict] = None) -> None:
+        """Multipart upload tuned by transfer_config"""
+        with telemetry.phase('s3_upload'):
+            self.s3_client.upload_file(path, bucket, key, ExtraArgs=extra_args, Config=self.transfer_config)
+        telemetry.add_bytes('s3_upload', os.path.getsize(path))
+
+    def download_file(self, bucket: str, key: str, path: str) -> None:
+        """Managed download via boto3's transfer manager, for callers that do not need resume"""
+        with telemetry.phase('s3_download'):
+            self.s3_client.download_file(bucket, key, path, Config=self.transfer_config)
+
+    def _ranges(self, size: int) -> List[Tuple[int, int]]:
+        return [(start, min(start + self.part_size, size) - 1) for start in range(0, size, self.part_size)]
+
+    @staticmethod
+    def _load_journal(journal_path: str) -> dict:
+        if not os.path.exists(journal_path):
+            return {}
+        with open(journal_path, 'r') as file:
+            return json.load(file)
+
+    @staticmethod
+    def _save_journal(journal_path: str, journal: dict) -> None:
+        temp_path = journal_path + '.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(journal, file)
+        os.replace(temp_path, journal_path)
+
+    def _upload_part_size(self, bucket: str, key: str, etag: str) -> Optional[int]:
+        # The size of part 1 is the part size the object was uploaded with
+        if '-' not in etag:
+            return None
+        try:
+            return self.s3_client.head_object(Bucket=bucket, Key=key, PartNumber=1)['ContentLength']
+        except Exception:
+            return None
+
+    def download(self, bucket: str, key: str, path: str, verify: bool = True, resume: bool = True) -> Dict:
+        """Download an object with parallel ranged GETs; returns size, parts fetched/resumed and verification.
+
+        Data lands in path + '.part' and is renamed to path once complete and verified.
+        """
+        head = self.s3_client.head_object(Bucket=bucket, Key=key)
+        size = head['ContentLength']
+        etag = head['ETag']
+        partial_path = path + '.part'
+        journal_path = path + '.parts.json'
+
+        journal = self._load_journal(journal_path) if resume else {}
+        if (journal.get('etag') != etag or journal.get('size') != size
+                or journal.get('part_size') != self.part_size or not os.path.exists(partial_path)):
+            journal = {'etag': etag, 'size': size, 'part_size': self.part_size, 'completed': []}
+        completed = set(journal['completed'])
+        ranges = self._ranges(size)
+        pending = [index for index in range(len(ranges)) if index not in completed]
+        if completed:
+            telemetry.count('s3_parts_resumed', len(completed))
+            print(f"Resuming s3://{bucket}/{key}: {len(completed)}/{len(ranges)} parts already downloaded")
+
+        with open(partial_path, 'r+b' if completed else 'w+b') as file:
+            file.truncate(size)
+            if size == 0:
+                verified = etag_md5(partial_path, etag) if verify else None
+            else:
+                with mmap.mmap(file.fileno(), size) as buffer, telemetry.phase('s3_download'):
+                    self._fetch_parts(bucket, key, etag, ranges, pending, buffer, journal, journal_path)
+                    buffer.flush()
+                    verified = None
+                    if verify:
+                        verified = etag_md5(buffer, etag, self._upload_part_size(bucket, key, etag))
+
+        if verified is False:
+            os.remove(partial_path)
+            if os.path.exists(journal_path):
+                os.remove(journal_path)
+            raise IOError(f"Checksum mismatch for s3://{bucket}/{key}; partial download discarded")
+        os.replace(partial_path, path)
+        if os.path.exists(journal_path):
+            os.remove(journal_path)
+        return {'bytes': size, 'parts': len(ranges), 'parts_fetched': len(pending),
+                'parts_resumed': len(completed), 'verified': verified}
+
+    def _fetch_parts(self, bucket: str, key: str, etag: str, ranges: List[Tuple[int, int]], pending: List[int],
+                     buffer: mmap.mmap, journal: dict, journal_path: str) -> None:
+        lock = threading.Lock()
+
+        def fetch(index):
+            start, end = ranges[index]
+            # IfMatch fails the part if the object changed since the download started
+            response = self.s3_client.get_object(Bucket=bucket, Key=key, Range=f'bytes={start}-{end}', IfMatch=etag)
+            view = memoryview(buffer)[start:end + 1]
+            try:
+                body = response['Body']
+                offset = 0
+                while offset < len(view):
+                    chunk = body.read(min(MB, len(view) - offset))
+                    if not chunk:
+                        raise IOError(f"Short read for bytes {start}-{end} of s3://{bucket}/{key}")
+                    view[offset:offset + len(chunk)] = chunk
+                    offset += len(chunk)
+            finally:
+                view.release()
+            telemetry.add_bytes('s3_download', end - start + 1)
+            with lock:
+                journal['completed'].append(index)
+                self._save_journal(journal_path, journal)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(fetch, index) for index in pending]
+            try:
+                for future in futures:
+                    future.result()
+            except Exception:
+                # Stop queued parts; finished ones are already journalled for the next attempt
+                for future in futures:
+                    future.cancel()
+                raise
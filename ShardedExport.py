@@ -0,0 +1,260 @@
+import csv
+import json
+import os
+import socket
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional
+
+from GetQDevUserData import OUTPUT_FIELDNAMES, CodeWhispererUserManager
+from IdentityCache import IdentityCache
+from PrincipalGraph import PrincipalGraph, list_assignments
+from UserHydrator import TokenBucket
+
+if TYPE_CHECKING:
+    import boto3
+
+
+def shard_of(user_id: str, shard_count: int) -> int:
+    """Stable shard for a user ID, the same in every process and on every node"""
+    return zlib.crc32(user_id.encode('utf-8')) % shard_count
+
+
+def _write_atomic(path: str, content: str) -> None:
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as file:
+        file.write(content)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+
+class ShardPaths:
+    """File layout of one shard inside a job directory"""
+
+    def __init__(self, job_dir: str, shard: int):
+        prefix = os.path.join(job_dir, f'shard-{shard:04d}')
+        self.ids = prefix + '.ids'
+        self.part = prefix + '.part.csv'
+        self.journal = prefix + '.journal.json'
+        self.done = prefix + '.done'
+
+
+def run_shard(job_dir: str, shard: int, region_name: str = 'us-east-1', cache_path: Optional[str] = None,
+              requests_per_second: float = 20.0, batch_size: int = 500,
+              session: Optional['boto3.Session'] = None) -> int:
+    """Hydrate one shard into its part file; safe to rerun after a crash or on another node.
+
+    Progress is journalled after every batch (see CodeWhispererUserManager.stream_users),
+    so a rerun truncates the part file to the last journalled offset and continues.
+    If any user fails to load (other than users deleted since planning) the shard
+    raises HydrationError and is not marked done, so the rerun retries those users.
+    Returns the number of users written by this call.
+    """
+    paths = ShardPaths(job_dir, shard)
+    if os.path.exists(paths.done):
+        return 0
+    with open(os.path.join(job_dir, 'manifest.json'), 'r') as file:
+        manifest = json.load(file)
+
+    with open(paths.ids, 'r') as file:
+        rows = [(line.rstrip('\n'), None) for line in file if line.strip()]
+    # Identifies this shard of this plan, the same on every node, so a journal left by another plan is ignored
+    input_identity = {'shard': shard, 'planned_at': manifest['planned_at'], 'users': len(rows)}
+
+    cache = IdentityCache(cache_path) if cache_path else None
+    try:
+        manager = CodeWhispererUserManager(region_name, cache=cache, session=session)
+        # The coordinator already resolved the identity store, so workers skip list_instances
+        manager.identity_store_id = manifest['identity_store_id']
+        manager.hydrator.bucket = TokenBucket(requests_per_second)
+        manager.hydrator.verbose = False
+
+        written = manager.stream_users(rows, paths.part, batch_size=batch_size, checkpoint_path=paths.journal,
+                                       input_identity=input_identity, require_all=True)
+        _write_atomic(paths.done, json.dumps({'users': len(rows), 'finished_at': time.time()}))
+        return written
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+class ShardedExport:
+    """Export an application's users as independent, resumable shards.
+
+    plan() lists assignments once, splits the user IDs across shard_count shards by a
+    stable hash and writes them to the job directory with a manifest. Shards then run
+    in a process pool, or on other nodes via run_shard, each writing its own part
+    file. A restart redoes only the shards without a .done marker, continuing from
+    their journal, and merge() concatenates the parts once every shard is done.
+
+    Nodes that start on the same job directory at once plan it only once: plan()
+    holds an exclusive lock file while it writes the plan, and the other nodes wait
+    for the manifest instead of writing shard files of their own.
+    """
+
+    def __init__(self, job_dir: str, shard_count: int = 16, plan_timeout: float = 600.0,
+                 poll_interval: float = 1.0):
+        self.job_dir = job_dir
+        self.shard_count = shard_count
+        self.plan_timeout = plan_timeout
+        self.poll_interval = poll_interval
+        self.manifest_path = os.path.join(job_dir, 'manifest.json')
+        self.lock_path = os.path.join(job_dir, 'plan.lock')
+        os.makedirs(job_dir, exist_ok=True)
+
+    def manifest(self) -> Optional[dict]:
+        if not os.path.exists(self.manifest_path):
+            return None
+        with open(self.manifest_path, 'r') as file:
+            return json.load(file)
+
+    def plan(self, application_arn: str, manager: CodeWhispererUserManager) -> dict:
+        """Write the shard ID files and manifest, or return the existing manifest when resuming.
+
+        Only the node holding plan.lock plans; any other node waits up to plan_timeout
+        seconds for that plan's manifest. A lock left by a planner that died is not
+        broken automatically; remove plan.lock once no node is planning.
+        """
+        deadline = time.monotonic() + self.plan_timeout
+        while True:
+            manifest = self.manifest()
+            if manifest is not None:
+                return self._resume(application_arn, manifest)
+            try:
+                lock = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"No plan appeared in {self.job_dir} within {self.plan_timeout}s; "
+                                       f"if no node is planning, remove {self.lock_path}")
+                time.sleep(self.poll_interval)
+                continue
+            try:
+                os.write(lock, f'{socket.gethostname()} {os.getpid()}\n'.encode('utf-8'))
+                os.close(lock)
+                # Another node may have finished planning between the manifest check and the lock
+                manifest = self.manifest()
+                if manifest is not None:
+                    return self._resume(application_arn, manifest)
+                return self._write_plan(application_arn, manager)
+            finally:
+                os.remove(self.lock_path)
+
+    def _resume(self, application_arn: str, manifest: dict) -> dict:
+        if manifest['application_arn'] != application_arn:
+            raise ValueError(f"{self.job_dir} holds a job for {manifest['application_arn']}")
+        self.shard_count = manifest['shard_count']
+        print(f"Resuming job in {self.job_dir}: {len(self.pending_shards())}/{self.shard_count} shards left")
+        return manifest
+
+    def _write_plan(self, application_arn: str, manager: CodeWhispererUserManager) -> dict:
+        direct_user_ids, group_ids = list_assignments(manager.sso_admin_client, application_arn)
+        graph = PrincipalGraph()
+        graph.expand_groups(manager.identity_store_client, manager.identity_store_id, group_ids)
+        user_ids = dict.fromkeys(direct_user_ids)
+        user_ids.update(dict.fromkeys(graph.users()))
+
+        shards: List[List[str]] = [[] for _ in range(self.shard_count)]
+        for user_id in user_ids:
+            shards[shard_of(user_id, self.shard_count)].append(user_id)
+        for shard, shard_user_ids in enumerate(shards):
+            _write_atomic(ShardPaths(self.job_dir, shard).ids, ''.join(f'{user_id}\n' for user_id in shard_user_ids))
+
+        # The manifest is written last, so its presence means the plan is complete
+        manifest = {
+            'application_arn': application_arn,
+            'identity_store_id': manager.identity_store_id,
+            'shard_count': self.shard_count,
+            'users': len(user_ids),
+            'fieldnames': OUTPUT_FIELDNAMES,
+            'planned_at': time.time()
+        }
+        _write_atomic(self.manifest_path, json.dumps(manifest, indent=2))
+        print(f"Planned {len(user_ids)} users across {self.shard_count} shards in {self.job_dir}")
+        return manifest
+
+    def pending_shards(self) -> List[int]:
+        return [shard for shard in range(self.shard_count)
+                if not os.path.exists(ShardPaths(self.job_dir, shard).done)]
+
+    def run(self, workers: int = 4, shards: Optional[Iterable[int]] = None, region_name: str = 'us-east-1',
+            cache_path: Optional[str] = None, requests_per_second: float = 20.0,
+            session: Optional['boto3.Session'] = None) -> Dict[int, str]:
+        """Run pending shards (optionally only the given ones); returns {shard: error} for failures.
+
+        requests_per_second is the budget for the whole run and is split across workers.
+        workers <= 1 runs the shards in this process, which also allows passing a session.
+        """
+        pending = [shard for shard in (shards if shards is not None else self.pending_shards())
+                   if not os.path.exists(ShardPaths(self.job_dir, shard).done)]
+        per_worker_rate = requests_per_second / max(1, min(workers, len(pending) or 1))
+        failures = {}
+        if workers <= 1:
+            for shard in pending:
+                try:
+                    run_shard(self.job_dir, shard, region_name, cache_path, per_worker_rate, session=session)
+                except Exception as e:
+                    failures[shard] = str(e)
+                    print(f"Shard {shard} failed: {str(e)}")
+            return failures
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(run_shard, self.job_dir, shard, region_name, cache_path, per_worker_rate): shard
+                for shard in pending
+            }
+            for completed, future in enumerate(as_completed(futures), 1):
+                shard = futures[future]
+                try:
+                    future.result()
+                    print(f"Shard {shard} done ({completed}/{len(futures)})")
+                except Exception as e:
+                    failures[shard] = str(e)
+                    print(f"Shard {shard} failed: {str(e)}")
+        return failures
+
+    def _part_rows(self) -> Iterator[str]:
+        for shard in range(self.shard_count):
+            with open(ShardPaths(self.job_dir, shard).part, 'r', newline='') as file:
+                next(file, None)
+                for line in file:
+                    yield line
+
+    def merge(self, output_path: str) -> int:
+        """Concatenate every shard's part file into output_path; all shards must be done"""
+        pending = self.pending_shards()
+        if pending:
+            raise RuntimeError(f"Cannot merge, {len(pending)} shards are not done: {pending[:10]}")
+        temp_path = output_path + '.tmp'
+        rows = 0
+        with open(temp_path, 'w', newline='') as output:
+            csv.writer(output).writerow(self.manifest()['fieldnames'])
+            for line in self._part_rows():
+                output.write(line)
+                rows += 1
+        os.replace(temp_path, output_path)
+        print(f"Merged {rows} users from {self.shard_count} shards into {output_path}")
+        return rows
+
+
+def main():
+    # Replace with your application ARN
+    application_arn = "arn:aws:sso::1234:application/ssoins-1234/apl-1234"
+    region_name = "us-east-1"  # Change to your Identity Center region
+    # Keep the job directory between runs; a rerun only redoes unfinished shards
+    job_dir = "sharded_export"
+    shard_count = 16
+    workers = 4
+    output_path = "sharded_users.csv"
+
+    export = ShardedExport(job_dir, shard_count)
+    export.plan(application_arn, CodeWhispererUserManager(region_name))
+    failures = export.run(workers, region_name=region_name, cache_path='identity_cache.db')
+    if failures:
+        print(f"{len(failures)} shards failed; rerun to retry them")
+        return
+    export.merge(output_path)
+
+if __name__ == "__main__":
+    main()
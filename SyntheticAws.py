@@ -0,0 +1,235 @@
+"""In-process stand-ins for the Identity Center, Identity Store, Athena and S3 APIs.
+
+SyntheticSession hands out clients backed by a seeded SyntheticTenant. Every call
+is counted by a CallRecorder, which can also add a fixed latency per call.
+Benchmark.py and the tests use them. moto is not used here: it does not implement
+sso-admin list_application_assignments, which every manager starts from. Its
+per-request overhead would also swamp the timings, and it has no per-call latency.
+"""
+import csv
+import io
+import random
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from botocore.exceptions import ClientError
+from botocore.response import StreamingBody
+
+APPLICATION_ARN = 'arn:aws:sso::111122223333:application/ssoins-bench/apl-bench'
+IDENTITY_STORE_ID = 'd-bench000000'
+
+
+class _Paginator:
+    """Minimal stand-in for botocore paginators over NextToken-based operations"""
+
+    def __init__(self, operation: Callable):
+        self.operation = operation
+
+    def paginate(self, **kwargs):
+        kwargs.pop('PaginationConfig', None)
+        while True:
+            page = self.operation(**kwargs)
+            yield page
+            if not page.get('NextToken'):
+                break
+            kwargs['NextToken'] = page['NextToken']
+
+
+class CallRecorder:
+    """Counts API calls per operation and adds a fixed simulated network latency"""
+
+    def __init__(self, latency_seconds: float):
+        self.latency_seconds = latency_seconds
+        self.calls: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def record(self, operation: str) -> None:
+        with self.lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.calls = {}
+
+
+class SyntheticTenant:
+    """Identity Center tenant with users, groups and overlapping memberships generated from a seed"""
+
+    def __init__(self, users: int = 10000, groups: int = 1000, groups_per_user: int = 3,
+                 direct_users: int = 500, page_size: int = 100, seed: int = 7):
+        rng = random.Random(seed)
+        self.page_size = page_size
+        self.user_ids = [f'{IDENTITY_STORE_ID}-u{index:07d}' for index in range(users)]
+        self.group_ids = [f'{IDENTITY_STORE_ID}-g{index:05d}' for index in range(groups)]
+        members = {group_id: [] for group_id in self.group_ids}
+        for user_id in self.user_ids:
+            for group_id in rng.sample(self.group_ids, min(groups_per_user, groups)):
+                members[group_id].append(user_id)
+        self.members = members
+        self.assignments = (
+            [{'PrincipalType': 'GROUP', 'PrincipalId': group_id} for group_id in self.group_ids] +
+            [{'PrincipalType': 'USER', 'PrincipalId': user_id} for user_id in rng.sample(self.user_ids, min(direct_users, users))]
+        )
+        self.user_index = {user_id: index for index, user_id in enumerate(self.user_ids)}
+
+    def user(self, user_id: str) -> dict:
+        index = self.user_index[user_id]
+        return {
+            'UserId': user_id,
+            'IdentityStoreId': IDENTITY_STORE_ID,
+            'UserName': f'user{index}',
+            'DisplayName': f'User {index}',
+            'Name': {'GivenName': f'Given{index}', 'FamilyName': f'Family{index}'},
+            'Emails': [{'Value': f'user{index}@example.com', 'Type': 'work', 'Primary': True}]
+        }
+
+    def page(self, items: list, next_token: Optional[str]):
+        start = int(next_token or 0)
+        end = start + self.page_size
+        return items[start:end], (str(end) if end < len(items) else None)
+
+
+class SsoAdminStandIn:
+    def __init__(self, tenant: SyntheticTenant, recorder: CallRecorder):
+        self.tenant = tenant
+        self.recorder = recorder
+
+    def list_instances(self, **kwargs):
+        self.recorder.record('sso-admin.ListInstances')
+        return {'Instances': [{'InstanceArn': 'arn:aws:sso:::instance/ssoins-bench', 'IdentityStoreId': IDENTITY_STORE_ID}]}
+
+    def list_application_assignments(self, ApplicationArn, MaxResults=None, NextToken=None):
+        self.recorder.record('sso-admin.ListApplicationAssignments')
+        items, next_token = self.tenant.page(self.tenant.assignments, NextToken)
+        response = {'ApplicationAssignments': [dict(item, ApplicationArn=ApplicationArn) for item in items]}
+        if next_token:
+            response['NextToken'] = next_token
+        return response
+
+    def get_paginator(self, operation_name: str):
+        return _Paginator(getattr(self, operation_name))
+
+
+class IdentityStoreStandIn:
+    def __init__(self, tenant: SyntheticTenant, recorder: CallRecorder):
+        self.tenant = tenant
+        self.recorder = recorder
+
+    def describe_user(self, IdentityStoreId, UserId):
+        self.recorder.record('identitystore.DescribeUser')
+        if UserId not in self.tenant.user_index:
+            raise ClientError({'Error': {'Code': 'ResourceNotFoundException', 'Message': 'User not found'}}, 'DescribeUser')
+        return self.tenant.user(UserId)
+
+    def describe_group(self, IdentityStoreId, GroupId):
+        self.recorder.record('identitystore.DescribeGroup')
+        return {'Group': {'GroupId': GroupId, 'DisplayName': f'Group {GroupId[-5:]}'}}
+
+    def list_group_memberships(self, IdentityStoreId, GroupId, MaxResults=None, NextToken=None):
+        self.recorder.record('identitystore.ListGroupMemberships')
+        items, next_token = self.tenant.page(self.tenant.members[GroupId], NextToken)
+        response = {'GroupMemberships': [{'GroupId': GroupId, 'MemberId': {'UserId': user_id}} for user_id in items]}
+        if next_token:
+            response['NextToken'] = next_token
+        return response
+
+    def get_paginator(self, operation_name: str):
+        return _Paginator(getattr(self, operation_name))
+
+
+class AthenaStandIn:
+    """Athena whose queries succeed after a fixed runtime and whose result object lives in S3StandIn"""
+
+    def __init__(self, results: Dict[str, bytes], columns: List[tuple], runtime_seconds: float, recorder: CallRecorder):
+        self.results = results
+        self.columns = columns
+        self.runtime_seconds = runtime_seconds
+        self.recorder = recorder
+        self.started: Dict[str, tuple] = {}
+
+    def start_query_execution(self, **kwargs):
+        self.recorder.record('athena.StartQueryExecution')
+        query_execution_id = str(uuid.uuid4())
+        self.started[query_execution_id] = (time.monotonic(), kwargs['ResultConfiguration']['OutputLocation'])
+        return {'QueryExecutionId': query_execution_id}
+
+    def get_query_execution(self, QueryExecutionId):
+        self.recorder.record('athena.GetQueryExecution')
+        started, output_location = self.started[QueryExecutionId]
+        elapsed = time.monotonic() - started
+        state = 'SUCCEEDED' if elapsed >= self.runtime_seconds else 'RUNNING'
+        return {'QueryExecution': {
+            'QueryExecutionId': QueryExecutionId,
+            'Status': {'State': state},
+            'ResultConfiguration': {'OutputLocation': f'{output_location}{QueryExecutionId}.csv'},
+            'Statistics': {'TotalExecutionTimeInMillis': int(elapsed * 1000),
+                           'EngineExecutionTimeInMillis': int(elapsed * 1000), 'QueryQueueTimeInMillis': 0,
+                           'DataScannedInBytes': len(next(iter(self.results.values()), b''))}
+        }}
+
+    def get_query_results(self, QueryExecutionId, MaxResults=1000, NextToken=None):
+        """Page the result CSV (header row first) as the API does; empty fields come back as NULLs"""
+        self.recorder.record('athena.GetQueryResults')
+        body = next(iter(self.results.values()), b'').decode('utf-8')
+        rows = list(csv.reader(io.StringIO(body)))
+        start = int(NextToken or 0)
+        end = start + MaxResults
+        response = {'ResultSet': {
+            'Rows': [{'Data': [{'VarCharValue': value} if value else {} for value in row]} for row in rows[start:end]],
+            'ResultSetMetadata': {
+                'ColumnInfo': [{'Name': name, 'Type': column_type} for name, column_type in self.columns]}
+        }}
+        if end < len(rows):
+            response['NextToken'] = str(end)
+        return response
+
+    def get_paginator(self, operation_name: str):
+        return _Paginator(getattr(self, operation_name))
+
+
+class S3StandIn:
+    def __init__(self, body: bytes, recorder: CallRecorder):
+        self.body = body
+        self.recorder = recorder
+        self.bytes_transferred = 0
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self.recorder.record('s3.GetObject')
+        self.bytes_transferred += len(self.body)
+        return {'Body': StreamingBody(io.BytesIO(self.body), len(self.body)), 'ContentLength': len(self.body)}
+
+
+class SyntheticSession:
+    """boto3.Session look-alike whose clients are the in-process stand-ins"""
+
+    def __init__(self, tenant: SyntheticTenant, recorder: CallRecorder, athena_result: bytes = b'',
+                 athena_runtime_seconds: float = 1.0, athena_columns: Optional[List[tuple]] = None):
+        self.clients = {
+            'sso-admin': SsoAdminStandIn(tenant, recorder),
+            'identitystore': IdentityStoreStandIn(tenant, recorder),
+            'athena': AthenaStandIn({'result': athena_result},
+                                    athena_columns or [('userid', 'varchar'), ('latest_activity_date', 'timestamp')],
+                                    athena_runtime_seconds, recorder),
+            's3': S3StandIn(athena_result, recorder)
+        }
+
+    def client(self, service_name: str, **kwargs):
+        return self.clients[service_name]
+
+
+def synthetic_activity_csv(tenant: SyntheticTenant, seed: int = 11) -> bytes:
+    """Athena-style CSV of (userid, latest_activity_date) for every synthetic user"""
+    rng = random.Random(seed)
+    output = io.StringIO()
+    writer = csv.writer(output, quoting=csv.QUOTE_ALL, lineterminator='\n')
+    writer.writerow(['userid', 'latest_activity_date'])
+    today = date(2025, 6, 30)
+    for user_id in tenant.user_ids:
+        activity = datetime.combine(today - timedelta(days=rng.randint(0, 180)), datetime.min.time())
+        writer.writerow([user_id, activity.strftime('%Y-%m-%d %H:%M:%S.000')])
+    return output.getvalue().encode('utf-8')
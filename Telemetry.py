@@ -0,0 +1,187 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Tuple
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Error codes AWS APIs return when we exceed their request rate; shared with UserHydrator's retries
+THROTTLING_ERROR_CODES = ('ThrottlingException', 'TooManyRequestsException', 'RequestLimitExceeded',
+                          'Throttling', 'SlowDown')
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; not thread-safe on its own, Telemetry holds the lock"""
+
+    __slots__ = ('buckets', 'count', 'total', 'maximum')
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        index = 0
+        while index < len(LATENCY_BUCKETS) and seconds > LATENCY_BUCKETS[index]:
+            index += 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+
+    def cumulative(self) -> Iterator[Tuple[str, int]]:
+        running = 0
+        for bound, count in zip(LATENCY_BUCKETS + (float('inf'),), self.buckets):
+            running += count
+            yield ('+Inf' if bound == float('inf') else repr(bound)), running
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'total_seconds': round(self.total, 6),
+            'mean_seconds': round(self.total / self.count, 6) if self.count else 0.0,
+            'max_seconds': round(self.maximum, 6),
+            'buckets': dict(self.cumulative())
+        }
+
+
+class Telemetry:
+    """Per-operation API latency, retry/throttle counts, bytes transferred and phase timings"""
+
+    def __init__(self, prefix: str = 'qreport'):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.operations: Dict[str, Histogram] = {}
+        self.phases: Dict[str, Histogram] = {}
+        self.counters: Dict[str, int] = {}
+        self.bytes: Dict[str, int] = {}
+
+    def instrument(self, client):
+        """Register botocore event hooks on a client; objects without botocore events are returned untouched"""
+        events = getattr(getattr(client, 'meta', None), 'events', None)
+        if events is None:
+            return client
+        events.register('before-call', self._before_call, unique_id='telemetry-before-call')
+        events.register('after-call', self._after_call, unique_id='telemetry-after-call')
+        events.register('after-call-error', self._after_call_error, unique_id='telemetry-after-call-error')
+        events.register('needs-retry', self._needs_retry, unique_id='telemetry-needs-retry')
+        return client
+
+    @staticmethod
+    def _operation(event_name: str) -> str:
+        return event_name.split('.', 1)[1] if '.' in event_name else event_name
+
+    def _before_call(self, context=None, **kwargs):
+        if context is not None:
+            context['telemetry_start'] = time.perf_counter()
+
+    def _after_call(self, event_name, http_response=None, parsed=None, context=None, **kwargs):
+        operation = self._operation(event_name)
+        start = (context or {}).get('telemetry_start')
+        content_length = 0
+        if http_response is not None:
+            content_length = int(http_response.headers.get('content-length') or 0)
+        retries = ((parsed or {}).get('ResponseMetadata') or {}).get('RetryAttempts', 0)
+        with self.lock:
+            if start is not None:
+                self.operations.setdefault(operation, Histogram()).observe(time.perf_counter() - start)
+            if content_length:
+                self.bytes[operation] = self.bytes.get(operation, 0) + content_length
+            if retries:
+                self.counters['retries'] = self.counters.get('retries', 0) + retries
+            if http_response is not None and http_response.status_code >= 400:
+                self.counters['errors'] = self.counters.get('errors', 0) + 1
+
+    def _after_call_error(self, event_name, context=None, **kwargs):
+        self.count('errors')
+
+    def _needs_retry(self, response=None, attempts=None, **kwargs):
+        if not response:
+            return None
+        code = (response[1] or {}).get('Error', {}).get('Code')
+        if code in THROTTLING_ERROR_CODES:
+            self.count('throttled_responses')
+        return None
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a block of work under a phase name; repeated phases accumulate"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.phases.setdefault(name, Histogram()).observe(elapsed)
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def add_bytes(self, name: str, amount: int) -> None:
+        with self.lock:
+            self.bytes[name] = self.bytes.get(name, 0) + amount
+
+    def summary(self) -> dict:
+        with self.lock:
+            return {
+                'started_at': self.started_at,
+                'elapsed_seconds': round(time.time() - self.started_at, 3),
+                'operations': {name: histogram.to_dict() for name, histogram in sorted(self.operations.items())},
+                'phases': {name: histogram.to_dict() for name, histogram in sorted(self.phases.items())},
+                'counters': dict(sorted(self.counters.items())),
+                'bytes': dict(sorted(self.bytes.items()))
+            }
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self.lock:
+            for metric, label, histograms in (
+                    (f'{self.prefix}_api_latency_seconds', 'operation', self.operations),
+                    (f'{self.prefix}_phase_seconds', 'phase', self.phases)):
+                lines.append(f'# TYPE {metric} histogram')
+                for name, histogram in sorted(histograms.items()):
+                    for bound, count in histogram.cumulative():
+                        lines.append(f'{metric}_bucket{{{label}="{name}",le="{bound}"}} {count}')
+                    lines.append(f'{metric}_sum{{{label}="{name}"}} {histogram.total:.6f}')
+                    lines.append(f'{metric}_count{{{label}="{name}"}} {histogram.count}')
+            lines.append(f'# TYPE {self.prefix}_events_total counter')
+            for name, value in sorted(self.counters.items()):
+                lines.append(f'{self.prefix}_events_total{{event="{name}"}} {value}')
+            lines.append(f'# TYPE {self.prefix}_bytes_total counter')
+            for name, value in sorted(self.bytes.items()):
+                lines.append(f'{self.prefix}_bytes_total{{operation="{name}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, json_path: str = 'telemetry.json', prometheus_path: str = None) -> None:
+        """Write the run summary as JSON and, optionally, as a Prometheus textfile-collector file"""
+        _atomic_write(json_path, json.dumps(self.summary(), indent=2))
+        if prometheus_path:
+            _atomic_write(prometheus_path, self.to_prometheus())
+        print(f"Telemetry written to {json_path}" + (f" and {prometheus_path}" if prometheus_path else ''))
+
+    def reset(self) -> None:
+        with self.lock:
+            self.started_at = time.time()
+            self.operations = {}
+            self.phases = {}
+            self.counters = {}
+            self.bytes = {}
+
+
+def _atomic_write(path: str, content: str) -> None:
+    # Write then rename so a scraper never reads a half-written file
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as file:
+        file.write(content)
+    os.replace(temp_path, path)
+
+
+# Process-wide instance shared by the managers and scripts
+telemetry = Telemetry()
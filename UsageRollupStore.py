@@ -0,0 +1,214 @@
+import os
+import sqlite3
+from datetime import date
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from LocalUsageReport import (REPORT_COLUMNS, REPORT_RATIOS, REPORT_SUMS, aggregate_chunk, read_csv_chunks,
+                              write_athena_rows)
+from UsageStats import ACT_DATE_FORMAT
+
+SUM_COLUMNS = [name for name, _ in REPORT_SUMS]
+
+
+def list_partition_days(root: str) -> List[str]:
+    """Return the ISO days (YYYY-MM-DD) present as year=/month=/day= partitions under root"""
+    days = []
+    for year_dir in sorted(os.listdir(root)):
+        if not year_dir.startswith('year='):
+            continue
+        for month_dir in sorted(os.listdir(os.path.join(root, year_dir))):
+            if not month_dir.startswith('month='):
+                continue
+            for day_dir in sorted(os.listdir(os.path.join(root, year_dir, month_dir))):
+                if day_dir.startswith('day='):
+                    days.append(f"{year_dir[5:]}-{month_dir[6:]}-{day_dir[4:]}")
+    return days
+
+
+class UsageRollupStore:
+    """Per-user usage aggregates kept in SQLite as daily partial sums and advanced one day at a time.
+
+    Each ingest only reads act_date days from the reopened window onwards: the
+    high-water day and the lookback_days - 1 days before it, which are recomputed
+    from the input when it contains them, so rows arriving late for those days are
+    counted. Older days are treated as complete; rebuild() recomputes everything.
+    """
+
+    def __init__(self, path: str = 'usage_rollup.db', lookback_days: int = 1):
+        self.path = path
+        self.lookback_days = lookback_days
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        sum_columns = ', '.join(f'{name} INTEGER' for name in SUM_COLUMNS)
+        self.connection.executescript(f'''
+            CREATE TABLE IF NOT EXISTS daily_totals (
+                userid TEXT NOT NULL,
+                day TEXT NOT NULL,
+                {sum_columns},
+                PRIMARY KEY (userid, day)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS daily_totals_day ON daily_totals (day);
+            CREATE TABLE IF NOT EXISTS ingested_days (
+                day TEXT PRIMARY KEY
+            );
+        ''')
+        self.connection.commit()
+
+    @property
+    def high_water_mark(self) -> Optional[str]:
+        """Latest ISO day already ingested, or None for an empty store"""
+        return self.connection.execute('SELECT MAX(day) FROM ingested_days').fetchone()[0]
+
+    def reopened_from(self) -> Optional[str]:
+        """First ISO day an ingest reads and recomputes, or None to read everything"""
+        rows = self.connection.execute(
+            'SELECT day FROM ingested_days ORDER BY day DESC LIMIT ?', (self.lookback_days,)
+        ).fetchall()
+        return rows[-1][0] if rows else None
+
+    def ingest_chunks(self, chunks: Iterable[pd.DataFrame], date_format: str = ACT_DATE_FORMAT) -> int:
+        """Fold raw rows dated in or after the reopened window into the daily aggregates.
+
+        A reopened day that appears in the input is replaced by what the input holds
+        for it. The whole ingest commits as one transaction. Returns the number of
+        rows ingested.
+        """
+        with self.connection:
+            rows_ingested = self._ingest(chunks, date_format, self.reopened_from() or '')
+        print(f"Ingested {rows_ingested} rows; high-water mark is now {self.high_water_mark}")
+        return rows_ingested
+
+    def _ingest(self, chunks: Iterable[pd.DataFrame], date_format: str, since: str) -> int:
+        # Runs inside the caller's transaction; nothing here commits
+        sum_list = ', '.join(SUM_COLUMNS)
+        placeholders = ', '.join('?' * (len(SUM_COLUMNS) + 2))
+        updates = ', '.join(
+            f'{name} = CASE WHEN excluded.{name} IS NULL THEN {name} '
+            f'WHEN {name} IS NULL THEN excluded.{name} ELSE {name} + excluded.{name} END'
+            for name in SUM_COLUMNS
+        )
+        upsert = (f'INSERT INTO daily_totals (userid, day, {sum_list}) VALUES ({placeholders}) '
+                  f'ON CONFLICT(userid, day) DO UPDATE SET {updates}')
+
+        rows_ingested = 0
+        skipped = 0
+        replaced = set()
+        for chunk in chunks:
+            days = pd.to_datetime(chunk['act_date'], format=date_format, errors='coerce').dt.strftime('%Y-%m-%d')
+            skipped += int(days.isna().sum())
+            keep = days.notna() & (days >= since)
+            chunk = chunk[keep]
+            days = days[keep]
+            if chunk.empty:
+                continue
+
+            for day, day_chunk in chunk.groupby(days, sort=False):
+                if day not in replaced:
+                    # First rows for this day in this ingest: drop what an earlier ingest stored for it
+                    self.connection.execute('DELETE FROM daily_totals WHERE day = ?', (day,))
+                    replaced.add(day)
+                sums, _ = aggregate_chunk(day_chunk)
+                self.connection.executemany(upsert, [
+                    (userid, day, *[None if pd.isna(value) else int(value) for value in values])
+                    for userid, values in zip(sums.index, sums[SUM_COLUMNS].itertuples(index=False, name=None))
+                ])
+            rows_ingested += len(chunk)
+
+        self.connection.executemany('INSERT OR IGNORE INTO ingested_days (day) VALUES (?)',
+                                    [(day,) for day in sorted(replaced)])
+        if skipped:
+            print(f"Skipped {skipped} rows with an unparseable act_date")
+        return rows_ingested
+
+    def ingest_csv(self, csv_paths: Sequence[str]) -> int:
+        return self.ingest_chunks(read_csv_chunks(csv_paths))
+
+    def ingest_parquet(self, root: str) -> int:
+        """Read only the day partitions in or after the reopened window from a compacted Parquet tree"""
+        from LocalUsageReport import read_parquet_chunks
+
+        since = self.reopened_from()
+        new_days = [day for day in list_partition_days(root) if not since or day >= since]
+        if not new_days:
+            print(f"No partitions from {since} on to ingest")
+            return 0
+        start = date.fromisoformat(new_days[0])
+        end = date.fromisoformat(new_days[-1])
+        print(f"Ingesting {len(new_days)} partitions from {start} to {end}")
+        return self.ingest_chunks(read_parquet_chunks(root, start, end))
+
+    def _clear(self) -> None:
+        self.connection.execute('DELETE FROM daily_totals')
+        self.connection.execute('DELETE FROM ingested_days')
+
+    def clear(self) -> None:
+        with self.connection:
+            self._clear()
+
+    def rebuild(self, chunks: Iterable[pd.DataFrame], date_format: str = ACT_DATE_FORMAT) -> int:
+        """Recompute every aggregate from the full history in one transaction.
+
+        If reading the history fails, the transaction rolls back and the previous
+        aggregates are kept.
+        """
+        with self.connection:
+            self._clear()
+            rows_ingested = self._ingest(chunks, date_format, '')
+        print(f"Rebuilt from {rows_ingested} rows; high-water mark is now {self.high_water_mark}")
+        return rows_ingested
+
+    def report_rows(self) -> Tuple[List[str], List[tuple]]:
+        """Return the AthenaQ.sql report columns and rows from the stored aggregates"""
+        ratio_columns = ', '.join(
+            f'{numerator} / NULLIF({denominator}, 0) AS {name}' for name, numerator, denominator in REPORT_RATIOS
+        )
+        sum_columns = ', '.join(f'SUM({name}) AS {name}' for name in SUM_COLUMNS)
+        rows = self.connection.execute(f'''
+            SELECT userid, active_days, {', '.join(SUM_COLUMNS)}, {ratio_columns}
+            FROM (SELECT userid, COUNT(*) AS active_days, {sum_columns} FROM daily_totals GROUP BY userid)
+            ORDER BY active_days DESC, userid
+        ''').fetchall()
+        return REPORT_COLUMNS, rows
+
+    def write_report(self, output_path: str) -> None:
+        columns, rows = self.report_rows()
+        write_athena_rows(columns, rows, output_path)
+        print(f"Wrote usage report for {len(rows)} users to {output_path}")
+
+    def latest_activity(self) -> List[Tuple[str, str]]:
+        """(userid, last active ISO day) for every user, most recent first"""
+        return self.connection.execute(
+            'SELECT userid, MAX(day) AS last_act_day FROM daily_totals GROUP BY userid '
+            'ORDER BY last_act_day DESC, userid'
+        ).fetchall()
+
+    def write_latest_activity(self, output_path: str) -> None:
+        """Write UserID,latest_activity_date in the layout GetQDevUserData reads"""
+        rows = [(userid, f'{day} 00:00:00.000') for userid, day in self.latest_activity()]
+        write_athena_rows(['UserID', 'latest_activity_date'], rows, output_path)
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def main():
+    # Parquet root written by ParquetCompactor
+    parquet_root = 'by_user_analytic_parquet'
+    # Set to True to recompute every aggregate from the full history
+    full_rebuild = False
+
+    store = UsageRollupStore()
+    if full_rebuild:
+        from LocalUsageReport import read_parquet_chunks
+
+        store.rebuild(read_parquet_chunks(parquet_root))
+    else:
+        store.ingest_parquet(parquet_root)
+    store.write_report('usage_report.csv')
+    store.write_latest_activity('latest_activity.csv')
+    store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""Layout of the raw devq_userdata_stats logs, shared by the pandas and pyarrow readers"""
+
+# Columns that hold counts (everything but userid and act_date), in DDL.sql order
+COUNT_COLUMNS = [
+    'chat_aicodelines', 'chat_messagesinteracted', 'chat_messagessent',
+    'codefix_acceptanceeventcount', 'codefix_acceptedlines', 'codefix_generatedlines',
+    'codefix_generationeventcount', 'codereview_failedeventcount', 'codereview_findingscount',
+    'codereview_succeededeventcount', 'dev_acceptanceeventcount', 'dev_acceptedlines',
+    'dev_generatedlines', 'dev_generationeventcount', 'docgeneration_acceptedfileupdates',
+    'docgeneration_acceptedfilescreations', 'docgeneration_acceptedlineadditions',
+    'docgeneration_acceptedlineupdates', 'docgeneration_eventcount',
+    'docgeneration_rejectedfilecreations', 'docgeneration_rejectedfileupdates',
+    'docgeneration_rejectedlineadditions', 'docgeneration_rejectedlineupdates',
+    'inlinechat_acceptedlineadditions', 'inlinechat_acceptedlinedeletions', 'inlinechat_eventcount',
+    'inlinechat_rejectedlineadditions', 'inlinechat_rejectedlinedeletions', 'inline_aicodelines',
+    'inline_acceptancecount', 'inline_suggestionscount', 'testgeneration_acceptedlines',
+    'testgeneration_acceptedtests', 'testgeneration_eventcount', 'testgeneration_generatedlines',
+    'testgeneration_generatedtests', 'transformation_eventcount', 'transformation_linesgenerated',
+    'transformation_linesingested'
+]
+RAW_COLUMNS = ['userid', 'act_date'] + COUNT_COLUMNS
+
+# act_date format in the raw by_user_analytic logs
+ACT_DATE_FORMAT = '%m-%d-%Y'
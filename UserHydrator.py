@@ -0,0 +1,167 @@
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, Optional
+
+from IdentityCache import IdentityCache, profile_from_response
+from Telemetry import THROTTLING_ERROR_CODES, telemetry
+
+
+class TokenBucket:
+    """Thread-safe token bucket used to keep describe_user calls under the API rate limit"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """Block until the requested number of tokens is available"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def error_code(error: Exception) -> Optional[str]:
+    """AWS error code of a botocore ClientError, None for any other exception"""
+    from botocore.exceptions import ClientError
+
+    if not isinstance(error, ClientError):
+        return None
+    return error.response.get('Error', {}).get('Code')
+
+
+def _is_throttling_error(error: Exception) -> bool:
+    return error_code(error) in THROTTLING_ERROR_CODES
+
+
+def _print_user_error(user_id: str, error: Exception) -> None:
+    print(f"Error getting details for user {user_id}: {str(error)}")
+
+
+class HydrationError(Exception):
+    """Users that could not be loaded, with the error message for each user ID"""
+
+    def __init__(self, errors: Dict[str, Exception]):
+        self.errors = {user_id: str(error) for user_id, error in errors.items()}
+        user_id, message = next(iter(self.errors.items()))
+        super().__init__(f"{len(self.errors)} users could not be loaded (first: {user_id}: {message})")
+
+    def __reduce__(self):
+        # Picklable, so a failed shard reports it from a worker process
+        return HydrationError, (self.errors,)
+
+
+class UserHydrator:
+    """Fetch Identity Store users concurrently with rate limiting and throttling retries"""
+
+    def __init__(self, identity_store_client, identity_store_id: str, max_workers: int = 10,
+                 requests_per_second: float = 20.0, max_retries: int = 6,
+                 base_delay: float = 0.2, max_delay: float = 10.0, verbose: bool = True,
+                 cache: Optional[IdentityCache] = None):
+        self.identity_store_client = identity_store_client
+        self.identity_store_id = identity_store_id
+        self.cache = cache
+        self.max_workers = max_workers
+        self.bucket = TokenBucket(requests_per_second)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.verbose = verbose
+        self.throttle_count = 0
+        self._lock = threading.Lock()
+
+    def describe_user(self, user_id: str) -> dict:
+        """Call describe_user, retrying throttled requests with exponential backoff and full jitter"""
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            try:
+                return self.identity_store_client.describe_user(
+                    IdentityStoreId=self.identity_store_id,
+                    UserId=user_id
+                )
+            except Exception as e:
+                if not _is_throttling_error(e) or attempt >= self.max_retries:
+                    raise
+                with self._lock:
+                    self.throttle_count += 1
+                telemetry.count('throttled_retries')
+                delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+                time.sleep(random.uniform(0, delay))
+                attempt += 1
+
+    def get_user(self, user_id: str) -> dict:
+        """Return a single user profile, served from the cache when possible"""
+        if self.cache is not None:
+            profile = self.cache.get(self.identity_store_id, user_id)
+            if profile is not None:
+                return profile
+        profile = profile_from_response(self.describe_user(user_id))
+        if self.cache is not None:
+            self.cache.put(self.identity_store_id, user_id, profile)
+        return profile
+
+    def hydrate(self, user_ids: Iterable[str],
+                on_error: Callable[[str, Exception], None] = _print_user_error,
+                verbose: Optional[bool] = None) -> Dict[str, dict]:
+        """Return user profiles keyed by user ID, in the order the IDs were given.
+
+        Cached profiles are reused; only missing or expired users are fetched.
+        Users that fail are reported through on_error and left out of the result.
+        """
+        verbose = self.verbose if verbose is None else verbose
+        ordered_ids = list(OrderedDict.fromkeys(user_ids))
+        responses = {}
+        errors = {}
+        if not ordered_ids:
+            return OrderedDict()
+
+        if self.cache is not None:
+            responses.update(self.cache.get_many(self.identity_store_id, ordered_ids))
+            telemetry.count('identity_cache_hits', len(responses))
+        pending = [user_id for user_id in ordered_ids if user_id not in responses]
+
+        start = time.monotonic()
+        fetched = {}
+        with telemetry.phase('user_hydration'), ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.describe_user, user_id): user_id for user_id in pending}
+            for completed, future in enumerate(as_completed(futures), 1):
+                user_id = futures[future]
+                try:
+                    fetched[user_id] = profile_from_response(future.result())
+                except Exception as e:
+                    errors[user_id] = e
+                if verbose and completed % 1000 == 0:
+                    self._report(completed, len(pending), start)
+        responses.update(fetched)
+        if self.cache is not None:
+            self.cache.put_many(self.identity_store_id, fetched)
+
+        # Report errors in input order so the output matches the sequential loops
+        result = OrderedDict()
+        for user_id in ordered_ids:
+            if user_id in responses:
+                result[user_id] = responses[user_id]
+            else:
+                on_error(user_id, errors[user_id])
+
+        if verbose and pending:
+            self._report(len(pending), len(pending), start)
+        return result
+
+    def _report(self, done: int, total: int, start: float) -> None:
+        elapsed = max(time.monotonic() - start, 1e-9)
+        print(f"Hydrated {done}/{total} users ({done / elapsed:.1f} users/sec, "
+              f"{self.throttle_count} throttled retries)")
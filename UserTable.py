@@ -0,0 +1,184 @@
+import csv
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Exported column name -> UserRecord slot
+USER_FIELDS = {
+    'UserId': 'user_id',
+    'Username': 'username',
+    'Email': 'email',
+    'FirstName': 'first_name',
+    'LastName': 'last_name',
+    'DisplayName': 'display_name',
+    'LastActivityDate': 'last_activity_date',
+    'AssignedVia': 'assigned_via'
+}
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class UserRecord:
+    """One user with fixed slots instead of a per-user dict.
+
+    Records can be read like the dicts the managers used to return
+    (record['Email'], record.get('DisplayName')) so existing callers keep working.
+    """
+
+    __slots__ = tuple(USER_FIELDS.values())
+
+    def __init__(self, user_id: str, username: Optional[str] = None, email: Optional[str] = None,
+                 first_name: Optional[str] = None, last_name: Optional[str] = None,
+                 display_name: Optional[str] = None, last_activity_date: Optional[str] = None,
+                 assigned_via: Optional[str] = None):
+        self.user_id = _intern(user_id)
+        self.username = username
+        self.email = email
+        self.first_name = first_name
+        self.last_name = last_name
+        self.display_name = display_name
+        # Activity dates and group lists repeat across many users, so share one copy
+        self.last_activity_date = _intern(last_activity_date)
+        self.assigned_via = _intern(assigned_via)
+
+    @classmethod
+    def from_profile(cls, user_id: str, profile: dict, last_activity_date: Optional[str] = None,
+                     primary_email: bool = False) -> 'UserRecord':
+        """Build a record from a cached Identity Store profile.
+
+        primary_email picks the address flagged Primary (empty if none) instead of the first one listed.
+        """
+        emails = profile.get('Emails') or []
+        if primary_email:
+            email = next((item.get('Value', '') for item in emails if item.get('Primary', False)), '')
+        else:
+            email = (emails or [{}])[0].get('Value')
+        name = profile.get('Name') or {}
+        return cls(user_id, profile.get('UserName'), email, name.get('GivenName'), name.get('FamilyName'),
+                   profile.get('DisplayName'), last_activity_date)
+
+    def __getitem__(self, field: str):
+        try:
+            return getattr(self, USER_FIELDS[field])
+        except KeyError:
+            raise KeyError(field) from None
+
+    def __setitem__(self, field: str, value) -> None:
+        try:
+            setattr(self, USER_FIELDS[field], _intern(value))
+        except KeyError:
+            raise KeyError(field) from None
+
+    def get(self, field: str, default=None):
+        return getattr(self, USER_FIELDS[field], default) if field in USER_FIELDS else default
+
+    def keys(self) -> List[str]:
+        return list(USER_FIELDS)
+
+    def values_for(self, fieldnames: Sequence[str]) -> tuple:
+        return tuple(getattr(self, USER_FIELDS[field]) for field in fieldnames)
+
+    def to_dict(self, fieldnames: Sequence[str] = tuple(USER_FIELDS)) -> dict:
+        return dict(zip(fieldnames, self.values_for(fieldnames)))
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, UserRecord):
+            return NotImplemented
+        return all(getattr(self, slot) == getattr(other, slot) for slot in self.__slots__)
+
+    # Records are mutable (activity joins fill them in), so they are not hashable
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"UserRecord({self.to_dict()!r})"
+
+
+class UserTable:
+    """Users indexed by UserId in insertion order, shared by every manager and exporter.
+
+    Writers pull rows straight from the record slots, so exporting never builds a
+    dict per user.
+    """
+
+    def __init__(self, records: Iterable[UserRecord] = ()):
+        self._records: Dict[str, UserRecord] = {}
+        for record in records:
+            self.add(record)
+
+    def add(self, record: UserRecord) -> bool:
+        """Add a record unless its UserId is already present; returns whether it was added"""
+        if record.user_id in self._records:
+            return False
+        self._records[record.user_id] = record
+        return True
+
+    def get(self, user_id: str, default: Optional[UserRecord] = None) -> Optional[UserRecord]:
+        return self._records.get(user_id, default)
+
+    def __getitem__(self, user_id: str) -> UserRecord:
+        return self._records[user_id]
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._records
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self) -> Iterator[UserRecord]:
+        return iter(self._records.values())
+
+    def __repr__(self) -> str:
+        return f"UserTable({len(self)} users)"
+
+    def user_ids(self) -> List[str]:
+        return list(self._records)
+
+    def join_activity(self, activity: Iterable[Tuple[str, str]]) -> List[str]:
+        """Fill LastActivityDate from (UserId, date) pairs such as the Athena activity query.
+
+        When a user appears more than once the latest date wins. Returns the IDs that
+        had activity but are not in the table, in first-seen order.
+        """
+        unmatched = {}
+        for user_id, last_activity_date in activity:
+            record = self._records.get(user_id)
+            if record is None:
+                unmatched.setdefault(user_id)
+            elif record.last_activity_date is None or (
+                    last_activity_date is not None and last_activity_date > record.last_activity_date):
+                record.last_activity_date = _intern(last_activity_date)
+        return list(unmatched)
+
+    def rows(self, fieldnames: Sequence[str]) -> Iterator[tuple]:
+        slots = [USER_FIELDS[field] for field in fieldnames]
+        for record in self._records.values():
+            yield tuple(getattr(record, slot) for slot in slots)
+
+    def columns(self, fieldnames: Sequence[str]) -> Dict[str, list]:
+        return {field: [getattr(record, USER_FIELDS[field]) for record in self._records.values()]
+                for field in fieldnames}
+
+    def to_dicts(self, fieldnames: Sequence[str] = tuple(USER_FIELDS)) -> List[dict]:
+        return [record.to_dict(fieldnames) for record in self._records.values()]
+
+    def write_csv(self, path: str, fieldnames: Sequence[str]) -> int:
+        """Write the table as CSV with the given columns; None is written as an empty field"""
+        with open(path, 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(fieldnames)
+            writer.writerows(self.rows(fieldnames))
+        return len(self)
+
+    def to_arrow(self, fieldnames: Sequence[str]):
+        """Return the table as a pyarrow Table of string columns"""
+        import pyarrow as pa
+
+        columns = self.columns(fieldnames)
+        return pa.table({field: pa.array(values, type=pa.string()) for field, values in columns.items()})
+
+    def write_parquet(self, path: str, fieldnames: Sequence[str], compression: str = 'zstd') -> int:
+        import pyarrow.parquet as pq
+
+        pq.write_table(self.to_arrow(fieldnames), path, compression=compression)
+        return len(self)
@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+# The tools are flat top-level scripts; make them importable from the tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SyntheticAws import CallRecorder, SyntheticSession, SyntheticTenant  # noqa: E402
+from UserHydrator import TokenBucket  # noqa: E402
+
+
+@pytest.fixture
+def tenant():
+    return SyntheticTenant(users=300, groups=20, groups_per_user=2, direct_users=30, page_size=50)
+
+
+@pytest.fixture
+def recorder():
+    return CallRecorder(0)
+
+
+@pytest.fixture
+def session(tenant, recorder):
+    return SyntheticSession(tenant, recorder, athena_runtime_seconds=0)
+
+
+@pytest.fixture
+def unthrottle():
+    """Lift a hydrator's production rate limit so tests against the stand-ins run at full speed"""
+    def apply(hydrator):
+        hydrator.bucket = TokenBucket(100000)
+        hydrator.verbose = False
+        return hydrator
+    return apply
@@ -0,0 +1,124 @@
+import csv
+
+import pytest
+
+from AssignmentSync import AssignmentSnapshotStore, AssignmentSync, diff_sets
+from SyntheticAws import APPLICATION_ARN, IDENTITY_STORE_ID, CallRecorder, SyntheticSession, SyntheticTenant
+
+
+@pytest.fixture
+def tenant():
+    return SyntheticTenant(users=60, groups=5, groups_per_user=1, direct_users=10, page_size=7)
+
+
+@pytest.fixture
+def sync(session, tmp_path, unthrottle):
+    store = AssignmentSnapshotStore(str(tmp_path / 'snapshots.db'))
+    sync = AssignmentSync(store=store, session=session)
+    unthrottle(sync.hydrator)
+    yield sync
+    store.close()
+
+
+def assigned_via(tenant):
+    via = {}
+    for assignment in tenant.assignments:
+        if assignment['PrincipalType'] == 'USER':
+            via.setdefault(assignment['PrincipalId'], []).append('DIRECT')
+    for assignment in tenant.assignments:
+        if assignment['PrincipalType'] == 'GROUP':
+            for user_id in tenant.members[assignment['PrincipalId']]:
+                via.setdefault(user_id, []).append(assignment['PrincipalId'])
+    # DIRECT first, then the granting groups in ID order
+    return {user_id: ';'.join(sorted(groups, key=lambda principal: (principal != 'DIRECT', principal)))
+            for user_id, groups in via.items()}
+
+
+def changes_by_type(result):
+    return {(change['ChangeType'], change['PrincipalType'], change['PrincipalId']) for change in result.changes}
+
+
+def test_diff_sets():
+    assert diff_sets(['a', 'b', 'c'], ['d', 'c', 'a']) == (['d'], ['b'])
+
+
+def test_first_sync_adds_everyone_and_resolves_the_identity_store(sync, tenant, recorder):
+    result = sync.sync(APPLICATION_ARN)
+
+    expected = assigned_via(tenant)
+    assert sync.identity_store_id == IDENTITY_STORE_ID
+    assert recorder.calls['sso-admin.ListInstances'] == 1
+    assert {user_id: via for user_id, (via, _) in result.members.items()} == expected
+    assert changes_by_type(result) == ({('ADDED', 'USER', user_id) for user_id in expected} |
+                                       {('ADDED', 'GROUP', group_id) for group_id in tenant.group_ids})
+    assert recorder.calls['identitystore.DescribeUser'] == len(expected)
+
+
+def test_unchanged_assignments_hydrate_nobody(sync, recorder):
+    sync.commit(sync.sync(APPLICATION_ARN))
+    recorder.reset()
+
+    result = sync.sync(APPLICATION_ARN)
+
+    assert result.changes == []
+    assert 'identitystore.DescribeUser' not in recorder.calls
+
+
+def test_deltas_after_assignment_and_membership_changes(sync, tenant, recorder):
+    sync.commit(sync.sync(APPLICATION_ARN))
+    before = assigned_via(tenant)
+
+    new_user = f'{IDENTITY_STORE_ID}-u9999999'
+    tenant.user_index[new_user] = 9999999
+    tenant.user_ids.append(new_user)
+    tenant.members[tenant.group_ids[0]].append(new_user)
+    removed_group = tenant.group_ids[4]
+    tenant.assignments = [assignment for assignment in tenant.assignments
+                          if assignment['PrincipalId'] != removed_group]
+    after = assigned_via(tenant)
+    recorder.reset()
+
+    result = sync.sync(APPLICATION_ARN)
+
+    expected = {('ADDED', 'USER', new_user), ('REMOVED', 'GROUP', removed_group)}
+    expected |= {('REMOVED', 'USER', user_id) for user_id in before if user_id not in after}
+    expected |= {('MODIFIED', 'USER', user_id) for user_id in before
+                 if user_id in after and before[user_id] != after[user_id]}
+    assert any(change_type == 'REMOVED' and kind == 'USER' for change_type, kind, _ in expected)
+    assert changes_by_type(result) == expected
+    assert recorder.calls['identitystore.DescribeUser'] == 1
+
+    # Nothing is saved until commit, so the same deltas are reported again
+    assert changes_by_type(sync.sync(APPLICATION_ARN)) == expected
+    sync.commit(result)
+    assert sync.sync(APPLICATION_ARN).changes == []
+
+
+def test_reordered_assignments_are_not_changes(tmp_path, unthrottle):
+    tenant = SyntheticTenant(users=60, groups=5, groups_per_user=3, direct_users=20, page_size=7)
+    store = AssignmentSnapshotStore(str(tmp_path / 'snapshots.db'))
+    sync = AssignmentSync(store=store, session=SyntheticSession(tenant, CallRecorder(0), athena_runtime_seconds=0))
+    unthrottle(sync.hydrator)
+    first = sync.sync(APPLICATION_ARN)
+    sync.commit(first)
+    assert any(via.count(';') >= 2 for via, _ in first.members.values())
+
+    # The API makes no ordering promise; list users first and groups in reverse
+    tenant.assignments.reverse()
+    second = sync.sync(APPLICATION_ARN)
+    store.close()
+
+    assert second.changes == []
+    assert {user_id: via for user_id, (via, _) in second.members.items()} == assigned_via(tenant)
+
+
+def test_write_outputs(sync, tmp_path):
+    result = sync.sync(APPLICATION_ARN)
+
+    export_path, changes_path = sync.write_outputs(result, str(tmp_path / 'exports'))
+
+    with open(export_path, newline='') as file:
+        rows = list(csv.DictReader(file))
+    assert {row['UserId'] for row in rows} == set(result.members)
+    with open(changes_path, newline='') as file:
+        assert len(list(csv.DictReader(file))) == len(result.changes)
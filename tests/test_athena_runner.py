@@ -0,0 +1,194 @@
+import csv
+import io
+import json
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+import AthenaRunner as athena_runner
+from AthenaRunner import AthenaRunner
+from SyntheticAws import SyntheticSession
+
+OUTPUT_LOCATION = 's3://bench-results/athena/'
+
+
+def make_runner(session, **kwargs):
+    kwargs.setdefault('cache_path', None)
+    kwargs.setdefault('min_poll_interval', 0.01)
+    return AthenaRunner('us-east-1', 'bench', OUTPUT_LOCATION, session=session, **kwargs)
+
+
+class ScriptedAthena:
+    """Athena client whose queries report the scripted (state, elapsed ms) on each poll"""
+
+    def __init__(self, polls):
+        self.polls = list(polls)
+        self.requests = []
+
+    def start_query_execution(self, **kwargs):
+        self.requests.append(kwargs)
+        return {'QueryExecutionId': 'q1'}
+
+    def get_query_execution(self, QueryExecutionId):
+        state, elapsed_ms = self.polls.pop(0)
+        status = {'State': state}
+        if state == 'FAILED':
+            status['StateChangeReason'] = 'SYNTAX_ERROR'
+        return {'QueryExecution': {
+            'QueryExecutionId': QueryExecutionId, 'Status': status,
+            'ResultConfiguration': {'OutputLocation': f'{OUTPUT_LOCATION}q1.csv'},
+            'Statistics': {'TotalExecutionTimeInMillis': elapsed_ms, 'DataScannedInBytes': 42}
+        }}
+
+
+class ScriptedSession:
+    def __init__(self, athena):
+        self.athena = athena
+
+    def client(self, service_name, **kwargs):
+        return self.athena
+
+
+def test_polling_backs_off_with_the_query_runtime(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(athena_runner.time, 'sleep', sleeps.append)
+    athena = ScriptedAthena([('QUEUED', 0), ('RUNNING', 1000), ('RUNNING', 5000), ('RUNNING', 30000),
+                             ('RUNNING', 60000), ('SUCCEEDED', 61000)])
+    runner = make_runner(ScriptedSession(athena), min_poll_interval=0.25, max_poll_interval=5.0)
+
+    summary = runner.run('SELECT 1', verbose=False)
+
+    # Grows by 1.5x while the query is young, then tracks a tenth of its runtime up to the cap
+    assert sleeps == pytest.approx([0.375, 0.5625, 0.84375, 3.0, 5.0])
+    assert summary['Polls'] == 6
+    assert summary['State'] == 'SUCCEEDED'
+    assert summary['TotalExecutionTimeInMillis'] == 61000
+    assert athena.requests[0]['ResultReuseConfiguration']['ResultReuseByAgeConfiguration']['MaxAgeInMinutes'] == 60
+
+
+def test_local_cache_reuses_recent_successes_across_runners(session, recorder, tmp_path, monkeypatch):
+    cache_path = str(tmp_path / 'athena_query_cache.json')
+    first = make_runner(session, cache_path=cache_path, cache_max_age_seconds=3600)
+    summary = first.run('SELECT userid FROM bench', verbose=False)
+    assert summary['LocalCacheHit'] is False
+
+    # A new runner reads the cache file; whitespace differences hash to the same query
+    second = make_runner(session, cache_path=cache_path, cache_max_age_seconds=3600)
+    recorder.reset()
+    cached = second.run('SELECT  userid\n  FROM bench', verbose=False)
+    assert cached['LocalCacheHit'] is True
+    assert cached['QueryExecutionId'] == summary['QueryExecutionId']
+    assert recorder.calls == {}
+
+    assert second.run('SELECT userid FROM bench', use_cache=False, verbose=False)['LocalCacheHit'] is False
+    assert recorder.calls['athena.StartQueryExecution'] == 1
+
+    now = time.time()
+    monkeypatch.setattr(athena_runner.time, 'time', lambda: now + 3601)
+    recorder.reset()
+    assert second.run('SELECT userid FROM bench', verbose=False)['LocalCacheHit'] is False
+    assert recorder.calls['athena.StartQueryExecution'] == 1
+    # Expired entries are pruned from the file when the next result is stored
+    assert len(json.load(open(cache_path))) == 1
+
+
+def test_failed_queries_are_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(athena_runner.time, 'sleep', lambda seconds: None)
+    cache_path = str(tmp_path / 'athena_query_cache.json')
+    athena = ScriptedAthena([('FAILED', 10), ('FAILED', 10)])
+    runner = make_runner(ScriptedSession(athena), cache_path=cache_path)
+
+    assert runner.run('SELEKT 1', verbose=False)['StateChangeReason'] == 'SYNTAX_ERROR'
+    assert runner.run('SELEKT 1', verbose=False)['State'] == 'FAILED'
+    assert len(athena.requests) == 2
+
+
+def test_unreadable_cache_file_is_ignored(session, tmp_path):
+    cache_path = tmp_path / 'athena_query_cache.json'
+    cache_path.write_text('{not json')
+
+    runner = make_runner(session, cache_path=str(cache_path))
+    assert runner.run('SELECT 1', verbose=False)['State'] == 'SUCCEEDED'
+    assert len(json.loads(cache_path.read_text())) == 1
+
+
+class ConcurrencyAthena:
+    """Athena where query N of M finishes after M - N polls, so later queries finish first"""
+
+    def __init__(self, queries):
+        self.remaining = {}
+        self.queries = queries
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def start_query_execution(self, QueryString, **kwargs):
+        with self.lock:
+            self.remaining[QueryString] = len(self.queries) - self.queries.index(QueryString)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        return {'QueryExecutionId': QueryString}
+
+    def get_query_execution(self, QueryExecutionId):
+        with self.lock:
+            self.remaining[QueryExecutionId] -= 1
+            done = self.remaining[QueryExecutionId] <= 0
+            if done:
+                self.in_flight -= 1
+        return {'QueryExecution': {'QueryExecutionId': QueryExecutionId,
+                                   'Status': {'State': 'SUCCEEDED' if done else 'RUNNING'}}}
+
+
+def test_run_many_keeps_input_order_and_bounds_concurrency():
+    queries = [f'SELECT {index}' for index in range(8)]
+    athena = ConcurrencyAthena(queries)
+    runner = make_runner(ScriptedSession(athena), max_concurrency=3, min_poll_interval=0.001,
+                         max_poll_interval=0.001)
+
+    summaries = runner.run_many(queries, verbose=False)
+
+    assert [summary['QueryExecutionId'] for summary in summaries] == queries
+    assert athena.max_in_flight == 3
+
+
+COLUMNS = [('userid', 'varchar'), ('seats', 'bigint'), ('score', 'double'), ('active', 'boolean'),
+           ('day', 'date'), ('seen_at', 'timestamp'), ('cost', 'decimal(10,2)')]
+
+
+def typed_result(rows):
+    output = io.StringIO()
+    writer = csv.writer(output, quoting=csv.QUOTE_ALL, lineterminator='\n')
+    writer.writerow([name for name, _ in COLUMNS])
+    writer.writerows(rows)
+    return output.getvalue().encode('utf-8')
+
+
+@pytest.mark.parametrize('source', ['s3', 'api'])
+def test_iter_rows_converts_column_types_from_either_source(tenant, recorder, source):
+    rows = [['u1', '3', '0.5', 'true', '2025-06-01', '2025-06-01 08:30:00.000', '12.50'],
+            ['u2', '', '', 'false', '', '', '']]
+    rows += [[f'u{index}', str(index), '1.0', 'true', '2025-06-02', '2025-06-02 00:00:00.000', '1.00']
+             for index in range(3, 2503)]
+    session = SyntheticSession(tenant, recorder, typed_result(rows), athena_runtime_seconds=0,
+                               athena_columns=COLUMNS)
+    runner = make_runner(session)
+    query_execution_id = runner.run('SELECT * FROM seats', verbose=False)['QueryExecutionId']
+
+    typed = list(runner.iter_rows(query_execution_id, source=source))
+    assert len(typed) == len(rows)
+    assert typed[0] == {'userid': 'u1', 'seats': 3, 'score': 0.5, 'active': True, 'day': date(2025, 6, 1),
+                        'seen_at': datetime(2025, 6, 1, 8, 30), 'cost': Decimal('12.50')}
+    assert typed[1] == {'userid': 'u2', 'seats': None, 'score': None, 'active': False, 'day': None,
+                        'seen_at': None, 'cost': None}
+    assert typed[-1]['seats'] == 2502
+
+    raw = next(runner.iter_rows(query_execution_id, typed=False, source=source))
+    assert raw['seats'] == '3' and raw['seen_at'] == '2025-06-01 08:30:00.000'
+    if source == 'api':
+        # The header row plus 2502 rows come back in pages of 1000
+        assert recorder.calls['athena.GetQueryResults'] >= 3
+    else:
+        assert recorder.calls['s3.GetObject'] == 2
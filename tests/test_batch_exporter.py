@@ -0,0 +1,97 @@
+import csv
+
+from BatchExporter import BatchExporter
+from SyntheticAws import CallRecorder, IdentityStoreStandIn, SyntheticTenant, _Paginator
+
+STORES = {'ssoins-one': 'd-one0000000', 'ssoins-two': 'd-two0000000'}
+APP_ONE = 'arn:aws:sso::111122223333:application/ssoins-one/apl-one'
+APP_TWO = 'arn:aws:sso::111122223333:application/ssoins-one/apl-two'
+APP_OTHER = 'arn:aws:sso::111122223333:application/ssoins-two/apl-other'
+APP_UNKNOWN = 'arn:aws:sso::111122223333:application/ssoins-gone/apl-gone'
+
+
+class TwoInstanceSsoAdmin:
+    def __init__(self, assignments):
+        self.assignments = assignments
+
+    def list_instances(self, **kwargs):
+        return {'Instances': [{'InstanceArn': f'arn:aws:sso:::instance/{instance_id}', 'IdentityStoreId': store_id}
+                              for instance_id, store_id in STORES.items()]}
+
+    def list_application_assignments(self, ApplicationArn, NextToken=None):
+        return {'ApplicationAssignments': [dict(item, ApplicationArn=ApplicationArn)
+                                           for item in self.assignments.get(ApplicationArn, [])]}
+
+    def get_paginator(self, operation_name):
+        return _Paginator(getattr(self, operation_name))
+
+
+class RoutingIdentityStore:
+    """Route each call to the tenant behind its IdentityStoreId; usernames say which store answered"""
+
+    def __init__(self, tenants):
+        self.stores = {store_id: IdentityStoreStandIn(tenant, CallRecorder(0)) for store_id, tenant in tenants.items()}
+
+    def describe_user(self, IdentityStoreId, UserId):
+        user = self.stores[IdentityStoreId].describe_user(IdentityStoreId=IdentityStoreId, UserId=UserId)
+        return dict(user, UserName=f"{user['UserName']}@{IdentityStoreId}")
+
+    def list_group_memberships(self, IdentityStoreId, GroupId, NextToken=None):
+        return self.stores[IdentityStoreId].list_group_memberships(
+            IdentityStoreId=IdentityStoreId, GroupId=GroupId, NextToken=NextToken)
+
+    def get_paginator(self, operation_name):
+        return _Paginator(getattr(self, operation_name))
+
+
+class TwoInstanceSession:
+    def __init__(self, assignments, tenants):
+        self.clients = {'sso-admin': TwoInstanceSsoAdmin(assignments), 'identitystore': RoutingIdentityStore(tenants)}
+
+    def client(self, service_name, **kwargs):
+        return self.clients[service_name]
+
+
+def expected_assigned_via(tenant, assignments):
+    """AssignedVia per user: DIRECT first, then the assigned groups that contain the user in listing order"""
+    direct = [item['PrincipalId'] for item in assignments if item['PrincipalType'] == 'USER']
+    groups = [item['PrincipalId'] for item in assignments if item['PrincipalType'] == 'GROUP']
+    expected = {user_id: ['DIRECT'] for user_id in direct}
+    for group_id in groups:
+        for user_id in tenant.members[group_id]:
+            expected.setdefault(user_id, []).append(group_id)
+    return {user_id: ';'.join(via) for user_id, via in expected.items()}
+
+
+def test_multi_instance_export_keeps_assigned_via_per_application(tmp_path, capsys):
+    # Small tenants keep hydration inside the default rate limit's initial burst
+    tenant_one = SyntheticTenant(users=12, groups=4, groups_per_user=2, direct_users=3, seed=1)
+    tenant_two = SyntheticTenant(users=8, groups=3, groups_per_user=1, direct_users=2, seed=2)
+    # Both applications on instance one share a group and a direct user, so one user ID has a different
+    # AssignedVia in each export
+    assignments = {
+        APP_ONE: tenant_one.assignments[:2] + tenant_one.assignments[4:6],
+        APP_TWO: tenant_one.assignments[1:4] + tenant_one.assignments[5:],
+        APP_OTHER: tenant_two.assignments
+    }
+    session = TwoInstanceSession(assignments, {'d-one0000000': tenant_one, 'd-two0000000': tenant_two})
+
+    exporter = BatchExporter(session=session, max_workers=4)
+    results = exporter.export([APP_ONE, APP_TWO, APP_OTHER, APP_UNKNOWN])
+
+    assert list(results) == [APP_ONE, APP_TWO, APP_OTHER]
+    assert 'Skipping ' + APP_UNKNOWN in capsys.readouterr().out
+    for arn, tenant, store_id in ((APP_ONE, tenant_one, 'd-one0000000'), (APP_TWO, tenant_one, 'd-one0000000'),
+                                  (APP_OTHER, tenant_two, 'd-two0000000')):
+        users = results[arn]
+        assert {record['UserId']: record['AssignedVia'] for record in users} == \
+            expected_assigned_via(tenant, assignments[arn])
+        assert all(record['Username'].endswith('@' + store_id) for record in users)
+    shared_user = tenant_one.assignments[5]['PrincipalId']
+    assert results[APP_ONE][shared_user]['AssignedVia'] != results[APP_TWO][shared_user]['AssignedVia']
+
+    paths = exporter.write_outputs(results, str(tmp_path / 'exports'))
+    with open(paths[APP_OTHER], newline='') as file:
+        rows = list(csv.DictReader(file))
+    assert {row['UserId']: row['AssignedVia'] for row in rows} == \
+        expected_assigned_via(tenant_two, assignments[APP_OTHER])
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+import DebugAthena
+from AthenaRunner import AthenaRunner
+from SyntheticAws import SyntheticSession, synthetic_activity_csv
+
+
+class RecordingDelivery:
+    """ReportDelivery stand-in that reads each attachment while it is being sent"""
+
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+
+    def send(self, reports):
+        for report in reports:
+            with open(report.path, 'rb') as file:
+                self.sent.append((report.path, file.read()))
+        return [True] * len(reports)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def deliveries(tenant, recorder, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    session = SyntheticSession(tenant, recorder, synthetic_activity_csv(tenant), athena_runtime_seconds=0)
+    runner = AthenaRunner('us-east-1', 'bench', 's3://bench-results/athena/', session=session, cache_path=None,
+                          min_poll_interval=0.01)
+    created = []
+
+    def build_report_delivery(s3_client=None):
+        created.append(RecordingDelivery())
+        return created[-1]
+    monkeypatch.setattr(DebugAthena, '_athena_runner', runner)
+    monkeypatch.setattr(DebugAthena, '_report_delivery', None)
+    monkeypatch.setattr(DebugAthena, 'build_report_delivery', build_report_delivery)
+    return created
+
+
+def test_main_emails_the_streamed_raw_result_from_a_temporary_file(deliveries, tenant, tmp_path):
+    DebugAthena.main()
+
+    (delivery,) = deliveries
+    ((path, content),) = delivery.sent
+    assert content == synthetic_activity_csv(tenant)
+    assert not os.path.exists(path)
+    assert delivery.closed
+    assert sorted(os.listdir(tmp_path)) == ['telemetry.json', 'telemetry.prom']
+
+
+def test_main_builds_no_delivery_when_the_query_fails(deliveries, monkeypatch):
+    monkeypatch.setattr(DebugAthena, 'run_athena_query', lambda query: None)
+
+    DebugAthena.main()
+
+    assert deliveries == []
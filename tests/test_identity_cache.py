@@ -0,0 +1,93 @@
+import pytest
+
+import IdentityCache as identity_cache_module
+from IdentityCache import IdentityCache
+
+
+class FakeClock:
+    def __init__(self, now=1000000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(identity_cache_module, 'time', clock)
+    return clock
+
+
+def profile(index):
+    return {'UserName': f'user{index}', 'DisplayName': f'User {index}',
+            'Name': {'GivenName': 'Given', 'FamilyName': 'Family', 'MiddleName': 'dropped'},
+            'Emails': [{'Value': f'user{index}@example.com', 'Primary': True, 'Type': 'work'}],
+            'Addresses': [{'Locality': 'dropped'}]}
+
+
+def test_put_and_get_normalizes_profiles(tmp_path, clock):
+    cache = IdentityCache(str(tmp_path / 'cache.db'))
+    cache.put('d-1', 'u1', profile(1))
+
+    assert cache.get('d-1', 'u1') == {
+        'UserName': 'user1', 'DisplayName': 'User 1',
+        'Name': {'GivenName': 'Given', 'FamilyName': 'Family'},
+        'Emails': [{'Value': 'user1@example.com', 'Primary': True}]
+    }
+    assert cache.get('d-2', 'u1') is None
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+    cache.close()
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = IdentityCache(str(tmp_path / 'cache.db'), ttl_seconds=60)
+    cache.put('d-1', 'u1', profile(1))
+    cache.put('d-1', 'u2', profile(2), ttl_seconds=600)
+
+    clock.now += 61
+
+    assert cache.get('d-1', 'u1') is None
+    assert cache.get('d-1', 'u2') is not None
+    cache.close()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = IdentityCache(str(tmp_path / 'cache.db'), max_entries=3)
+    for index in range(3):
+        clock.now += 1
+        cache.put('d-1', f'u{index}', profile(index))
+    clock.now += 1
+    cache.get('d-1', 'u0')
+
+    clock.now += 1
+    cache.put('d-1', 'u3', profile(3))
+
+    assert cache.stats()['entries'] == 3
+    assert set(cache.get_many('d-1', ['u0', 'u1', 'u2', 'u3'])) == {'u0', 'u2', 'u3'}
+    cache.close()
+
+
+def test_force_refresh_skips_reads_but_still_stores(tmp_path, clock):
+    path = str(tmp_path / 'cache.db')
+    cache = IdentityCache(path, force_refresh=True)
+    cache.put('d-1', 'u1', profile(1))
+    assert cache.get('d-1', 'u1') is None
+    cache.close()
+
+    reopened = IdentityCache(path)
+    assert reopened.get('d-1', 'u1')['UserName'] == 'user1'
+    reopened.close()
+
+
+def test_invalidate(tmp_path, clock):
+    cache = IdentityCache(str(tmp_path / 'cache.db'))
+    cache.put_many('d-1', {'u1': profile(1), 'u2': profile(2)})
+    cache.put('d-2', 'u1', profile(1))
+
+    cache.invalidate('d-1', 'u1')
+    assert set(cache.get_many('d-1', ['u1', 'u2'])) == {'u2'}
+    cache.invalidate('d-1')
+    assert cache.get_many('d-1', ['u1', 'u2']) == {}
+    assert cache.get('d-2', 'u1') is not None
+    cache.close()
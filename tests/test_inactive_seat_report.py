@@ -0,0 +1,78 @@
+from datetime import date, datetime
+
+from InactiveSeatReport import (REPORT_FIELDNAMES, activity_frame, build_report, roster_frame, seats_table,
+                                summarize)
+from UserTable import UserRecord, UserTable
+
+AS_OF = date(2025, 6, 30)
+
+
+def roster(*user_ids):
+    return roster_frame(UserTable(UserRecord(user_id, f'name-{user_id}', f'{user_id}@example.com',
+                                             display_name=f'User {user_id}') for user_id in user_ids))
+
+
+def statuses(report):
+    return dict(zip(report['UserId'], report['Status'].astype(str)))
+
+
+def test_every_seat_gets_a_status_in_report_order():
+    activity = activity_frame([
+        ('active', '2025-06-29'),
+        ('inactive', datetime(2025, 1, 1, 12, 30)),
+        ('orphan', '2025-06-01 08:00:00.000'),
+        ('unparseable', 'not-a-date'),
+    ])
+    report = build_report(roster('active', 'inactive', 'never', 'unparseable'), activity, as_of=AS_OF)
+
+    assert list(report.columns) == REPORT_FIELDNAMES
+    assert statuses(report) == {'orphan': 'ORPHANED_ACTIVITY', 'never': 'NEVER_ACTIVE',
+                                'unparseable': 'NEVER_ACTIVE', 'inactive': 'INACTIVE', 'active': 'ACTIVE'}
+    assert list(report['Status'].astype(str)) == ['ORPHANED_ACTIVITY', 'NEVER_ACTIVE', 'NEVER_ACTIVE',
+                                                  'INACTIVE', 'ACTIVE']
+    assert summarize(report) == {'ORPHANED_ACTIVITY': 1, 'NEVER_ACTIVE': 2, 'INACTIVE': 1, 'ACTIVE': 1}
+    inactive = report[report['UserId'] == 'inactive'].iloc[0]
+    assert inactive['LastActivityDate'] == '2025-01-01'
+    assert inactive['DaysInactive'] == 180
+
+
+def test_threshold_day_is_still_active():
+    activity = activity_frame([('edge', '2025-05-31'), ('past', '2025-05-30')])
+    report = build_report(roster('edge', 'past'), activity, threshold_days=30, as_of=AS_OF)
+
+    assert statuses(report) == {'edge': 'ACTIVE', 'past': 'INACTIVE'}
+    assert dict(zip(report['UserId'], report['DaysInactive'])) == {'edge': 30, 'past': 31}
+
+
+def test_latest_activity_per_user_wins():
+    activity = activity_frame([('u1', '2025-01-01'), ('u1', '2025-06-20'), (' u1 ', '2025-03-01')])
+    report = build_report(roster('u1'), activity, as_of=AS_OF)
+
+    assert report['LastActivityDate'].tolist() == ['2025-06-20']
+    assert statuses(report) == {'u1': 'ACTIVE'}
+
+
+def test_empty_roster_and_activity():
+    empty_roster = roster_frame(UserTable())
+    empty_activity = activity_frame([])
+
+    report = build_report(empty_roster, empty_activity, as_of=AS_OF)
+    assert report.empty
+    assert list(report.columns) == REPORT_FIELDNAMES
+    assert summarize(report) == dict.fromkeys(['ORPHANED_ACTIVITY', 'NEVER_ACTIVE', 'INACTIVE', 'ACTIVE'], 0)
+
+    assert statuses(build_report(empty_roster, activity_frame([('u1', '2025-06-29')]), as_of=AS_OF)) == \
+        {'u1': 'ORPHANED_ACTIVITY'}
+    assert statuses(build_report(roster('u1'), empty_activity, as_of=AS_OF)) == {'u1': 'NEVER_ACTIVE'}
+
+
+def test_seats_table_selects_inactive_and_never_active_seats():
+    activity = activity_frame([('active', '2025-06-29'), ('inactive', '2025-01-01')])
+    report = build_report(roster('active', 'inactive', 'never'), activity, as_of=AS_OF)
+
+    table = seats_table(report)
+    assert [record.user_id for record in table] == ['never', 'inactive']
+    never, inactive = table
+    assert never.last_activity_date is None
+    assert inactive.last_activity_date == '2025-01-01'
+    assert inactive.email == 'inactive@example.com'
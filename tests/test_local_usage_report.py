@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+from LocalUsageReport import build_report, read_csv_chunks, read_parquet_chunks, write_athena_csv
+from ParquetCompactor import compact
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+SAMPLE_CSV = os.path.join(FIXTURES, 'usage_sample.csv')
+# AthenaQ.sql evaluated over usage_sample.csv, serialized the way Athena writes result CSVs.
+# Ties in active_days are ordered by userid, as build_report does.
+GOLDEN_CSV = os.path.join(FIXTURES, 'usage_sample_athenaq.csv')
+
+
+def read_bytes(path):
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+@pytest.mark.parametrize('chunksize', [250000, 4])
+def test_csv_report_matches_athena_byte_for_byte(tmp_path, chunksize):
+    output = str(tmp_path / 'usage_report.csv')
+
+    write_athena_csv(build_report(read_csv_chunks([SAMPLE_CSV], chunksize=chunksize), max_partials=2), output)
+
+    assert read_bytes(output) == read_bytes(GOLDEN_CSV)
+
+
+def test_parquet_report_matches_athena_byte_for_byte(tmp_path):
+    compact([SAMPLE_CSV], str(tmp_path / 'parquet'), run_id='test')
+    output = str(tmp_path / 'usage_report.csv')
+
+    write_athena_csv(build_report(read_parquet_chunks(str(tmp_path / 'parquet'), batch_size=5)), output)
+
+    assert read_bytes(output) == read_bytes(GOLDEN_CSV)
@@ -0,0 +1,91 @@
+import os
+import re
+import sqlite3
+from datetime import date, timedelta
+
+import pyarrow.parquet as pq
+import pytest
+
+from ParquetCompactor import compact, date_range_filter, date_range_predicate, render_query, stats_dataset
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+SAMPLE_CSV = os.path.join(HERE, 'fixtures', 'usage_sample.csv')
+
+
+def parquet_ddl():
+    with open(os.path.join(ROOT, 'DDL_Parquet.sql')) as file:
+        ddl = file.read()
+    columns = re.findall(r'`(\w+)` (?:string|int)', ddl.split('PARTITIONED BY')[0])
+    properties = dict(re.findall(r"'([\w.]+)'='([^']*)'", ddl))
+    location = re.search(r"LOCATION\s+'([^']+)'", ddl).group(1)
+    return columns, properties, location
+
+
+def days_between(start, end):
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+def test_compact_writes_the_layout_the_projection_expects(tmp_path):
+    columns, properties, location = parquet_ddl()
+    template = properties['storage.location.template']
+    assert template.startswith(location + '/')
+
+    pattern = re.escape(template[len(location) + 1:])
+    for key in ('year', 'month', 'day'):
+        digits = properties.get(f'projection.{key}.digits')
+        pattern = pattern.replace(re.escape(f'${{{key}}}'), rf'(?P<{key}>\d{{{digits}}})' if digits else rf'(?P<{key}>\d+)')
+
+    output = tmp_path / 'parquet'
+    assert compact([SAMPLE_CSV], str(output), run_id='test') == 23
+
+    partitions = set()
+    for directory, _, names in os.walk(output):
+        for name in names:
+            relative = os.path.relpath(directory, output).replace(os.sep, '/')
+            match = re.fullmatch(pattern, relative)
+            assert match, relative
+            for key, value in match.groupdict().items():
+                low, high = properties[f'projection.{key}.range'].split(',')
+                assert int(low) <= int(value) <= int(high)
+            assert pq.read_schema(os.path.join(directory, name)).names == columns
+            partitions.add(relative)
+    assert partitions == {'year=2024/month=12/day=30', 'year=2024/month=12/day=31', 'year=2025/month=01/day=01',
+                          'year=2025/month=05/day=31', 'year=2025/month=06/day=01', 'year=2025/month=06/day=02'}
+
+
+@pytest.mark.parametrize('start,end', [
+    (date(2025, 6, 29), date(2025, 6, 29)),
+    (date(2025, 5, 30), date(2025, 6, 2)),
+    (date(2024, 12, 30), date(2026, 3, 2)),
+    (date(2024, 1, 1), date(2025, 12, 31)),
+    (date(2025, 2, 1), date(2025, 11, 30)),
+    (date(2025, 6, 2), date(2025, 6, 1)),
+])
+def test_date_range_predicate_selects_exactly_the_range(start, end):
+    predicate = date_range_predicate(start, end)
+    assert '||' not in predicate
+
+    connection = sqlite3.connect(':memory:')
+    connection.execute('CREATE TABLE partitions (year TEXT, month TEXT, day TEXT)')
+    connection.executemany('INSERT INTO partitions VALUES (?, ?, ?)', [
+        (f'{day.year:04d}', f'{day.month:02d}', f'{day.day:02d}')
+        for day in days_between(date(2023, 12, 1), date(2026, 12, 31))
+    ])
+    selected = connection.execute(f'SELECT year, month, day FROM partitions WHERE {predicate}').fetchall()
+    assert sorted(date(int(y), int(m), int(d)) for y, m, d in selected) == days_between(start, end)
+
+
+def test_render_query_fills_the_partition_predicate():
+    query = render_query(os.path.join(ROOT, 'AthenaQ_DateRange.sql'), date(2025, 5, 31), date(2025, 6, 1))
+    assert "WHERE ((year = '2025' AND month = '05' AND day IN ('31'))\n   OR (year = '2025' AND month = '06' AND day IN ('01')))" in query
+    assert '{' not in query
+
+
+def test_local_filter_prunes_compacted_partitions(tmp_path):
+    compact([SAMPLE_CSV], str(tmp_path), run_id='test')
+    dataset = stats_dataset(str(tmp_path))
+
+    table = dataset.to_table(columns=['act_date'], filter=date_range_filter(date(2024, 12, 31), date(2025, 1, 1)))
+
+    assert set(table.column('act_date').to_pylist()) == {'12-31-2024', '01-01-2025'}
@@ -0,0 +1,87 @@
+import threading
+
+import pytest
+from botocore.exceptions import ClientError
+
+from PrincipalGraph import PrincipalGraph, list_assignments
+from SyntheticAws import APPLICATION_ARN, IDENTITY_STORE_ID, _Paginator
+
+
+class ConcurrentIdentityStore:
+    """Wrap the identitystore stand-in: count memberships listed in parallel and fail chosen groups"""
+
+    def __init__(self, identity_store, failing_groups=()):
+        self.identity_store = identity_store
+        self.failing_groups = set(failing_groups)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.ready = threading.Event()
+
+    def describe_group(self, IdentityStoreId, GroupId):
+        return self.identity_store.describe_group(IdentityStoreId=IdentityStoreId, GroupId=GroupId)
+
+    def list_group_memberships(self, IdentityStoreId, GroupId, NextToken=None):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            if self.in_flight >= 4:
+                self.ready.set()
+        try:
+            # Hold the first pages until several groups are being listed at once
+            self.ready.wait(timeout=0.5)
+            if GroupId in self.failing_groups:
+                raise ClientError({'Error': {'Code': 'AccessDeniedException', 'Message': 'denied'}},
+                                  'ListGroupMemberships')
+            return self.identity_store.list_group_memberships(
+                IdentityStoreId=IdentityStoreId, GroupId=GroupId, NextToken=NextToken)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def get_paginator(self, operation_name):
+        return _Paginator(getattr(self, operation_name))
+
+
+def test_expand_groups_runs_concurrently_and_reports_failed_groups(session, tenant):
+    failing = tenant.group_ids[3:5]
+    client = ConcurrentIdentityStore(session.client('identitystore'), failing)
+    errors = []
+    graph = PrincipalGraph()
+
+    graph.expand_groups(client, IDENTITY_STORE_ID, tenant.group_ids, describe=True, max_workers=4,
+                        on_error=lambda group_id, e: errors.append((group_id, type(e).__name__)))
+
+    assert client.max_in_flight == 4
+    assert errors == [(group_id, 'ClientError') for group_id in failing]
+    expanded = [group_id for group_id in tenant.group_ids if group_id not in failing]
+    assert graph.groups() == expanded
+    for group_id in expanded:
+        assert graph.members(group_id) == tenant.members[group_id]
+        assert graph.group_names[group_id] == f'Group {group_id[-5:]}'
+    assert graph.members(failing[0]) == []
+    assert graph.membership_count == sum(len(tenant.members[group_id]) for group_id in expanded)
+
+
+def test_expand_groups_without_on_error_raises_the_first_failure(session, tenant):
+    client = ConcurrentIdentityStore(session.client('identitystore'), tenant.group_ids[2:3])
+    graph = PrincipalGraph()
+
+    with pytest.raises(ClientError):
+        graph.expand_groups(client, IDENTITY_STORE_ID, tenant.group_ids, max_workers=4)
+    assert graph.groups() == tenant.group_ids[:2]
+
+
+def test_list_assignments_and_graph_cover_every_assigned_user(session, tenant):
+    user_ids, group_ids = list_assignments(session.client('sso-admin'), APPLICATION_ARN)
+    graph = PrincipalGraph()
+    for user_id in user_ids:
+        graph.add_user(user_id)
+    graph.expand_groups(session.client('identitystore'), IDENTITY_STORE_ID, group_ids)
+
+    assert group_ids == tenant.group_ids
+    assert sorted(graph.users()) == sorted(tenant.user_ids)
+    assert graph.user_count == len(tenant.user_ids)
+    for user_id in user_ids[:5]:
+        assert sorted(graph.groups_of(user_id)) == sorted(
+            group_id for group_id in tenant.group_ids if user_id in tenant.members[group_id])
@@ -0,0 +1,95 @@
+import csv
+import io
+import os
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from AthenaRunner import AthenaRunner
+from SyntheticAws import APPLICATION_ARN, SyntheticSession, synthetic_activity_csv
+from GetQDevUserData import CodeWhispererUserManager
+from ReportDaemon import CronSchedule, JobResults, ReportDaemon
+
+
+class RecordingDelivery:
+    """ReportDelivery stand-in that reads each report while it is being sent"""
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, reports):
+        for report in reports:
+            with open(report.path, newline='') as file:
+                self.sent.append((report.path, report.recipients, file.read()))
+        return [True] * len(reports)
+
+
+@pytest.fixture
+def daemon(tenant, recorder, unthrottle):
+    session = SyntheticSession(tenant, recorder, synthetic_activity_csv(tenant), athena_runtime_seconds=0)
+    runner = AthenaRunner('us-east-1', 'bench', 's3://bench-results/athena/', session=session, cache_path=None,
+                          min_poll_interval=0.01)
+    manager = CodeWhispererUserManager(session=session)
+    unthrottle(manager.hydrator)
+    daemon = ReportDaemon(APPLICATION_ARN, runner, manager, delivery=RecordingDelivery(),
+                          recipients=['team@example.com'])
+    yield daemon
+    daemon.stop()
+
+
+def test_email_job_leaves_no_files_behind(daemon, tenant, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    assert daemon.get('email', max_age=0) is True
+    assert daemon.get('email', max_age=0) is True
+
+    assert os.listdir(tmp_path) == []
+    (path, recipients, content), _ = daemon.delivery.sent
+    assert not os.path.exists(path)
+    assert os.path.basename(path).startswith('user_details_')
+    assert recipients == ['team@example.com']
+    rows = list(csv.DictReader(io.StringIO(content)))
+    assert len(rows) == len(tenant.user_ids)
+    assert all(row['Email'] and row['LastActivityDate'] for row in rows)
+
+
+def test_jobs_share_recent_dependencies(daemon, recorder):
+    daemon.get('user_report')
+    daemon.get('inactive_seats')
+
+    assert recorder.calls['athena.StartQueryExecution'] == 1
+    assert recorder.calls['sso-admin.ListApplicationAssignments'] == 1
+
+
+def test_job_results_are_single_flight():
+    results = JobResults()
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return 'report'
+
+    threads = [threading.Thread(target=results.get, args=('job', compute)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [1]
+    assert results.get('job', compute, max_age=60) == 'report'
+    assert calls == [1]
+
+
+def test_cron_schedule():
+    schedule = CronSchedule('30 5 * * 1')
+
+    assert schedule.next_after(datetime(2025, 6, 4, 12, 0)) == datetime(2025, 6, 9, 5, 30)
+    assert CronSchedule('*/15 9-17 * * 1-5').next_after(datetime(2025, 6, 6, 17, 50)) == datetime(2025, 6, 9, 9, 0)
+    with pytest.raises(ValueError):
+        CronSchedule('61 * * * *')
@@ -0,0 +1,179 @@
+import email
+import gzip
+import io
+import os
+import socket
+import zipfile
+
+import pytest
+
+from ReportDelivery import Report, ReportDelivery, SmtpConnectionPool, compress_file
+
+controller_module = pytest.importorskip('aiosmtpd.controller')
+
+SENDER = 'reports@example.com'
+
+
+class RecordingHandler:
+    """aiosmtpd handler that keeps every received message and counts SMTP sessions"""
+
+    def __init__(self):
+        self.messages = []
+        self.sessions = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.sessions += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((envelope.rcpt_tos, email.message_from_bytes(envelope.content)))
+        return '250 Message accepted for delivery'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp():
+    handler = RecordingHandler()
+    controller = controller_module.Controller(handler, hostname='127.0.0.1', port=free_port())
+    controller.start()
+    yield handler, controller.port
+    controller.stop()
+
+
+@pytest.fixture
+def report_file(tmp_path):
+    path = tmp_path / 'user_report.csv'
+    path.write_text('UserId,Username\n' + ''.join(f'u{index},user{index}\n' for index in range(2000)))
+    return str(path)
+
+
+def delivery_for(port, **kwargs):
+    return ReportDelivery(SmtpConnectionPool('127.0.0.1', port, starttls=False), SENDER, **kwargs)
+
+
+def attachments(message):
+    return {part.get_filename(): part.get_payload(decode=True) for part in message.walk() if part.get_filename()}
+
+
+def read(path):
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+def test_reports_share_one_pooled_connection(smtp, report_file):
+    handler, port = smtp
+    delivery = delivery_for(port, compression=None)
+
+    assert delivery.send([Report(report_file, 'First', ['a@example.com', 'b@example.com']),
+                          Report(report_file, 'Second', ['c@example.com'])]) == [True, True]
+    assert delivery.send([Report(report_file, 'Third', ['a@example.com'])]) == [True]
+    delivery.close()
+
+    assert handler.sessions == 1
+    assert [recipients for recipients, _ in handler.messages] == [
+        ['a@example.com', 'b@example.com'], ['c@example.com'], ['a@example.com']]
+    assert attachments(handler.messages[0][1]) == {'user_report.csv': read(report_file)}
+
+
+def test_background_queue_delivers_every_report(smtp, report_file):
+    handler, port = smtp
+    delivery = delivery_for(port, batch_size=2)
+
+    futures = [delivery.submit(Report(report_file, f'Report {index}', ['a@example.com'])) for index in range(5)]
+    delivery.close()
+
+    assert [future.result(timeout=10) for future in futures] == [True] * 5
+    assert sorted(message['Subject'] for _, message in handler.messages) == [f'Report {index}' for index in range(5)]
+
+
+@pytest.mark.parametrize('compression', ['gzip', 'zip'])
+def test_attachments_are_compressed(smtp, report_file, compression):
+    handler, port = smtp
+    delivery = delivery_for(port, compression=compression)
+
+    assert delivery.send([Report(report_file, 'Compressed', ['a@example.com'])]) == [True]
+    delivery.close()
+
+    (name, payload), = attachments(handler.messages[0][1]).items()
+    if compression == 'gzip':
+        assert name == 'user_report.csv.gz'
+        assert gzip.decompress(payload) == read(report_file)
+    else:
+        assert name == 'user_report.zip'
+        assert zipfile.ZipFile(io.BytesIO(payload)).read('user_report.csv') == read(report_file)
+
+
+def test_large_reports_are_sent_as_s3_links(smtp, report_file):
+    moto = pytest.importorskip('moto')
+    import boto3
+
+    handler, port = smtp
+    with moto.mock_aws():
+        s3_client = boto3.client('s3', region_name='us-east-1')
+        s3_client.create_bucket(Bucket='report-links')
+        delivery = delivery_for(port, link_threshold_bytes=1024, s3_client=s3_client, link_bucket='report-links')
+
+        assert delivery.send([Report(report_file, 'Linked', ['a@example.com'])]) == [True]
+        delivery.close()
+
+        (key,) = [item['Key'] for item in s3_client.list_objects_v2(Bucket='report-links')['Contents']]
+        assert gzip.decompress(s3_client.get_object(Bucket='report-links', Key=key)['Body'].read()) == read(report_file)
+
+    message = handler.messages[0][1]
+    assert attachments(message) == {}
+    body = message.get_payload()[0].get_payload(decode=True).decode()
+    assert 'report-links' in body and key in body and 'expires in 7 days' in body
+
+
+def test_oversized_attachment_without_link_bucket_is_refused(smtp, report_file):
+    handler, port = smtp
+    delivery = delivery_for(port, compression=None, link_threshold_bytes=1024, max_attachment_bytes=4096)
+
+    assert delivery.send([Report(report_file, 'Too big', ['a@example.com'])]) == [False]
+    delivery.close()
+
+    assert handler.messages == []
+
+
+def test_stale_pooled_connection_is_replaced(smtp, report_file):
+    handler, port = smtp
+    pool = SmtpConnectionPool('127.0.0.1', port, starttls=False, idle_timeout=0)
+    delivery = ReportDelivery(pool, SENDER, compression=None)
+
+    assert delivery.send([Report(report_file, 'One', ['a@example.com'])]) == [True]
+    assert delivery.send([Report(report_file, 'Two', ['a@example.com'])]) == [True]
+    delivery.close()
+
+    assert handler.sessions == 2
+    assert len(handler.messages) == 2
+
+
+def test_compress_file_without_compression_returns_the_path(report_file):
+    assert compress_file(report_file, None) == report_file
+
+
+def test_each_message_is_built_right_before_it_is_sent(smtp, report_file, monkeypatch):
+    handler, port = smtp
+    delivery = delivery_for(port)
+    events = []
+    build_message = delivery.build_message
+
+    def recording_build(report, work_dir):
+        # Record how many messages were delivered and what is left in the work directory
+        events.append((report.subject, len(handler.messages), sorted(os.listdir(work_dir))))
+        return build_message(report, work_dir)
+    monkeypatch.setattr(delivery, 'build_message', recording_build)
+
+    reports = [Report(report_file, f'Report {index}', ['a@example.com']) for index in range(3)]
+    assert delivery.send(reports + [Report(report_file + '.missing', 'Missing', ['a@example.com'])]) == \
+        [True, True, True, False]
+    delivery.close()
+
+    assert events == [('Report 0', 0, []), ('Report 1', 1, []), ('Report 2', 2, []), ('Missing', 3, [])]
+    assert [message['Subject'] for _, message in handler.messages] == ['Report 0', 'Report 1', 'Report 2']
@@ -0,0 +1,160 @@
+import hashlib
+import os
+
+import pytest
+
+from S3Transfer import MB, S3Transfer, etag_md5
+
+moto = pytest.importorskip('moto')
+
+BUCKET = 'transfer-tests'
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    import boto3
+
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    with moto.mock_aws():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def read(path):
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+def put_multipart(s3_client, key, parts):
+    upload_id = s3_client.create_multipart_upload(Bucket=BUCKET, Key=key)['UploadId']
+    etags = [s3_client.upload_part(Bucket=BUCKET, Key=key, UploadId=upload_id, PartNumber=number,
+                                   Body=body)['ETag'] for number, body in enumerate(parts, 1)]
+    s3_client.complete_multipart_upload(Bucket=BUCKET, Key=key, UploadId=upload_id, MultipartUpload={
+        'Parts': [{'ETag': etag, 'PartNumber': number} for number, etag in enumerate(etags, 1)]})
+    return b''.join(parts)
+
+
+class FailingGets:
+    """Wrap an S3 client so ranged GETs fail (or return corrupted bytes) after a number of parts"""
+
+    def __init__(self, s3_client, fail_after=None, corrupt_part_starting_at=None):
+        self.s3_client = s3_client
+        self.fail_after = fail_after
+        self.corrupt_part_starting_at = corrupt_part_starting_at
+        self.gets = 0
+
+    def __getattr__(self, name):
+        return getattr(self.s3_client, name)
+
+    def get_object(self, **kwargs):
+        self.gets += 1
+        if self.fail_after is not None and self.gets > self.fail_after:
+            raise ConnectionError('connection reset')
+        response = self.s3_client.get_object(**kwargs)
+        if kwargs.get('Range', '').startswith(f'bytes={self.corrupt_part_starting_at}-'):
+            body = bytearray(response['Body'].read())
+            body[0] ^= 0xFF
+            response['Body'] = _Body(bytes(body))
+        return response
+
+
+class _Body:
+    def __init__(self, data):
+        self.data = data
+
+    def read(self, size=-1):
+        chunk, self.data = (self.data, b'') if size < 0 else (self.data[:size], self.data[size:])
+        return chunk
+
+
+def test_download_in_parts_and_verify_plain_etag(s3_client, tmp_path):
+    data = os.urandom(3 * MB + 123)
+    s3_client.put_object(Bucket=BUCKET, Key='plain.bin', Body=data)
+    path = str(tmp_path / 'plain.bin')
+
+    result = S3Transfer(s3_client, part_size=MB, max_workers=4).download(BUCKET, 'plain.bin', path)
+
+    assert result == {'bytes': len(data), 'parts': 4, 'parts_fetched': 4, 'parts_resumed': 0, 'verified': True}
+    assert read(path) == data
+    assert sorted(os.listdir(tmp_path)) == ['plain.bin']
+
+
+def test_multipart_etag_is_checked_with_the_uploaded_part_size(s3_client, tmp_path):
+    data = put_multipart(s3_client, 'multi.bin', [os.urandom(5 * MB), os.urandom(5 * MB), os.urandom(MB)])
+    head = s3_client.head_object(Bucket=BUCKET, Key='multi.bin')
+    assert head['ETag'].strip('"').endswith('-3')
+    path = str(tmp_path / 'multi.bin')
+
+    # The download part size differs from the upload's, so verification asks S3 for part 1's size
+    result = S3Transfer(s3_client, part_size=4 * MB).download(BUCKET, 'multi.bin', path)
+
+    assert result['verified'] is True
+    assert read(path) == data
+    assert etag_md5(path, head['ETag'], 5 * MB) is True
+    assert etag_md5(path, head['ETag'], 4 * MB) is False
+    assert etag_md5(path, head['ETag']) is None
+
+
+def test_interrupted_download_resumes_from_the_journal(s3_client, tmp_path):
+    data = os.urandom(4 * MB)
+    s3_client.put_object(Bucket=BUCKET, Key='resume.bin', Body=data)
+    path = str(tmp_path / 'resume.bin')
+
+    failing = FailingGets(s3_client, fail_after=2)
+    with pytest.raises(ConnectionError):
+        S3Transfer(failing, part_size=MB, max_workers=1).download(BUCKET, 'resume.bin', path)
+    assert not os.path.exists(path)
+    assert os.path.exists(path + '.part') and os.path.exists(path + '.parts.json')
+
+    counting = FailingGets(s3_client)
+    result = S3Transfer(counting, part_size=MB, max_workers=2).download(BUCKET, 'resume.bin', path)
+
+    assert (result['parts_resumed'], result['parts_fetched'], result['verified']) == (2, 2, True)
+    assert counting.gets == 2
+    assert read(path) == data
+    assert sorted(os.listdir(tmp_path)) == ['resume.bin']
+
+
+def test_journal_for_a_changed_object_is_discarded(s3_client, tmp_path):
+    s3_client.put_object(Bucket=BUCKET, Key='changed.bin', Body=os.urandom(3 * MB))
+    path = str(tmp_path / 'changed.bin')
+    with pytest.raises(ConnectionError):
+        S3Transfer(FailingGets(s3_client, fail_after=1), part_size=MB, max_workers=1).download(
+            BUCKET, 'changed.bin', path)
+
+    data = os.urandom(3 * MB)
+    s3_client.put_object(Bucket=BUCKET, Key='changed.bin', Body=data)
+    result = S3Transfer(s3_client, part_size=MB).download(BUCKET, 'changed.bin', path)
+
+    assert result['parts_resumed'] == 0
+    assert read(path) == data
+
+
+def test_zero_byte_object(s3_client, tmp_path):
+    s3_client.put_object(Bucket=BUCKET, Key='empty.csv', Body=b'')
+    path = str(tmp_path / 'empty.csv')
+
+    result = S3Transfer(s3_client).download(BUCKET, 'empty.csv', path)
+
+    assert result == {'bytes': 0, 'parts': 0, 'parts_fetched': 0, 'parts_resumed': 0, 'verified': True}
+    assert read(path) == b''
+    assert etag_md5(path, hashlib.md5(b'').hexdigest()) is True
+
+
+def test_checksum_mismatch_discards_the_partial_download(s3_client, tmp_path):
+    s3_client.put_object(Bucket=BUCKET, Key='corrupt.bin', Body=os.urandom(2 * MB))
+    path = str(tmp_path / 'corrupt.bin')
+
+    with pytest.raises(IOError, match='Checksum mismatch'):
+        S3Transfer(FailingGets(s3_client, corrupt_part_starting_at=MB), part_size=MB).download(
+            BUCKET, 'corrupt.bin', path)
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_etag_md5_rejects_etags_it_cannot_check():
+    assert etag_md5(b'data', hashlib.md5(b'data').hexdigest()) is True
+    assert etag_md5(b'data', f'"{hashlib.md5(b"other").hexdigest()}"') is False
+    assert etag_md5(b'data', 'not-an-md5') is None
@@ -0,0 +1,213 @@
+import csv
+import os
+import threading
+
+import pytest
+from botocore.exceptions import ClientError
+
+import ShardedExport as sharded_export
+from SyntheticAws import APPLICATION_ARN, CallRecorder, SyntheticSession
+from GetQDevUserData import CodeWhispererUserManager
+from ShardedExport import ShardedExport, ShardPaths, run_shard, shard_of
+from UserHydrator import UserHydrator
+
+RATE = 100000
+
+
+class Crash(Exception):
+    pass
+
+
+@pytest.fixture
+def export(tmp_path):
+    return ShardedExport(str(tmp_path / 'job'), shard_count=4, poll_interval=0.01)
+
+
+def plan(export, session):
+    return export.plan(APPLICATION_ARN, CodeWhispererUserManager(session=session))
+
+
+def merged_ids(path):
+    with open(path, newline='') as file:
+        return [row['UserId'] for row in csv.DictReader(file)]
+
+
+def crash_after(monkeypatch, batches):
+    """Make every hydrator raise once the given number of batches have been served"""
+    hydrate = UserHydrator.hydrate
+    calls = []
+
+    def failing(self, user_ids, **kwargs):
+        calls.append(1)
+        if len(calls) > batches:
+            raise Crash()
+        return hydrate(self, user_ids, **kwargs)
+    monkeypatch.setattr(UserHydrator, 'hydrate', failing)
+
+
+def test_plan_splits_every_assigned_user_across_shards(export, session, tenant):
+    manifest = plan(export, session)
+
+    shard_ids = []
+    for shard in range(export.shard_count):
+        with open(ShardPaths(export.job_dir, shard).ids) as file:
+            shard_ids.extend(line.strip() for line in file)
+    assert manifest['users'] == len(tenant.user_ids)
+    assert sorted(shard_ids) == sorted(tenant.user_ids)
+    assert not os.path.exists(export.lock_path)
+
+
+def test_killed_shard_resumes_and_merge_has_every_user_once(export, session, tenant, recorder, tmp_path,
+                                                            monkeypatch):
+    plan(export, session)
+    shard_users = sum(1 for _ in open(ShardPaths(export.job_dir, 0).ids))
+
+    crash_after(monkeypatch, 2)
+    with pytest.raises(Crash):
+        run_shard(export.job_dir, 0, requests_per_second=RATE, batch_size=5, session=session)
+    assert os.path.exists(ShardPaths(export.job_dir, 0).journal)
+    assert not os.path.exists(ShardPaths(export.job_dir, 0).done)
+    monkeypatch.undo()
+
+    recorder.reset()
+    assert export.run(workers=1, requests_per_second=RATE, session=session) == {}
+    # The killed shard only hydrates the users after its last journalled batch
+    assert recorder.calls['identitystore.DescribeUser'] == len(tenant.user_ids) - 10
+    assert export.pending_shards() == []
+
+    output = str(tmp_path / 'merged.csv')
+    assert export.merge(output) == len(tenant.user_ids)
+    ids = merged_ids(output)
+    assert len(ids) == len(set(ids))
+    assert sorted(ids) == sorted(tenant.user_ids)
+    assert shard_users > 10
+
+
+def test_rerun_of_a_finished_job_is_a_noop(export, session, recorder, tmp_path):
+    plan(export, session)
+    export.run(workers=1, requests_per_second=RATE, session=session)
+    first = str(tmp_path / 'first.csv')
+    export.merge(first)
+
+    recorder.reset()
+    plan(export, session)
+    assert export.run(workers=1, requests_per_second=RATE, session=session) == {}
+    assert recorder.calls == {}
+    second = str(tmp_path / 'second.csv')
+    export.merge(second)
+    assert open(first).read() == open(second).read()
+
+
+def test_journal_from_another_plan_is_ignored(export, session, tenant, tmp_path, monkeypatch):
+    plan(export, session)
+    crash_after(monkeypatch, 1)
+    with pytest.raises(Crash):
+        run_shard(export.job_dir, 0, requests_per_second=RATE, batch_size=5, session=session)
+    monkeypatch.undo()
+
+    # Re-plan the same directory, e.g. after the manifest was deleted to start over
+    os.remove(export.manifest_path)
+    plan(export, session)
+    export.run(workers=1, requests_per_second=RATE, session=session)
+
+    output = str(tmp_path / 'merged.csv')
+    export.merge(output)
+    assert sorted(merged_ids(output)) == sorted(tenant.user_ids)
+
+
+def test_concurrent_nodes_plan_the_job_once(tmp_path, tenant):
+    recorder = CallRecorder(0.005)
+    session = SyntheticSession(tenant, recorder, athena_runtime_seconds=0)
+    job_dir = str(tmp_path / 'job')
+    barrier = threading.Barrier(3)
+    manifests = []
+
+    def node():
+        export = ShardedExport(job_dir, shard_count=4, poll_interval=0.01)
+        barrier.wait()
+        manifests.append(plan(export, session))
+
+    threads = [threading.Thread(target=node) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(manifests) == 3
+    assert len({manifest['planned_at'] for manifest in manifests}) == 1
+    assert recorder.calls['sso-admin.ListApplicationAssignments'] == 1
+
+
+def test_plan_times_out_while_another_node_holds_the_lock(tmp_path, session):
+    export = ShardedExport(str(tmp_path / 'job'), shard_count=4, plan_timeout=0.05, poll_interval=0.01)
+    open(export.lock_path, 'w').close()
+
+    with pytest.raises(TimeoutError):
+        plan(export, session)
+    assert os.path.exists(export.lock_path)
+
+
+def test_failed_shard_closes_its_cache(export, session, tmp_path, monkeypatch):
+    plan(export, session)
+    closed = []
+    identity_cache = sharded_export.IdentityCache
+
+    class RecordingCache(identity_cache):
+        def close(self):
+            closed.append(self.path)
+            super().close()
+
+    monkeypatch.setattr(sharded_export, 'IdentityCache', RecordingCache)
+    crash_after(monkeypatch, 0)
+    cache_path = str(tmp_path / 'cache.db')
+    with pytest.raises(Crash):
+        run_shard(export.job_dir, 0, cache_path=cache_path, requests_per_second=RATE, session=session)
+    assert closed == [cache_path]
+
+
+def fail_describe_user(monkeypatch, session, user_ids, code):
+    """Make describe_user raise a ClientError with the given code for these users"""
+    identity_store = session.client('identitystore')
+    describe_user = identity_store.describe_user
+
+    def failing(IdentityStoreId, UserId):
+        if UserId in user_ids:
+            raise ClientError({'Error': {'Code': code, 'Message': 'failed'}}, 'DescribeUser')
+        return describe_user(IdentityStoreId=IdentityStoreId, UserId=UserId)
+    monkeypatch.setattr(identity_store, 'describe_user', failing)
+
+
+def test_shard_with_failed_users_is_not_done_and_rerun_retries_them(export, session, tenant, tmp_path,
+                                                                     monkeypatch):
+    plan(export, session)
+    failed_ids = set(tenant.user_ids[::25])
+    fail_describe_user(monkeypatch, session, failed_ids, 'ExpiredTokenException')
+
+    failures = export.run(workers=1, requests_per_second=RATE, session=session)
+    failed_shards = {shard_of(user_id, export.shard_count) for user_id in failed_ids}
+    assert set(failures) == failed_shards
+    assert set(export.pending_shards()) == failed_shards
+    with pytest.raises(RuntimeError):
+        export.merge(str(tmp_path / 'merged.csv'))
+
+    monkeypatch.undo()
+    assert export.run(workers=1, requests_per_second=RATE, session=session) == {}
+    output = str(tmp_path / 'merged.csv')
+    export.merge(output)
+    with open(output, newline='') as file:
+        rows = list(csv.DictReader(file))
+    assert sorted(row['UserId'] for row in rows) == sorted(tenant.user_ids)
+    assert all(row['Username'] for row in rows)
+
+
+def test_users_deleted_since_planning_do_not_block_the_shard(export, session, tenant, tmp_path, monkeypatch):
+    plan(export, session)
+    deleted_ids = set(tenant.user_ids[:3])
+    fail_describe_user(monkeypatch, session, deleted_ids, 'ResourceNotFoundException')
+
+    assert export.run(workers=1, requests_per_second=RATE, session=session) == {}
+    output = str(tmp_path / 'merged.csv')
+    assert export.merge(output) == len(tenant.user_ids)
+    with open(output, newline='') as file:
+        blank = {row['UserId'] for row in csv.DictReader(file) if not row['Username']}
+    assert blank == deleted_ids
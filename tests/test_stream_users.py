@@ -0,0 +1,110 @@
+import csv
+import json
+import os
+
+import pytest
+
+from GetQDevUserData import CodeWhispererUserManager
+
+
+def write_activity(path, user_ids, day='2025-06-01'):
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['UserID', 'latest_activity_date'])
+        for user_id in user_ids:
+            writer.writerow([user_id, day])
+
+
+def output_ids(path):
+    with open(path, newline='') as file:
+        return [row['UserId'] for row in csv.DictReader(file)]
+
+
+@pytest.fixture
+def manager(session, unthrottle):
+    manager = CodeWhispererUserManager(session=session)
+    unthrottle(manager.hydrator)
+    return manager
+
+
+class Crash(Exception):
+    pass
+
+
+def crash_after(manager, batches):
+    """Make the hydrator raise once it has served the given number of batches"""
+    hydrate = manager.hydrator.hydrate
+    calls = []
+
+    def failing(user_ids, **kwargs):
+        calls.append(1)
+        if len(calls) > batches:
+            raise Crash()
+        return hydrate(user_ids, **kwargs)
+    manager.hydrator.hydrate = failing
+    return hydrate
+
+
+def test_stream_writes_first_row_per_user(manager, tenant, tmp_path):
+    source = str(tmp_path / 'activity.csv')
+    write_activity(source, tenant.user_ids[:40] + tenant.user_ids[:5])
+    output = str(tmp_path / 'users.csv')
+
+    assert manager.stream_users_from_csv(source, output, batch_size=7) == 40
+    assert output_ids(output) == tenant.user_ids[:40]
+
+
+def test_resume_after_crash_continues_from_checkpoint(manager, tenant, tmp_path, recorder):
+    source = str(tmp_path / 'activity.csv')
+    write_activity(source, tenant.user_ids[:100])
+    output = str(tmp_path / 'users.csv')
+    checkpoint = output + '.checkpoint'
+
+    hydrate = crash_after(manager, 3)
+    with pytest.raises(Crash):
+        manager.stream_users_from_csv(source, output, batch_size=10, checkpoint_path=checkpoint)
+    assert json.load(open(checkpoint))['rows_consumed'] == 30
+
+    manager.hydrator.hydrate = hydrate
+    recorder.reset()
+    assert manager.stream_users_from_csv(source, output, batch_size=10, checkpoint_path=checkpoint) == 70
+    assert output_ids(output) == tenant.user_ids[:100]
+    assert recorder.calls['identitystore.DescribeUser'] == 70
+    assert not os.path.exists(checkpoint)
+
+
+def test_checkpoint_for_a_different_input_is_ignored(manager, tenant, tmp_path):
+    source = str(tmp_path / 'activity.csv')
+    write_activity(source, tenant.user_ids[:50])
+    output = str(tmp_path / 'users.csv')
+    checkpoint = output + '.checkpoint'
+
+    hydrate = crash_after(manager, 2)
+    with pytest.raises(Crash):
+        manager.stream_users_from_csv(source, output, batch_size=10, checkpoint_path=checkpoint)
+    manager.hydrator.hydrate = hydrate
+
+    # A new export lands at the same path; resuming would skip its first 20 rows
+    write_activity(source, tenant.user_ids[100:160])
+    assert manager.stream_users_from_csv(source, output, batch_size=10, checkpoint_path=checkpoint) == 60
+    assert output_ids(output) == tenant.user_ids[100:160]
+
+
+def test_get_users_from_csv_keeps_a_record_per_input_row(manager, tenant, tmp_path, recorder, capsys):
+    source = str(tmp_path / 'activity.csv')
+    with open(source, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['UserID', 'latest_activity_date'])
+        writer.writerows([(tenant.user_ids[0], '2025-06-01'), (tenant.user_ids[1], '2025-06-02'),
+                          (tenant.user_ids[0], '2025-05-01'), ('missing-user', '2025-06-03')])
+
+    records = manager.get_users_from_csv(source)
+
+    assert [(record['UserId'], record['LastActivityDate']) for record in records] == [
+        (tenant.user_ids[0], '2025-06-01'), (tenant.user_ids[1], '2025-06-02'),
+        (tenant.user_ids[0], '2025-05-01'), ('missing-user', None)]
+    assert records[0]['Email'] == records[2]['Email'] == 'user0@example.com'
+    assert records[3]['Email'] is None
+    # Repeated IDs are still described only once
+    assert recorder.calls['identitystore.DescribeUser'] == 3
+    assert 'Error getting details for user missing-user' in capsys.readouterr().out
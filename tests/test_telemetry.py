@@ -0,0 +1,112 @@
+import json
+
+import pytest
+from botocore.awsrequest import AWSResponse
+
+from Telemetry import Histogram, Telemetry
+
+moto = pytest.importorskip('moto')
+
+SLOW_DOWN = (b'<?xml version="1.0" encoding="UTF-8"?>'
+             b'<Error><Code>SlowDown</Code><Message>Please reduce your request rate.</Message></Error>')
+
+
+class _Raw:
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    import boto3
+    from botocore.config import Config
+
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    with moto.mock_aws():
+        client = boto3.client('s3', region_name='us-east-1',
+                              config=Config(retries={'mode': 'standard', 'max_attempts': 3}))
+        client.create_bucket(Bucket='telemetry')
+        yield client
+
+
+def throttle_once(client, operation):
+    """Answer the first request for an operation with an S3 SlowDown before moto sees it"""
+    throttled = []
+
+    def slow_down(request, **kwargs):
+        if throttled:
+            return None
+        throttled.append(request)
+        return AWSResponse(request.url, 503, {'content-type': 'application/xml'}, _Raw(SLOW_DOWN))
+    client.meta.events.register_first(f'before-send.s3.{operation}', slow_down)
+    return throttled
+
+
+def test_botocore_hooks_record_latency_bytes_and_throttling(s3_client):
+    telemetry = Telemetry()
+    assert telemetry.instrument(s3_client) is s3_client
+    body = b'x' * 4096
+    throttled = throttle_once(s3_client, 'GetObject')
+
+    s3_client.put_object(Bucket='telemetry', Key='data.bin', Body=body)
+    assert s3_client.get_object(Bucket='telemetry', Key='data.bin')['Body'].read() == body
+
+    summary = telemetry.summary()
+    assert len(throttled) == 1
+    assert summary['operations']['s3.PutObject']['count'] == 1
+    assert summary['operations']['s3.GetObject']['count'] == 1
+    assert summary['bytes'] == {'s3.GetObject': len(body)}
+    assert summary['counters'] == {'retries': 1, 'throttled_responses': 1}
+
+
+def test_failed_calls_are_counted_as_errors(s3_client):
+    telemetry = Telemetry()
+    telemetry.instrument(s3_client)
+
+    with pytest.raises(s3_client.exceptions.NoSuchKey):
+        s3_client.get_object(Bucket='telemetry', Key='missing')
+
+    assert telemetry.summary()['counters'] == {'errors': 1}
+
+
+def test_objects_without_botocore_events_are_returned_untouched():
+    stand_in = object()
+    assert Telemetry().instrument(stand_in) is stand_in
+
+
+def test_write_produces_json_and_prometheus_textfile(tmp_path, capsys):
+    telemetry = Telemetry(prefix='test')
+    with telemetry.phase('export'):
+        pass
+    telemetry.operations['DescribeUser'] = Histogram()
+    for seconds in (0.003, 0.02, 0.02, 120.0):
+        telemetry.operations['DescribeUser'].observe(seconds)
+    telemetry.count('throttled_responses', 2)
+    telemetry.add_bytes('s3_download', 1024)
+    json_path, prometheus_path = str(tmp_path / 'telemetry.json'), str(tmp_path / 'telemetry.prom')
+
+    telemetry.write(json_path, prometheus_path)
+
+    with open(json_path) as file:
+        summary = json.load(file)
+    assert summary['operations']['DescribeUser']['count'] == 4
+    assert summary['operations']['DescribeUser']['max_seconds'] == 120.0
+    assert summary['phases']['export']['count'] == 1
+    with open(prometheus_path) as file:
+        lines = file.read().splitlines()
+    assert '# TYPE test_api_latency_seconds histogram' in lines
+    assert 'test_api_latency_seconds_bucket{operation="DescribeUser",le="0.005"} 1' in lines
+    assert 'test_api_latency_seconds_bucket{operation="DescribeUser",le="0.025"} 3' in lines
+    assert 'test_api_latency_seconds_bucket{operation="DescribeUser",le="60.0"} 3' in lines
+    assert 'test_api_latency_seconds_bucket{operation="DescribeUser",le="+Inf"} 4' in lines
+    assert 'test_api_latency_seconds_count{operation="DescribeUser"} 4' in lines
+    assert 'test_api_latency_seconds_sum{operation="DescribeUser"} 120.043000' in lines
+    assert 'test_phase_seconds_count{phase="export"} 1' in lines
+    assert 'test_events_total{event="throttled_responses"} 2' in lines
+    assert 'test_bytes_total{operation="s3_download"} 1024' in lines
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['telemetry.json', 'telemetry.prom']
+    assert 'Telemetry written to' in capsys.readouterr().out
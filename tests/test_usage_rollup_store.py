@@ -0,0 +1,107 @@
+import os
+
+import pandas as pd
+import pytest
+
+from LocalUsageReport import read_csv_chunks
+from UsageRollupStore import UsageRollupStore
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+SAMPLE_CSV = os.path.join(FIXTURES, 'usage_sample.csv')
+GOLDEN_CSV = os.path.join(FIXTURES, 'usage_sample_athenaq.csv')
+
+
+@pytest.fixture
+def history():
+    frame = pd.concat(read_csv_chunks([SAMPLE_CSV]))
+    return frame, pd.to_datetime(frame['act_date'], format='%m-%d-%Y').dt.strftime('%Y-%m-%d')
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = UsageRollupStore(str(tmp_path / 'rollup.db'))
+    yield store
+    store.close()
+
+
+def report(store, tmp_path):
+    output = str(tmp_path / 'report.csv')
+    store.write_report(output)
+    with open(output, 'rb') as file:
+        return file.read()
+
+
+def golden():
+    with open(GOLDEN_CSV, 'rb') as file:
+        return file.read()
+
+
+def test_incremental_ingests_match_the_full_rollup(store, history, tmp_path):
+    frame, days = history
+    for cut in ('2024-12-31', '2025-05-31', '2025-06-02'):
+        store.ingest_chunks([frame[days <= cut]])
+    assert store.high_water_mark == '2025-06-02'
+    assert report(store, tmp_path) == golden()
+
+    # A rerun over the whole history only recomputes the high-water day
+    assert store.ingest_chunks([frame]) == int((days == '2025-06-02').sum())
+    assert report(store, tmp_path) == golden()
+
+
+def test_late_rows_for_the_high_water_day_are_counted(store, history, tmp_path):
+    frame, days = history
+    last_day = frame[days == '2025-06-02']
+    store.ingest_chunks([frame[days < '2025-06-02'], last_day.iloc[:1]])
+    assert store.high_water_mark == '2025-06-02'
+
+    store.ingest_chunks([frame])
+
+    assert report(store, tmp_path) == golden()
+
+
+def test_lookback_reopens_earlier_days(tmp_path, history):
+    frame, days = history
+    store = UsageRollupStore(str(tmp_path / 'rollup.db'), lookback_days=2)
+    late = frame.index[days == '2025-06-01'][0]
+    store.ingest_chunks([frame.drop(index=late)])
+
+    store.ingest_chunks([frame[days >= '2025-06-01']])
+
+    assert report(store, tmp_path) == golden()
+    store.close()
+
+
+def test_ingest_without_the_reopened_day_keeps_it(store, history, tmp_path):
+    frame, days = history
+    store.ingest_chunks([frame[days <= '2025-06-01']])
+
+    store.ingest_chunks([frame[days == '2025-06-02']])
+
+    assert report(store, tmp_path) == golden()
+
+
+def test_failed_rebuild_keeps_the_previous_aggregates(store, history, tmp_path):
+    frame, _ = history
+    store.ingest_chunks([frame])
+
+    def failing_history():
+        yield frame.iloc[:5]
+        raise IOError('source went away')
+
+    with pytest.raises(IOError):
+        store.rebuild(failing_history())
+
+    assert store.high_water_mark == '2025-06-02'
+    assert report(store, tmp_path) == golden()
+    assert store.rebuild(read_csv_chunks([SAMPLE_CSV], chunksize=3)) == len(frame)
+    assert report(store, tmp_path) == golden()
+
+
+def test_latest_activity(store, history):
+    frame, _ = history
+    store.ingest_chunks([frame])
+
+    latest = dict(store.latest_activity())
+
+    assert latest['user-zero'] == '2025-06-01'
+    assert len(latest) == frame['userid'].nunique()
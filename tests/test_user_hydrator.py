@@ -0,0 +1,103 @@
+import time
+
+import pytest
+from botocore.exceptions import ClientError
+
+from SyntheticAws import IDENTITY_STORE_ID
+from IdentityCache import IdentityCache
+from Telemetry import THROTTLING_ERROR_CODES
+from UserHydrator import TokenBucket, UserHydrator
+
+
+def client_error(code):
+    return ClientError({'Error': {'Code': code, 'Message': code}}, 'DescribeUser')
+
+
+class FlakyIdentityStore:
+    """Identity Store client that fails each user's first calls with the given error codes"""
+
+    def __init__(self, tenant, failures):
+        self.tenant = tenant
+        self.failures = {user_id: list(codes) for user_id, codes in failures.items()}
+        self.calls = 0
+
+    def describe_user(self, IdentityStoreId, UserId):
+        self.calls += 1
+        codes = self.failures.get(UserId)
+        if codes:
+            raise client_error(codes.pop(0))
+        return self.tenant.user(UserId)
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(50, capacity=1)
+    start = time.monotonic()
+    for _ in range(11):
+        bucket.acquire()
+    # The first token is in the bucket; the other ten arrive at 50/s
+    assert time.monotonic() - start >= 0.18
+
+
+def test_hydrate_keeps_input_order_and_drops_duplicates(tenant):
+    client = FlakyIdentityStore(tenant, {})
+    hydrator = UserHydrator(client, IDENTITY_STORE_ID, requests_per_second=100000, verbose=False)
+    user_ids = list(reversed(tenant.user_ids[:50])) + tenant.user_ids[:10]
+
+    result = hydrator.hydrate(user_ids)
+
+    assert list(result) == list(reversed(tenant.user_ids[:50]))
+    assert client.calls == 50
+    assert result[tenant.user_ids[0]]['UserName'] == 'user0'
+
+
+def test_hydrate_retries_throttling(tenant):
+    user_ids = tenant.user_ids[:20]
+    client = FlakyIdentityStore(tenant, {user_ids[0]: ['ThrottlingException'] * 3,
+                                         user_ids[1]: ['TooManyRequestsException']})
+    hydrator = UserHydrator(client, IDENTITY_STORE_ID, requests_per_second=100000, base_delay=0.001,
+                            verbose=False)
+
+    result = hydrator.hydrate(user_ids)
+
+    assert list(result) == user_ids
+    assert hydrator.throttle_count == 4
+    assert client.calls == 24
+
+
+def test_hydrate_gives_up_after_max_retries_and_reports_errors(tenant):
+    user_ids = tenant.user_ids[:5]
+    client = FlakyIdentityStore(tenant, {user_ids[1]: ['ThrottlingException'] * 10,
+                                         user_ids[3]: ['ResourceNotFoundException']})
+    hydrator = UserHydrator(client, IDENTITY_STORE_ID, requests_per_second=100000, max_retries=2,
+                            base_delay=0.001, verbose=False)
+    errors = []
+
+    result = hydrator.hydrate(user_ids, on_error=lambda user_id, e: errors.append((user_id, e)))
+
+    assert list(result) == [user_ids[0], user_ids[2], user_ids[4]]
+    assert [user_id for user_id, _ in errors] == [user_ids[1], user_ids[3]]
+    # Three throttled attempts for the first, and no retry for the non-throttling error
+    assert client.calls == 3 + 1 + 3
+
+
+def test_hydrate_only_fetches_cache_misses(tenant, tmp_path):
+    cache = IdentityCache(str(tmp_path / 'cache.db'))
+    client = FlakyIdentityStore(tenant, {})
+    hydrator = UserHydrator(client, IDENTITY_STORE_ID, requests_per_second=100000, verbose=False, cache=cache)
+
+    hydrator.hydrate(tenant.user_ids[:30])
+    result = hydrator.hydrate(tenant.user_ids[:40])
+
+    assert list(result) == tenant.user_ids[:40]
+    assert client.calls == 40
+    assert cache.stats()['hits'] == 30
+    cache.close()
+
+
+@pytest.mark.parametrize('code', THROTTLING_ERROR_CODES)
+def test_describe_user_retries_each_throttling_code(tenant, code):
+    client = FlakyIdentityStore(tenant, {tenant.user_ids[0]: [code]})
+    hydrator = UserHydrator(client, IDENTITY_STORE_ID, requests_per_second=100000, base_delay=0.001)
+
+    assert hydrator.describe_user(tenant.user_ids[0])['UserId'] == tenant.user_ids[0]
+    assert client.calls == 2
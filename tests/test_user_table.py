@@ -0,0 +1,80 @@
+import csv
+
+import pytest
+
+from UserTable import USER_FIELDS, UserRecord, UserTable
+
+PROFILE = {
+    'UserName': 'jdoe',
+    'DisplayName': 'Jane Doe',
+    'Name': {'GivenName': 'Jane', 'FamilyName': 'Doe'},
+    'Emails': [{'Value': 'jane@personal.example'}, {'Value': 'jane@example.com', 'Primary': True}]
+}
+
+
+def test_record_reads_like_the_old_dicts():
+    record = UserRecord.from_profile('u1', PROFILE, '2025-06-01')
+
+    assert record['Email'] == 'jane@personal.example'
+    assert record.get('DisplayName') == 'Jane Doe'
+    assert record.get('Unknown', 'default') == 'default'
+    assert record.keys() == list(USER_FIELDS)
+    assert record.to_dict(['UserId', 'LastActivityDate']) == {'UserId': 'u1', 'LastActivityDate': '2025-06-01'}
+    record['AssignedVia'] = 'DIRECT'
+    assert record.assigned_via == 'DIRECT'
+    with pytest.raises(KeyError):
+        record['Unknown']
+    with pytest.raises(TypeError):
+        hash(record)
+
+
+def test_primary_email_picks_the_flagged_address():
+    assert UserRecord.from_profile('u1', PROFILE, primary_email=True).email == 'jane@example.com'
+    assert UserRecord.from_profile('u1', {'Emails': [{'Value': 'a@example.com'}]}, primary_email=True).email == ''
+    assert UserRecord.from_profile('u1', {}).email is None
+
+
+def test_table_keeps_the_first_record_per_user_in_insertion_order():
+    table = UserTable([UserRecord('u2', 'second'), UserRecord('u1', 'first')])
+
+    assert table.add(UserRecord('u2', 'duplicate')) is False
+    assert table.add(UserRecord('u3')) is True
+    assert table.user_ids() == ['u2', 'u1', 'u3']
+    assert table['u2'].username == 'second'
+    assert 'u1' in table and 'u4' not in table
+    assert table.get('u4') is None
+    assert len(table) == 3
+
+
+def test_join_activity_keeps_the_latest_date_and_returns_unmatched_ids():
+    table = UserTable([UserRecord('u1'), UserRecord('u2', last_activity_date='2025-06-10')])
+
+    unmatched = table.join_activity([('u1', '2025-05-01'), ('x', '2025-06-01'), ('u1', '2025-06-01'),
+                                     ('u2', '2025-06-01'), ('u1', None), ('x', '2025-06-02'), ('y', None)])
+
+    assert unmatched == ['x', 'y']
+    assert table['u1'].last_activity_date == '2025-06-01'
+    assert table['u2'].last_activity_date == '2025-06-10'
+
+
+def test_rows_columns_and_csv_write_from_the_slots(tmp_path):
+    table = UserTable([UserRecord('u1', 'one', 'one@example.com'), UserRecord('u2', 'two')])
+    fieldnames = ['UserId', 'Username', 'Email']
+
+    assert list(table.rows(fieldnames)) == [('u1', 'one', 'one@example.com'), ('u2', 'two', None)]
+    assert table.columns(['UserId', 'Email']) == {'UserId': ['u1', 'u2'], 'Email': ['one@example.com', None]}
+    assert table.to_dicts(['UserId']) == [{'UserId': 'u1'}, {'UserId': 'u2'}]
+
+    path = str(tmp_path / 'users.csv')
+    assert table.write_csv(path, fieldnames) == 2
+    with open(path, newline='') as file:
+        assert list(csv.reader(file)) == [fieldnames, ['u1', 'one', 'one@example.com'], ['u2', 'two', '']]
+
+
+def test_parquet_round_trip(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    table = UserTable([UserRecord('u1', 'one', 'one@example.com'), UserRecord('u2', 'two')])
+
+    path = str(tmp_path / 'users.parquet')
+    assert table.write_parquet(path, ['UserId', 'Email']) == 2
+    assert pq.read_table(path).to_pydict() == {'UserId': ['u1', 'u2'], 'Email': ['one@example.com', None]}